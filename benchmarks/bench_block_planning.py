@@ -0,0 +1,60 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare block_compute() with the NumPy block planners.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_block_planning.py
+"""
+
+from __future__ import print_function
+from intern.utils.parallel import block_bounds, block_compute, iter_block_bounds
+import timeit
+
+CUBOID = (512, 512, 16)
+
+REGIONS = [
+    ('small', [(0, 2048), (0, 2048), (0, 64)]),
+    ('slab', [(100, 40000), (100, 40000), (0, 16)]),
+    ('volume', [(0, 40000), (0, 40000), (0, 2000)]),
+]
+
+
+def first_block():
+    return next(iter_block_bounds(REGIONS[-1][1], CUBOID))[0]
+
+
+def main():
+    print('{:<8} {:>9} {:>15} {:>15} {:>15}'.format(
+        'region', 'blocks', 'block_compute', 'block_bounds', 'morton'))
+    for name, ranges in REGIONS:
+        (x0, x1), (y0, y1), (z0, z1) = ranges
+        num = len(block_bounds(ranges, CUBOID))
+        repeat = max(1, 200000 // num)
+        old = timeit.timeit(
+            lambda: block_compute(x0, x1, y0, y1, z0, z1, block_size=CUBOID),
+            number=repeat) / repeat
+        new = timeit.timeit(lambda: block_bounds(ranges, CUBOID), number=repeat) / repeat
+        morton = timeit.timeit(
+            lambda: block_bounds(ranges, CUBOID, order='morton'), number=repeat) / repeat
+        print('{:<8} {:>9} {:>13.2f}ms {:>13.2f}ms {:>13.2f}ms'.format(
+            name, num, old * 1e3, new * 1e3, morton * 1e3))
+
+    latency = timeit.timeit(first_block, number=100) / 100
+    print('first block of the volume from iter_block_bounds: {:.3f}ms'.format(latency * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Report blosc compression ratio and throughput for cutout uploads.
+
+Compares the codecs, levels and shuffle modes accepted by
+VolumeService_1.compress() on synthetic uint8 and uint16 image data and
+uint64 annotation data, one 512x512x16 cuboid each.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_compression.py [nthreads]
+"""
+
+from __future__ import print_function
+from intern.resource.boss.resource import ChannelResource
+from intern.service.boss.v1.volume import SHUFFLE_MODES, VolumeService_1
+import blosc
+import numpy as np
+import sys
+import timeit
+
+SHAPE = (16, 512, 512)
+SETTINGS = [
+    ('blosclz', 9, 'shuffle'),
+    ('lz4', 5, 'shuffle'),
+    ('lz4', 5, 'bitshuffle'),
+    ('zstd', 1, 'shuffle'),
+    ('zstd', 5, 'bitshuffle'),
+    ('zlib', 5, 'shuffle'),
+]
+
+
+def image(dtype):
+    """Smooth, noisy data that looks like EM or light microscopy."""
+    rng = np.random.RandomState(0)
+    coarse = rng.randint(0, np.iinfo(dtype).max // 2, (SHAPE[0], 32, 32))
+    smooth = np.repeat(np.repeat(coarse, 16, axis=1), 16, axis=2)
+    noise = rng.randint(0, np.iinfo(dtype).max // 16, SHAPE)
+    return (smooth + noise).astype(dtype)
+
+
+def annotation():
+    """Large uint64 objects on a background of zeros."""
+    rng = np.random.RandomState(0)
+    coarse = rng.randint(0, 2000, (SHAPE[0], 16, 16)).astype(np.uint64)
+    coarse[rng.rand(*coarse.shape) < 0.5] = 0
+    return np.repeat(np.repeat(coarse, 32, axis=1), 32, axis=2) + np.uint64(1 << 40)
+
+
+def rate(nbytes, func, number=5):
+    return nbytes * number / timeit.timeit(func, number=number) / 1e6
+
+
+def main():
+    if len(sys.argv) > 1:
+        blosc.set_nthreads(int(sys.argv[1]))
+    service = VolumeService_1()
+    datasets = [
+        ('uint8', ChannelResource('c', 'c', 'e', 'image', datatype='uint8'), image(np.uint8)),
+        ('uint16', ChannelResource('c', 'c', 'e', 'image', datatype='uint16'), image(np.uint16)),
+        ('uint64', ChannelResource(
+            'c', 'c', 'e', 'annotation', datatype='uint64', sources=['s']), annotation()),
+    ]
+
+    print('{:<7} {:<8} {:>5} {:<10} {:>7} {:>12} {:>12}'.format(
+        'dtype', 'codec', 'level', 'shuffle', 'ratio', 'comp MB/s', 'decomp MB/s'))
+    for name, chan, data in datasets:
+        for codec, clevel, shuffle in SETTINGS:
+            compressed = service.compress(chan, data, codec, clevel, shuffle)
+            comp = rate(data.nbytes, lambda: service.compress(chan, data, codec, clevel, shuffle))
+            decomp = rate(data.nbytes, lambda: blosc.decompress(compressed))
+            print('{:<7} {:<8} {:>5} {:<10} {:>7.2f} {:>12.0f} {:>12.0f}'.format(
+                name, codec, clevel, shuffle, data.nbytes / float(len(compressed)), comp, decomp))
+
+        # The typesize used before compression settings were configurable.
+        bits = data.dtype.itemsize * 8
+        wrong = blosc.compress(data, typesize=bits, shuffle=SHUFFLE_MODES['shuffle'])
+        print('{:<7} {:<8} {:>5} {:<10} {:>7.2f}  (typesize={} bits)'.format(
+            name, 'blosclz', 9, 'shuffle', data.nbytes / float(len(wrong)), bits))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compare the cutout download formats in intern.service.boss.codecs.
+
+A local HTTP server stands in for the Boss and answers every cutout request
+with the same cuboid, encoded in the format named by the Accept header.  For
+each format, the bytes sent over the wire, the time to decode a response and
+the time of a whole BossRemote.get_cutout() call are reported.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_download_formats.py
+"""
+
+from __future__ import print_function
+from intern.remote.boss import BossRemote
+from intern.resource.boss.resource import ChannelResource
+from intern.service.boss.codecs import CODECS
+from io import BytesIO
+from six.moves import BaseHTTPServer
+import blosc
+import gzip
+import numpy as np
+import threading
+import timeit
+
+SHAPE = (16, 512, 512)
+REPEAT = 5
+
+
+def annotation():
+    """Large uint64 objects on a background of zeros."""
+    rng = np.random.RandomState(0)
+    coarse = rng.randint(0, 2000, (SHAPE[0], 16, 16)).astype(np.uint64)
+    coarse[rng.rand(*coarse.shape) < 0.5] = 0
+    return np.repeat(np.repeat(coarse, 32, axis=1), 32, axis=2)
+
+
+def encode(mime_type, data):
+    """Encode data the way the Boss does for each format."""
+    if mime_type == 'application/blosc':
+        return blosc.compress(data, typesize=data.dtype.itemsize)
+    if mime_type == 'application/blosc-python':
+        return blosc.pack_array(data)
+    npy = BytesIO()
+    np.save(npy, data)
+    out = BytesIO()
+    with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6) as f:
+        f.write(npy.getvalue())
+    return out.getvalue()
+
+
+def serve(bodies):
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = bodies[self.headers['Accept']]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main():
+    data = annotation()
+    bodies = {codec.mime_type: encode(codec.mime_type, data) for codec in CODECS.values()}
+    server = serve(bodies)
+    rmt = BossRemote({
+        'protocol': 'http', 'host': '127.0.0.1:{}'.format(server.server_address[1]),
+        'token': 'token'})
+    chan = ChannelResource(
+        'anno', 'coll', 'exp', 'annotation', datatype='uint64', sources=['chan'])
+    out = np.empty_like(data)
+
+    print('{:<13} {:>12} {:>7} {:>12} {:>14}'.format(
+        'format', 'wire bytes', 'ratio', 'decode ms', 'get_cutout ms'))
+    for name in sorted(CODECS):
+        codec = CODECS[name]
+        body = bodies[codec.mime_type]
+        decode = timeit.timeit(lambda: codec.decode_into(body, out), number=REPEAT) / REPEAT
+        np.testing.assert_array_equal(data, out)
+        cutout = timeit.timeit(
+            lambda: rmt.get_cutout(chan, 0, [0, 512], [0, 512], [0, 16], codec=name),
+            number=REPEAT) / REPEAT
+        print('{:<13} {:>12} {:>7.1f} {:>12.2f} {:>14.2f}'.format(
+            name, len(body), data.nbytes / float(len(body)), decode * 1e3, cutout * 1e3))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
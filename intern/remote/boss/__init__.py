@@ -20,3 +20,10 @@ Author:
 """
 
 from intern.remote.boss.remote import BossRemote, LATEST_VERSION
+from intern.remote.boss.idallocator import IdAllocator
+from intern.remote.boss.writebuffer import WriteBuffer
+import sys
+
+if sys.version_info >= (3, 5):
+    # Uses async/await syntax.
+    from intern.remote.boss.async_remote import AsyncBossRemote
@@ -0,0 +1,1010 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio version of BossRemote.
+
+Requires Python 3.5+ and the optional aiohttp package.
+"""
+
+from intern.remote.boss.remote import BossRemote
+from intern.resource.boss.resource import *
+from intern.service.boss.cache import cuboid_blocks, cuboid_size_at, snap_to_cuboids
+from intern.service.boss.codecs import get_codec
+from intern.service.boss.httperrorlist import HTTPErrorList
+from intern.service.boss.v1.volume import MAX_FILTER_CHARS
+from intern.utils.annotation import filter_ids
+from requests import HTTPError, Response
+from requests.structures import CaseInsensitiveDict
+from datetime import timedelta
+import asyncio
+import copy
+import numpy as np
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+# Default maximum number of simultaneous connections to the Boss.
+DEFAULT_MAX_CONNECTIONS = 100
+
+
+class AsyncBossRemote(object):
+    """Remote for the Boss whose methods are coroutines.
+
+    Requests are built by the same service objects as BossRemote's and sent
+    with aiohttp, so a single event loop can have many cutout, annotation,
+    project and metadata requests in flight without a thread per request.
+    Configuration is read exactly like BossRemote's.
+
+    Use as an async context manager, or call close() when done:
+
+        async with AsyncBossRemote('~/.intern/intern.cfg') as rmt:
+            data = await rmt.get_cutout(chan, 0, [0, 512], [0, 512], [0, 16])
+
+    Attributes:
+        remote (intern.remote.boss.BossRemote): Synchronous remote that holds the configuration and tokens.
+        max_connections (int): Maximum number of simultaneous connections.
+    """
+
+    def __init__(
+            self, cfg_file_or_dict=None, version=None,
+            max_connections=DEFAULT_MAX_CONNECTIONS, session=None):
+        """Constructor.
+
+        Args:
+            cfg_file_or_dict (optional[string|dict]): Path to config file in INI format or a dict of config parameters.
+            version (optional[string]): Version of Boss API to use.
+            max_connections (optional[int]): Maximum number of simultaneous connections.
+            session (optional[aiohttp.ClientSession]): Session to send requests
+                with.  If not given, one is created on first use and closed by close().
+
+        Raises:
+            ImportError: if aiohttp is not installed.
+        """
+        if aiohttp is None:
+            raise ImportError('AsyncBossRemote requires the aiohttp package.')
+        self.remote = BossRemote(cfg_file_or_dict, version)
+        self.max_connections = max_connections
+        self._session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Close the HTTP session, if owned by this remote."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self._session
+
+    async def _send(self, req):
+        """Send a request built by one of the service objects.
+
+        Args:
+            req (requests.Request): Request to send.
+
+        Returns:
+            (requests.Response): Response holding the status, headers and body.
+        """
+        prep = req.prepare()
+        headers = dict(prep.headers)
+        # aiohttp sets the length of the body itself.
+        headers.pop('Content-Length', None)
+
+        start = time.time()
+        async with self._get_session().request(
+                prep.method, prep.url, headers=headers, data=prep.body) as aio_resp:
+            content = await aio_resp.read()
+
+            resp = Response()
+            resp.status_code = aio_resp.status
+            resp.reason = aio_resp.reason
+            resp.headers = CaseInsensitiveDict(aio_resp.headers)
+            resp._content = content
+            resp.url = prep.url
+            resp.request = prep
+            resp.elapsed = timedelta(seconds=time.time() - start)
+        self._volume.metrics.record_response(resp)
+        return resp
+
+    async def _run_blocks(self, func, blocks, fail_fast):
+        """Call the coroutine function func on each block, at most
+        volume_service.max_workers at a time.
+
+        Args:
+            func (callable): Coroutine function taking a block.
+            blocks (list): Blocks as returned by VolumeService_1._plan_blocks().
+            fail_fast (bool): Cancel the remaining blocks as soon as one fails.
+
+        Returns:
+            (list[Exception]): Errors raised by the failed blocks.
+        """
+        if not blocks:
+            return []
+        semaphore = asyncio.Semaphore(max(1, self._volume.max_workers))
+
+        async def run(block):
+            async with semaphore:
+                return await func(block)
+
+        tasks = [asyncio.ensure_future(run(b)) for b in blocks]
+        try:
+            return_when = asyncio.FIRST_EXCEPTION if fail_fast else asyncio.ALL_COMPLETED
+            await asyncio.wait(tasks, return_when=return_when)
+        finally:
+            # Also stops the blocks if the caller is cancelled.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return [
+            t.exception() for t in tasks
+            if not t.cancelled() and t.exception() is not None]
+
+    async def _run_in_executor(self, func, *args):
+        """Run CPU bound work, such as compression, off the event loop."""
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    def _raise(self, msg, req, resp):
+        raise HTTPError(
+            '{}, got HTTP response: ({}) - {}'.format(msg, resp.status_code, resp.text),
+            request=req, response=resp)
+
+    def _check_volume_resource(self, resource):
+        if not resource.valid_volume():
+            raise RuntimeError('Resource incompatible with the volume service.')
+
+    def _check_annotation_channel(self, resource):
+        if not isinstance(resource, ChannelResource):
+            raise TypeError('resource must be ChannelResource')
+        if resource.type != 'annotation':
+            raise TypeError('Channel is not an annotation channel')
+
+    @property
+    def metrics(self):
+        """Registry of request metrics, shared with the wrapped BossRemote.
+
+        Like BossRemote.metrics, it is process-wide and also records the
+        requests of other remotes.
+
+        Returns:
+            (intern.service.boss.metrics.MetricsRegistry)
+        """
+        return self.remote.metrics
+
+    @property
+    def _volume(self):
+        return self.remote.volume_service
+
+    @property
+    def _project(self):
+        return self.remote.project_service
+
+    @property
+    def _metadata(self):
+        return self.remote.metadata_service
+
+    # Volume service.
+
+    async def get_cutout(
+            self, resource, resolution, x_range, y_range, z_range, time_range=None,
+            id_list=[], out=None, codec=None, local_filter=None):
+        """Get a cutout from the Boss data store.
+
+        Large cutouts are split into blocks that are downloaded concurrently.
+        Reads through the volume service's cache, if any, as
+        BossRemote.get_cutout() does.
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with cutout operations.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+            id_list (optional [list]): list of object ids to filter the cutout by.
+            out (optional[numpy.array]): Preallocated array to write the cutout
+                into.  Must have the channel's datatype and the shape of the
+                requested region.
+            codec (optional[string|intern.service.boss.codecs.CutoutCodec]):
+                Format to download the cutout in.  Defaults to the volume
+                service's download_codec.
+            local_filter (optional[bool]): Apply id_list locally to the
+                unfiltered cutout instead of on the server.  Defaults to
+                doing so for id_lists too long to fit in a URL.
+
+        Returns:
+            (numpy.array): A 3D or 4D numpy matrix in (time)ZYX order.
+
+        Raises:
+            requests.HTTPError
+            HTTPErrorList: if any block of a chunked cutout failed.
+            RuntimeError when given invalid resource.
+            ValueError: if out has the wrong shape or datatype, or codec is unknown.
+        """
+        self._check_volume_resource(resource)
+        codec = get_codec(codec or self._volume.download_codec)
+
+        shape = (
+            z_range[1] - z_range[0],
+            y_range[1] - y_range[0],
+            x_range[1] - x_range[0])
+        if time_range:
+            shape = (time_range[1] - time_range[0],) + shape
+
+        if out is None:
+            out = np.empty(shape, dtype=resource.datatype)
+        elif out.shape != shape or out.dtype != np.dtype(resource.datatype):
+            raise ValueError(
+                "out must have shape {} and dtype {}, got shape {} and dtype {}".format(
+                    shape, resource.datatype, out.shape, out.dtype))
+
+        if id_list and local_filter is None:
+            local_filter = len(','.join(str(i) for i in id_list)) > MAX_FILTER_CHARS
+        if id_list and local_filter:
+            await self.get_cutout(
+                resource, resolution, x_range, y_range, z_range, time_range,
+                out=out, codec=codec)
+            await self._run_in_executor(filter_ids, out, id_list, out)
+            return out
+
+        cache = self._volume.cache
+        if cache is not None and not id_list:
+            await self._get_cutout_cached(
+                cache, resource, resolution, x_range, y_range, z_range, time_range, out, codec)
+            return out
+
+        await self._get_cutout(
+            resource, resolution, x_range, y_range, z_range, time_range, id_list, out, codec)
+        return out
+
+    async def _get_cutout(
+            self, resource, resolution, x_range, y_range, z_range, time_range, id_list,
+            out, codec):
+        """Download a cutout into out, bypassing the cache."""
+        service = self._volume.service
+        blocks = service._chunk_blocks(
+            resource, resolution, x_range, y_range, z_range, time_range, out.nbytes,
+            self._volume.request_bytes, self._volume.cuboid_size)
+        if blocks:
+            def get_block(b):
+                return self._get_cutout(
+                    resource, resolution, b[0], b[1], b[2], b[3], id_list,
+                    out[service._block_slice(b, x_range, y_range, z_range, time_range)],
+                    codec)
+
+            errors = await self._run_blocks(get_block, blocks, fail_fast=True)
+            service._raise_block_errors('Get cutout', errors, len(blocks))
+            return
+
+        req = service.get_cutout_request(
+            resource, 'GET', codec.mime_type,
+            self._volume.url_prefix, self.remote.token_volume,
+            resolution, x_range, y_range, z_range, time_range,
+            id_list=id_list, accept=codec.mime_type)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            await self._run_in_executor(codec.decode_into, resp.content, out)
+            return
+
+        self._raise('Get cutout failed on {}'.format(resource.name), req, resp)
+
+    async def _get_cutout_cached(
+            self, cache, resource, resolution, x_range, y_range, z_range, time_range,
+            out, codec):
+        """Assemble a cutout from cached cuboids, downloading only the missing ones.
+
+        Works like VolumeService_1._get_cutout_cached(), with the cache's
+        reads and writes run off the event loop.
+        """
+        service = self._volume.service
+        url_prefix = self._volume.url_prefix
+        cuboid_size = cuboid_size_at(self._volume.cuboid_size, resolution)
+        t_range = time_range if time_range else [0, 1]
+
+        def out_index(bounds, t):
+            index = service._block_slice(bounds + (None,), x_range, y_range, z_range, None)
+            if time_range:
+                index = (t - time_range[0],) + index
+            return index
+
+        def assemble():
+            missing = []
+            for index, bounds in cuboid_blocks(x_range, y_range, z_range, cuboid_size):
+                for t in range(t_range[0], t_range[1]):
+                    data = cache.lookup(
+                        cache.key(url_prefix, resource, resolution, t, index), bounds)
+                    if data is None:
+                        missing.append((index, bounds))
+                        break
+                    out[out_index(bounds, t)] = data
+            return missing
+
+        def store(index, bounds, fetched, data):
+            local = tuple(
+                slice(b[0] - f[0], b[1] - f[0])
+                for f, b in reversed(list(zip(fetched, bounds))))
+            for t in range(t_range[0], t_range[1]):
+                t_data = data[t - t_range[0]] if time_range else data
+                cache.put(
+                    cache.key(url_prefix, resource, resolution, t, index), fetched, t_data)
+                out[out_index(bounds, t)] = t_data[local]
+
+        async def fetch(bounds):
+            shape = tuple(b[1] - b[0] for b in reversed(bounds))
+            if time_range:
+                shape = (time_range[1] - time_range[0],) + shape
+            data = np.empty(shape, dtype=resource.datatype)
+            await self._get_cutout(
+                resource, resolution, bounds[0], bounds[1], bounds[2], time_range, [],
+                data, codec)
+            return data
+
+        async def get_cuboid(block):
+            index, bounds = block
+            fetched = snap_to_cuboids(*bounds, cuboid_size=cuboid_size)
+            try:
+                data = await fetch(fetched)
+            except HTTPError as e:
+                if e.response is None or e.response.status_code != 400:
+                    raise
+                # The cuboid extends past the coordinate frame.
+                fetched = bounds
+                data = await fetch(fetched)
+            await self._run_in_executor(store, index, bounds, fetched, data)
+
+        missing = await self._run_in_executor(assemble)
+        errors = await self._run_blocks(get_cuboid, missing, fail_fast=True)
+        service._raise_block_errors('Get cutout', errors, len(missing))
+
+    async def create_cutout(
+            self, resource, resolution, x_range, y_range, z_range, data, time_range=None):
+        """Upload a cutout to the Boss data store.
+
+        Large volumes are split into blocks that are uploaded concurrently.
+        Cached cuboids overlapping the region are invalidated, as by
+        BossRemote.create_cutout().
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with cutout operations.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            data (numpy.array): A 3D or 4D (time) numpy matrix in (time)ZYX order.
+            time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+
+        Raises:
+            requests.HTTPError
+            HTTPErrorList: if any block of a chunked cutout failed.
+            RuntimeError when given invalid resource.
+            ValueError: if data's dimensions don't match time_range.
+        """
+        self._check_volume_resource(resource)
+        if data.ndim == 3:
+            if time_range is not None:
+                raise ValueError(
+                    "You must provide a 4D matrix if specifying a time range")
+        elif data.ndim == 4:
+            if time_range is None:
+                raise ValueError(
+                    "You must specifying a time range if providing a 4D matrix")
+        else:
+            raise ValueError(
+                "Invalid data format. Only 3D or 4D cutouts are supported. " +
+                "Number of dimensions: {}".format(data.ndim))
+
+        cache = self._volume.cache
+        try:
+            await self._create_cutout(
+                resource, resolution, x_range, y_range, z_range, data, time_range)
+        finally:
+            if cache is not None:
+                # Even a failed upload may have changed some cuboids.
+                cache.invalidate(
+                    self._volume.url_prefix, resource, resolution, x_range, y_range,
+                    z_range, time_range, cuboid_size=self._volume.cuboid_size)
+
+    async def _create_cutout(
+            self, resource, resolution, x_range, y_range, z_range, data, time_range):
+        service = self._volume.service
+        blocks = service._chunk_blocks(
+            resource, resolution, x_range, y_range, z_range, time_range, data.nbytes,
+            self._volume.request_bytes, self._volume.cuboid_size)
+        if blocks:
+            def put_block(b):
+                return self._create_cutout(
+                    resource, resolution, b[0], b[1], b[2],
+                    data[service._block_slice(b, x_range, y_range, z_range, time_range)],
+                    b[3])
+
+            errors = await self._run_blocks(put_block, blocks, fail_fast=False)
+            service._raise_block_errors('Create cutout', errors, len(blocks))
+            return
+
+        compressed = await self._run_in_executor(
+            service.compress, resource, data, self._volume.codec, self._volume.clevel,
+            self._volume.shuffle)
+        req = service.get_cutout_request(
+            resource, 'POST', 'application/blosc',
+            self._volume.url_prefix, self.remote.token_volume,
+            resolution, x_range, y_range, z_range, time_range, numpyVolume=compressed)
+        resp = await self._send(req)
+        if resp.status_code == 201:
+            return
+
+        self._raise('Create cutout failed on {}'.format(resource.name), req, resp)
+
+    async def reserve_ids(self, resource, num_ids):
+        """Reserve a block of unique, sequential ids for annotations.
+
+        Args:
+            resource (intern.resource.Resource): Resource should be an annotation channel.
+            num_ids (int): Number of ids to reserve.
+
+        Returns:
+            (int): First id reserved.
+
+        Raises:
+            requests.HTTPError
+            TypeError: resource is not a channel or not an annotation channel.
+        """
+        self._check_volume_resource(resource)
+        self._check_annotation_channel(resource)
+        req = self._volume.service.get_reserve_request(
+            resource, 'GET', 'application/json',
+            self._volume.url_prefix, self.remote.token_volume, num_ids)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return int(resp.json()['start_id'])
+
+        self._raise('Reserve ids failed on {}'.format(resource.name), req, resp)
+
+    async def get_bounding_box(self, resource, resolution, id, bb_type='loose'):
+        """Get bounding box containing object specified by id.
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with annotation operations.
+            resolution (int): 0 indicates native resolution.
+            id (int): Id of object of interest.
+            bb_type (optional[string]): Defaults to 'loose'.
+
+        Returns:
+            (dict): {'x_range': [0, 10], 'y_range': [0, 10], 'z_range': [0, 10], 't_range': [0, 10]}
+
+        Raises:
+            requests.HTTPError
+            TypeError: if resource is not an annotation channel.
+        """
+        self._check_volume_resource(resource)
+        if bb_type != 'loose' and bb_type != 'tight':
+            raise RuntimeError("bb_type must be either 'loose' or 'tight'.")
+        self._check_annotation_channel(resource)
+
+        req = self._volume.service.get_bounding_box_request(
+            resource, 'GET', 'application/json',
+            self._volume.url_prefix, self.remote.token_volume, resolution, id, bb_type)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return resp.json()
+
+        self._raise('Get bounding box failed on {}'.format(resource.name), req, resp)
+
+    async def get_bounding_boxes(self, resource, resolution, ids, bb_type='loose'):
+        """Get the bounding boxes of many objects concurrently.
+
+        At most volume_service.max_workers requests are sent at a time.  A
+        failed request doesn't stop the others.
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with annotation operations.
+            resolution (int): 0 indicates native resolution.
+            ids (list[int]): Ids of the objects of interest.
+            bb_type (optional[string]): Defaults to 'loose'.
+
+        Returns:
+            (tuple): (boxes, failures) as returned by BossRemote.get_bounding_boxes().
+
+        Raises:
+            TypeError: if resource is not an annotation channel.
+        """
+        self._check_volume_resource(resource)
+        if bb_type != 'loose' and bb_type != 'tight':
+            raise RuntimeError("bb_type must be either 'loose' or 'tight'.")
+        self._check_annotation_channel(resource)
+
+        ids = [int(i) for i in ids]
+        results = [None] * len(ids)
+        failures = {}
+
+        async def get_box(j):
+            try:
+                results[j] = await self.get_bounding_box(resource, resolution, ids[j], bb_type)
+            except Exception as e:
+                failures[ids[j]] = e
+
+        await self._run_blocks(get_box, range(len(ids)), fail_fast=False)
+        boxes = self._volume.service._bounding_box_array(
+            [(i, box) for i, box in zip(ids, results) if box is not None])
+        return boxes, failures
+
+    async def get_ids_in_region(
+            self, resource, resolution, x_range, y_range, z_range, time_range=[0, 1],
+            as_array=False):
+        """Get all ids in the region defined by x_range, y_range, z_range.
+
+        Args:
+            resource (intern.resource.Resource): An annotation channel.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.  Defaults to [0, 1].
+            as_array (optional [bool]): Return a numpy.uint64 array instead of a list.
+
+        Returns:
+            (list[int]|numpy.array): Sorted ids, such as [1, 2, 25].
+
+        Raises:
+            requests.HTTPError
+            HTTPErrorList: if querying any block of a large region failed.
+            TypeError: if resource is not an annotation channel.
+        """
+        self._check_annotation_channel(resource)
+        ids = await self._get_ids_in_region(
+            resource, resolution, x_range, y_range, z_range, time_range)
+        return ids if as_array else ids.tolist()
+
+    async def _get_ids_in_region(
+            self, resource, resolution, x_range, y_range, z_range, time_range):
+        service = self._volume.service
+        num_times = time_range[1] - time_range[0] if time_range else 1
+        nbytes = np.dtype(resource.datatype).itemsize * num_times * (
+            (x_range[1] - x_range[0]) * (y_range[1] - y_range[0]) *
+            (z_range[1] - z_range[0]))
+        blocks = service._chunk_blocks(
+            resource, resolution, x_range, y_range, z_range, time_range, nbytes,
+            self._volume.request_bytes, self._volume.cuboid_size)
+        if blocks:
+            results = [None] * len(blocks)
+
+            async def get_block(i):
+                b = blocks[i]
+                results[i] = await self._get_ids_in_region(
+                    resource, resolution, b[0], b[1], b[2], b[3])
+
+            errors = await self._run_blocks(get_block, range(len(blocks)), fail_fast=True)
+            service._raise_block_errors('Get ids in region', errors, len(blocks))
+            return np.unique(np.concatenate(results))
+
+        req = service.get_ids_request(
+            resource, 'GET', 'application/json',
+            self._volume.url_prefix, self.remote.token_volume,
+            resolution, x_range, y_range, z_range, time_range)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return await self._run_in_executor(service._decode_ids, resp.content)
+
+        self._raise('Get ids in region failed on {}'.format(resource.name), req, resp)
+
+    # Project service.
+
+    async def _list_resource(self, resource):
+        service = self._project.service
+        req = service.get_request(
+            resource, 'GET', 'application/json',
+            self._project.url_prefix, self.remote.token_project, proj_list_req=True)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return service._get_resource_list(resp.json())
+
+        self._raise('List failed on {}'.format(resource.name), req, resp)
+
+    async def list_collections(self):
+        """List all collections.
+
+        Returns:
+            (list)
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        return await self._list_resource(CollectionResource(name=''))
+
+    async def list_experiments(self, collection_name):
+        """List all experiments that belong to a collection.
+
+        Args:
+            collection_name (string): Name of the parent collection.
+
+        Returns:
+            (list)
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        return await self._list_resource(ExperimentResource(
+            name='', collection_name=collection_name, coord_frame='foo'))
+
+    async def list_channels(self, collection_name, experiment_name):
+        """List all channels belonging to the named experiment that is part
+        of the named collection.
+
+        Args:
+            collection_name (string): Name of the parent collection.
+            experiment_name (string): Name of the parent experiment.
+
+        Returns:
+            (list)
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        return await self._list_resource(ChannelResource(
+            name='', collection_name=collection_name,
+            experiment_name=experiment_name, type='image'))
+
+    async def list_coordinate_frames(self):
+        """List all coordinate_frames.
+
+        Returns:
+            (list)
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        return await self._list_resource(CoordinateFrameResource(name=''))
+
+    async def create_project(self, resource):
+        """Create the entity described by the given resource.
+
+        Args:
+            resource (intern.resource.boss.BossResource)
+
+        Returns:
+            (intern.resource.boss.BossResource): Returns resource of type requested on success.
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        service = self._project.service
+        req = service.get_request(
+            resource, 'POST', 'application/json',
+            self._project.url_prefix, self.remote.token_project,
+            json=service._get_resource_params(resource))
+        resp = await self._send(req)
+        if resp.status_code == 201:
+            return service._create_resource_from_dict(resource, resp.json())
+
+        self._raise('Create failed on {}'.format(resource.name), req, resp)
+
+    async def get_project(self, resource):
+        """Get attributes of the data model object named by the given resource.
+
+        Args:
+            resource (intern.resource.boss.BossResource): resource.name as well as any parents must be identified to succeed.
+
+        Returns:
+            (intern.resource.boss.BossResource): Returns resource of type requested on success.
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        service = self._project.service
+        req = service.get_request(
+            resource, 'GET', 'application/json',
+            self._project.url_prefix, self.remote.token_project)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return service._create_resource_from_dict(resource, resp.json())
+
+        self._raise('Get failed on {}'.format(resource.name), req, resp)
+
+    async def update_project(self, resource_name, resource):
+        """Updates an entity in the data model using the given resource.
+
+        Args:
+            resource_name (string): Current name of the resource (in case the resource is getting its name changed).
+            resource (intern.resource.boss.BossResource): New attributes for the resource.
+
+        Returns:
+            (intern.resource.boss.BossResource): Returns updated resource of given type on success.
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        service = self._project.service
+        old_resource = copy.deepcopy(resource)
+        old_resource.name = resource_name
+        req = service.get_request(
+            old_resource, 'PUT', 'application/json',
+            self._project.url_prefix, self.remote.token_project,
+            json=service._get_resource_params(resource, for_update=True))
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return service._create_resource_from_dict(resource, resp.json())
+
+        self._raise('Update failed on {}'.format(old_resource.name), req, resp)
+
+    async def delete_project(self, resource):
+        """Deletes the entity described by the given resource.
+
+        Args:
+            resource (intern.resource.boss.BossResource)
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        req = self._project.service.get_request(
+            resource, 'DELETE', 'application/json',
+            self._project.url_prefix, self.remote.token_project)
+        resp = await self._send(req)
+        if resp.status_code == 204:
+            return
+
+        self._raise('Delete failed on {}'.format(resource.name), req, resp)
+
+    async def list_permissions(self, group_name=None, resource=None):
+        """List permission sets associated filtering by group and/or resource.
+
+        Args:
+            group_name (optional[string]): Name of group.
+            resource (optional[intern.resource.boss.Resource]): Identifies which data model object to operate on.
+
+        Returns:
+            (list[dict]): List of dictionaries of permission sets
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        filter_params = {}
+        if group_name:
+            filter_params["group"] = group_name
+        if resource:
+            filter_params.update(resource.get_dict_route())
+
+        req = self._project.service.get_permission_request(
+            'GET', 'application/json', self._project.url_prefix,
+            self.remote.token_project, query_params=filter_params)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return resp.json()["permission-sets"]
+
+        msg = "Failed to get permission sets. "
+        if group_name:
+            msg = "{} Group: {}".format(msg, group_name)
+        if resource:
+            msg = "{} Resource: {}".format(msg, resource.name)
+        self._raise(msg, req, resp)
+
+    async def get_permissions(self, grp_name, resource):
+        """Get permissions associated the group has with the given resource.
+
+        Args:
+            grp_name (string): Name of group.
+            resource (intern.resource.boss.Resource): Identifies which data model object to operate on.
+
+        Returns:
+            (list[str]): List of permissions.
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        filter_params = {"group": grp_name}
+        filter_params.update(resource.get_dict_route())
+        req = self._project.service.get_permission_request(
+            'GET', 'application/json', self._project.url_prefix,
+            self.remote.token_project, query_params=filter_params)
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            permission_sets = resp.json()["permission-sets"]
+            return permission_sets[0]['permissions'] if permission_sets else []
+
+        self._raise(
+            'Failed to get permission set for Group: {} Resource: {}'.format(
+                grp_name, resource.name), req, resp)
+
+    async def _send_permissions(self, method, expected, grp_name, resource, permissions):
+        post_data = {"group": grp_name, "permissions": permissions}
+        post_data.update(resource.get_dict_route())
+        req = self._project.service.get_permission_request(
+            method, 'application/json', self._project.url_prefix,
+            self.remote.token_project, post_data=post_data)
+        resp = await self._send(req)
+        if resp.status_code == expected:
+            return
+
+        self._raise('Failed adding permissions to group {}'.format(grp_name), req, resp)
+
+    async def add_permissions(self, grp_name, resource, permissions):
+        """Add additional permissions for the group associated with the resource.
+
+        Args:
+            grp_name (string): Name of group.
+            resource (intern.resource.boss.Resource): Identifies which data model object to operate on.
+            permissions (list): List of permissions to add to the given resource.
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        await self._send_permissions('POST', 201, grp_name, resource, permissions)
+
+    async def update_permissions(self, grp_name, resource, permissions):
+        """Update permissions for the group associated with the given resource.
+
+        Args:
+            grp_name (string): Name of group.
+            resource (intern.resource.boss.Resource): Identifies which data model object to operate on
+            permissions (list): List of permissions to add to the given resource
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        await self._send_permissions('PATCH', 200, grp_name, resource, permissions)
+
+    async def delete_permissions(self, grp_name, resource):
+        """Removes permissions from the group for the given resource.
+
+        Args:
+            grp_name (string): Name of group.
+            resource (intern.resource.boss.Resource): Identifies which data model object to operate on.
+
+        Raises:
+            requests.HTTPError on failure.
+        """
+        filter_params = {"group": grp_name}
+        filter_params.update(resource.get_dict_route())
+        req = self._project.service.get_permission_request(
+            'DELETE', 'application/json', self._project.url_prefix,
+            self.remote.token_project, query_params=filter_params)
+        resp = await self._send(req)
+        if resp.status_code == 204:
+            return
+
+        self._raise('Failed deleting permissions to group {}'.format(grp_name), req, resp)
+
+    # Metadata service.
+
+    def _metadata_request(self, resource, method, key=None, value=None):
+        return self._metadata.service.get_metadata_request(
+            resource, method, 'application/json', self._metadata.url_prefix,
+            self.remote.token_metadata, key, value)
+
+    async def _metadata_batch(self, requests, expected, msg):
+        """Send one metadata request per key, collecting failures.
+
+        Args:
+            requests (list[tuple]): (key, requests.Request) pairs.
+            expected (int): HTTP status code of success.
+            msg (string): Message of the HTTPErrorList raised on failure.
+
+        Returns:
+            (dict): Responses of the successful requests keyed by key.
+
+        Raises:
+            HTTPErrorList: if any request failed.
+        """
+        responses = await asyncio.gather(*[self._send(req) for _, req in requests])
+        exc = HTTPErrorList(msg)
+        succeeded = {}
+        for (key, req), resp in zip(requests, responses):
+            if resp.status_code == expected:
+                succeeded[key] = resp
+                continue
+            try:
+                self._raise('{} failed for key {}'.format(msg, key), req, resp)
+            except HTTPError as e:
+                exc.http_errors.append(e)
+
+        if exc.http_errors:
+            raise exc
+        return succeeded
+
+    async def list_metadata(self, resource):
+        """List all keys associated with the given resource.
+
+        Args:
+            resource (intern.resource.boss.BossResource)
+
+        Returns:
+            (list)
+
+        Raises:
+            requests.HTTPError on a failure.
+        """
+        req = self._metadata_request(resource, 'GET')
+        resp = await self._send(req)
+        if resp.status_code == 200:
+            return resp.json()['keys']
+
+        self._raise('List failed on {}'.format(resource.name), req, resp)
+
+    async def create_metadata(self, resource, keys_vals):
+        """Associates new key-value pairs with the given resource.
+
+        Will attempt to add all key-value pairs even if some fail.
+
+        Args:
+            resource (intern.resource.boss.BossResource)
+            keys_vals (dictionary): Collection of key-value pairs to assign to given resource.
+
+        Raises:
+            HTTPErrorList on failure.
+        """
+        await self._metadata_batch(
+            [(k, self._metadata_request(resource, 'POST', k, v)) for k, v in keys_vals.items()],
+            201, 'At least one key-value create failed.')
+
+    async def get_metadata(self, resource, keys):
+        """Gets the values for given keys associated with the given resource.
+
+        Args:
+            resource (intern.resource.boss.BossResource)
+            keys (list)
+
+        Returns:
+            (dictionary)
+
+        Raises:
+            HTTPErrorList on failure.
+        """
+        responses = await self._metadata_batch(
+            [(k, self._metadata_request(resource, 'GET', k)) for k in keys],
+            200, 'At least one key-value get failed.')
+        return dict((k, resp.json()['value']) for k, resp in responses.items())
+
+    async def update_metadata(self, resource, keys_vals):
+        """Updates key-value pairs with the given resource.
+
+        Will attempt to update all key-value pairs even if some fail.
+        Keys must already exist.
+
+        Args:
+            resource (intern.resource.boss.BossResource)
+            keys_vals (dictionary): Collection of key-value pairs to update on the given resource.
+
+        Raises:
+            HTTPErrorList on failure.
+        """
+        await self._metadata_batch(
+            [(k, self._metadata_request(resource, 'PUT', k, v)) for k, v in keys_vals.items()],
+            200, 'At least one key-value update failed.')
+
+    async def delete_metadata(self, resource, keys):
+        """Deletes the given key-value pairs associated with the given resource.
+
+        Will attempt to delete all key-value pairs even if some fail.
+
+        Args:
+            resource (intern.resource.boss.BossResource)
+            keys (list)
+
+        Raises:
+            HTTPErrorList on failure.
+        """
+        await self._metadata_batch(
+            [(k, self._metadata_request(resource, 'DELETE', k)) for k in keys],
+            204, 'At least one key-value delete failed.')
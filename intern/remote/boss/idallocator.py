@@ -0,0 +1,186 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import deque
+import threading
+
+
+# Default number of ids reserved from the Boss at a time.
+DEFAULT_ID_BLOCK_SIZE = 100000
+
+
+class IdAllocator(object):
+    """Hands out annotation ids from large blocks reserved ahead of time.
+
+    Ids are reserved from the Boss block_size at a time and handed out
+    locally, so most calls to allocate() don't make a request.  When fewer
+    than low_water ids are left, the next block is reserved by a background
+    thread while the remaining ids are handed out.  An allocator may be
+    shared by any number of threads.
+
+    Ids reserved but never handed out are lost when the allocator is
+    discarded, as with any reserve_ids() call.
+
+        with IdAllocator(rmt, anno_chan) as ids:
+            start = ids.allocate(num_labels)
+
+    Attributes:
+        num_allocated (int): Number of ids handed out.
+        num_reserved (int): Number of ids reserved from the Boss.
+        num_requests (int): Number of reserve_ids() requests made.
+    """
+
+    def __init__(self, remote, resource, block_size=DEFAULT_ID_BLOCK_SIZE, low_water=None):
+        """Constructor.
+
+        Args:
+            remote (intern.remote.Remote): Remote to reserve ids through.
+            resource (intern.resource.boss.resource.ChannelResource): Annotation channel.
+            block_size (optional[int]): Number of ids reserved per request.
+            low_water (optional[int]): Number of ids left that triggers a
+                background reservation.  Defaults to a quarter of block_size.
+
+        Raises:
+            ValueError: if block_size isn't positive.
+        """
+        if block_size < 1:
+            raise ValueError('block_size must be positive, got {}'.format(block_size))
+        self.remote = remote
+        self.resource = resource
+        self.block_size = block_size
+        self.low_water = block_size // 4 if low_water is None else low_water
+
+        self.num_allocated = 0
+        self.num_reserved = 0
+        self.num_requests = 0
+
+        # [start, stop) ranges of reserved ids that haven't been handed out.
+        self._ranges = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def available(self):
+        """Number of reserved ids that haven't been handed out."""
+        with self._cond:
+            return self._available()
+
+    def allocate(self, num_ids=1):
+        """Get a range of unique, sequential ids.
+
+        Only waits for the Boss when no reserved range holds num_ids ids.
+        Requests larger than block_size are reserved directly.
+
+        Args:
+            num_ids (optional[int]): Number of ids needed.
+
+        Returns:
+            (int): First id of the range.
+
+        Raises:
+            ValueError: if num_ids isn't positive.
+            requests.HTTPError: if reserving ids failed.
+        """
+        if num_ids < 1:
+            raise ValueError('num_ids must be positive, got {}'.format(num_ids))
+        if num_ids > self.block_size:
+            start = self._reserve(num_ids)
+            with self._cond:
+                self.num_allocated += num_ids
+            return start
+
+        with self._cond:
+            while True:
+                start = self._take(num_ids)
+                if start is not None:
+                    break
+                self._start_refill()
+                self._cond.wait()
+                if self._error is not None and self._thread is None:
+                    raise self._error
+
+            self.num_allocated += num_ids
+            if self._available() < self.low_water:
+                self._start_refill()
+            return start
+
+    def close(self):
+        """Wait for any background reservation to finish."""
+        with self._cond:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _available(self):
+        """Must be called with the lock held."""
+        return sum(stop - start for start, stop in self._ranges)
+
+    def _take(self, num_ids):
+        """Take ids from the first range with enough of them.
+
+        Must be called with the lock held.
+
+        Returns:
+            (int|None): First id taken, or None if no range is large enough.
+        """
+        for i, (start, stop) in enumerate(self._ranges):
+            if stop - start >= num_ids:
+                if stop - start == num_ids:
+                    del self._ranges[i]
+                else:
+                    self._ranges[i] = (start + num_ids, stop)
+                return start
+        return None
+
+    def _start_refill(self):
+        """Reserve another block in the background unless one is already
+        being reserved.
+
+        Must be called with the lock held.
+        """
+        if self._thread is not None:
+            return
+        self._error = None
+        self._thread = threading.Thread(target=self._refill)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _refill(self):
+        try:
+            start = self._reserve(self.block_size)
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._thread = None
+                self._cond.notify_all()
+            return
+
+        with self._cond:
+            self._ranges.append((start, start + self.block_size))
+            self._thread = None
+            self._cond.notify_all()
+
+    def _reserve(self, num_ids):
+        start = self.remote.reserve_ids(self.resource, num_ids)
+        with self._cond:
+            self.num_requests += 1
+            self.num_reserved += num_ids
+        return start
@@ -18,6 +18,10 @@ from intern.resource.boss.resource import *
 from intern.service.boss.project import ProjectService
 from intern.service.boss.metadata import MetadataService
 from intern.service.boss.volume import VolumeService
+from intern.service.boss.cache import DiskCuboidCache
+from intern.service.boss.connections import (
+    session_manager, DEFAULT_MAX_RETRIES, DEFAULT_POOL_MAXSIZE, DEFAULT_RETRY_BACKOFF)
+from intern.service.boss.v1.volume import DEFAULT_PREFETCH
 
 
 CONFIG_PROJECT_SECTION = 'Project Service'
@@ -27,6 +31,39 @@ CONFIG_PROTOCOL = 'protocol'
 # CONFIG_HOST example: api.theboss.io
 CONFIG_HOST = 'host'
 CONFIG_TOKEN = 'token'
+# Optional, Volume Service only.  Number of concurrent cutout block requests.
+CONFIG_MAX_WORKERS = 'max_workers'
+# Optional, Volume Service only.  Directory of an on-disk cutout cache and its
+# size limit in bytes.
+CONFIG_CACHE_DIR = 'cache_dir'
+CONFIG_CACHE_SIZE = 'cache_size'
+# Optional, Volume Service only.  Maximum uncompressed bytes per cutout request
+# and the server's cuboid size such as 512, 512, 16.  Large cutouts are split
+# into cuboid aligned blocks that fit in request_bytes.
+CONFIG_REQUEST_BYTES = 'request_bytes'
+CONFIG_CUBOID_SIZE = 'cuboid_size'
+# Optional, Volume Service only.  true to upload the whole cuboids of a cutout
+# separately from its unaligned edges.
+CONFIG_ALIGNED_UPLOADS = 'aligned_uploads'
+# Optional, Volume Service only.  Blosc compressor, compression level (0-9) and
+# shuffle filter (shuffle, bitshuffle or noshuffle) used for uploads, and the
+# number of threads blosc uses.
+CONFIG_CODEC = 'codec'
+CONFIG_CLEVEL = 'clevel'
+CONFIG_SHUFFLE = 'shuffle'
+CONFIG_NTHREADS = 'nthreads'
+# Optional, Volume Service only.  Format to download cutouts in: blosc,
+# blosc-python or npygz.
+CONFIG_DOWNLOAD_CODEC = 'download_codec'
+# Optional.  Services that use the same protocol and host share one HTTP
+# session.  Number of connections kept open to the host (defaults to enough
+# for the volume service's max_workers), number of retries of idempotent
+# requests that failed to connect or got a 502, 503 or 504, the backoff
+# factor between retries, and false to close connections after each request.
+CONFIG_POOL_MAXSIZE = 'pool_maxsize'
+CONFIG_MAX_RETRIES = 'max_retries'
+CONFIG_RETRY_BACKOFF = 'retry_backoff'
+CONFIG_KEEP_ALIVE = 'keep_alive'
 
 LATEST_VERSION = 'v1'
 
@@ -92,6 +129,7 @@ class BossRemote(Remote):
         self._project = ProjectService(host, version)
         self._project.base_protocol = proto
         self._project.set_auth(self._token_project)
+        self._init_session(self._project, project_cfg)
 
     def _init_metadata_service(self, version):
         """
@@ -114,6 +152,7 @@ class BossRemote(Remote):
         self._metadata = MetadataService(host, version)
         self._metadata.base_protocol = proto
         self._metadata.set_auth(self._token_metadata)
+        self._init_session(self._metadata, metadata_cfg)
 
     def _init_volume_service(self, version):
         """
@@ -136,6 +175,58 @@ class BossRemote(Remote):
         self._volume = VolumeService(host, version)
         self._volume.base_protocol = proto
         self._volume.set_auth(self._token_volume)
+        if CONFIG_MAX_WORKERS in volume_cfg:
+            self._volume.max_workers = int(volume_cfg[CONFIG_MAX_WORKERS])
+        if CONFIG_REQUEST_BYTES in volume_cfg:
+            self._volume.request_bytes = int(volume_cfg[CONFIG_REQUEST_BYTES])
+        if CONFIG_CUBOID_SIZE in volume_cfg:
+            self._volume.cuboid_size = tuple(
+                int(s) for s in volume_cfg[CONFIG_CUBOID_SIZE].split(','))
+        if CONFIG_ALIGNED_UPLOADS in volume_cfg:
+            self._volume.aligned_uploads = (
+                volume_cfg[CONFIG_ALIGNED_UPLOADS].strip().lower() in ('1', 'true', 'yes', 'on'))
+        if CONFIG_CODEC in volume_cfg:
+            self._volume.codec = volume_cfg[CONFIG_CODEC].strip()
+        if CONFIG_CLEVEL in volume_cfg:
+            self._volume.clevel = int(volume_cfg[CONFIG_CLEVEL])
+        if CONFIG_SHUFFLE in volume_cfg:
+            self._volume.shuffle = volume_cfg[CONFIG_SHUFFLE].strip()
+        if CONFIG_NTHREADS in volume_cfg:
+            self._volume.nthreads = int(volume_cfg[CONFIG_NTHREADS])
+        if CONFIG_DOWNLOAD_CODEC in volume_cfg:
+            self._volume.download_codec = volume_cfg[CONFIG_DOWNLOAD_CODEC].strip()
+        if CONFIG_CACHE_DIR in volume_cfg:
+            cache_args = {}
+            if CONFIG_CACHE_SIZE in volume_cfg:
+                cache_args['max_bytes'] = int(volume_cfg[CONFIG_CACHE_SIZE])
+            self._volume.cache = DiskCuboidCache(volume_cfg[CONFIG_CACHE_DIR], **cache_args)
+        # iter_cutout() may run prefetch cutouts of max_workers requests each.
+        self._init_session(
+            self._volume, volume_cfg, self._volume.max_workers * DEFAULT_PREFETCH)
+
+    def _init_session(self, service, cfg, concurrency=1):
+        """
+        Method to give a service the shared session of its host
+
+        Args:
+            service (intern.service.boss.BossService): Service to configure.
+            cfg (dict): The service's config section.
+            concurrency (optional[int]): Number of requests the service may make at once.
+
+        Returns:
+            None
+        """
+        pool_maxsize = max(DEFAULT_POOL_MAXSIZE, concurrency)
+        if CONFIG_POOL_MAXSIZE in cfg:
+            pool_maxsize = int(cfg[CONFIG_POOL_MAXSIZE])
+        keep_alive = True
+        if CONFIG_KEEP_ALIVE in cfg:
+            keep_alive = cfg[CONFIG_KEEP_ALIVE].strip().lower() in ('1', 'true', 'yes', 'on')
+        service.session = session_manager.get_session(
+            cfg[CONFIG_PROTOCOL], cfg[CONFIG_HOST], pool_maxsize=pool_maxsize,
+            max_retries=int(cfg.get(CONFIG_MAX_RETRIES, DEFAULT_MAX_RETRIES)),
+            retry_backoff=float(cfg.get(CONFIG_RETRY_BACKOFF, DEFAULT_RETRY_BACKOFF)),
+            keep_alive=keep_alive)
 
     def _load_config_section(self, section_name):
         """
@@ -205,6 +296,27 @@ class BossRemote(Remote):
         self._token_volume = value
         self.volume_service.set_auth(self._token_volume)
 
+    @property
+    def metrics(self):
+        """
+        Get the registry of request metrics, such as latency histograms,
+        bytes sent and received and HTTP status counts, grouped by service
+        and operation
+
+        The registry is process-wide: it is
+        intern.service.boss.metrics.default_registry unless the services
+        were given another, and it records the requests of every BossRemote
+        and AsyncBossRemote in the process, whatever their host.  Remotes
+        for the same host share their session (see
+        intern.service.boss.connections), so their requests can't be told
+        apart.  Call reset() on it to start counting afresh.
+
+        Returns:
+            (intern.service.boss.metrics.MetricsRegistry): Call snapshot(),
+            to_json() or to_prometheus() on it.
+        """
+        return self._volume.metrics
+
     def list_groups(self, filtr=None):
         """
         Get the groups the logged in user is a member of.
@@ -0,0 +1,307 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.remote.boss.async_remote import AsyncBossRemote, aiohttp
+from intern.resource.boss.resource import ChannelResource, CollectionResource
+from intern.service.boss.cache import CuboidCache, MemoryCuboidCache
+from intern.service.boss.httperrorlist import HTTPErrorList
+from intern.service.boss.metrics import MetricsRegistry
+from requests import HTTPError
+import asyncio
+import blosc
+import numpy as np
+import unittest
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp not installed')
+class TestAsyncBossRemote(unittest.TestCase):
+    """Runs AsyncBossRemote against a local aiohttp server standing in for the Boss."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.requests = []
+        self.handler = None
+
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self._handle)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        port = self.runner.addresses[0][1]
+
+        self.rmt = AsyncBossRemote({
+            'protocol': 'http', 'host': '127.0.0.1:{}'.format(port), 'token': 'secret'})
+        self.chan = ChannelResource('chan', 'coll', 'exp', 'image', datatype='uint8')
+        self.anno = ChannelResource(
+            'anno', 'coll', 'exp', 'annotation', datatype='uint64', sources=['chan'])
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.rmt.close())
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    async def _handle(self, request):
+        body = await request.read()
+        self.requests.append((request.method, request.path_qs, dict(request.headers), body))
+        resp = self.handler(request, body)
+        if asyncio.iscoroutine(resp):
+            resp = await resp
+        return resp
+
+    def run_coro(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_get_cutout(self):
+        data = np.arange(4*5*6, dtype='uint8').reshape(4, 5, 6)
+        self.handler = lambda req, body: web.Response(
+            body=blosc.compress(data, typesize=1))
+
+        actual = self.run_coro(self.rmt.get_cutout(self.chan, 0, [0, 6], [0, 5], [0, 4]))
+
+        np.testing.assert_array_equal(data, actual)
+        method, path, headers, _ = self.requests[0]
+        self.assertEqual('GET', method)
+        self.assertEqual('/v1/cutout/coll/exp/chan/0/0:6/0:5/0:4/', path)
+        self.assertEqual('application/blosc', headers['Accept'])
+        self.assertEqual('Token secret', headers['Authorization'])
+
+    def test_get_cutout_codec(self):
+        data = np.arange(4*5*6, dtype='uint8').reshape(4, 5, 6)
+        self.handler = lambda req, body: web.Response(body=blosc.pack_array(data))
+        self.rmt.remote.volume_service.download_codec = 'blosc-python'
+
+        actual = self.run_coro(self.rmt.get_cutout(self.chan, 0, [0, 6], [0, 5], [0, 4]))
+
+        np.testing.assert_array_equal(data, actual)
+        self.assertEqual('application/blosc-python', self.requests[0][2]['Accept'])
+
+    def test_get_cutout_local_filter(self):
+        data = np.arange(4*5*6, dtype='uint64').reshape(4, 5, 6)
+        self.handler = lambda req, body: web.Response(
+            body=blosc.compress(data, typesize=8))
+
+        actual = self.run_coro(self.rmt.get_cutout(
+            self.anno, 0, [0, 6], [0, 5], [0, 4], id_list=[3, 7], local_filter=True))
+
+        np.testing.assert_array_equal(np.where((data == 3) | (data == 7), data, 0), actual)
+        self.assertEqual('/v1/cutout/coll/exp/anno/0/0:6/0:5/0:4/', self.requests[0][1])
+
+    def test_get_cutout_metrics(self):
+        data = np.arange(4*5*6, dtype='uint8').reshape(4, 5, 6)
+        self.handler = lambda req, body: web.Response(
+            body=blosc.compress(data, typesize=1))
+        self.rmt.remote.volume_service.metrics = MetricsRegistry()
+
+        self.run_coro(self.rmt.get_cutout(self.chan, 0, [0, 6], [0, 5], [0, 4]))
+
+        stats = self.rmt.metrics.snapshot()['volume']['cutout_get']
+        self.assertEqual(1, stats['count'])
+        self.assertEqual({'200': 1}, stats['statuses'])
+        self.assertEqual(data.nbytes, stats['uncompressed_bytes'])
+
+    def test_get_cutout_failure(self):
+        self.handler = lambda req, body: web.Response(status=403, text='denied')
+
+        with self.assertRaises(HTTPError) as cm:
+            self.run_coro(self.rmt.get_cutout(self.chan, 0, [0, 6], [0, 5], [0, 4]))
+        self.assertEqual(403, cm.exception.response.status_code)
+        self.assertIn('denied', str(cm.exception))
+
+    def test_create_cutout(self):
+        data = np.ones((4, 5, 6), dtype='uint8')
+        self.handler = lambda req, body: web.Response(status=201)
+
+        self.run_coro(self.rmt.create_cutout(self.chan, 0, [0, 6], [0, 5], [0, 4], data))
+
+        method, path, _, body = self.requests[0]
+        self.assertEqual('POST', method)
+        self.assertEqual('/v1/cutout/coll/exp/chan/0/0:6/0:5/0:4/', path)
+        np.testing.assert_array_equal(
+            data.ravel(), np.frombuffer(blosc.decompress(body), dtype='uint8'))
+
+    def _use_small_blocks(self):
+        # Split a 16x16x4 uint8 region into 16 requests.
+        self.rmt.remote.volume_service.request_bytes = 64
+        self.rmt.remote.volume_service.cuboid_size = (4, 4, 4)
+
+    def test_chunked_get_cutout_limits_concurrency(self):
+        self._use_small_blocks()
+        self.rmt.remote.volume_service.max_workers = 3
+        state = {'active': 0, 'max': 0}
+
+        async def handler(req, body):
+            state['active'] += 1
+            state['max'] = max(state['max'], state['active'])
+            await asyncio.sleep(0.01)
+            state['active'] -= 1
+            return web.Response(body=blosc.compress(np.ones(64, np.uint8), typesize=1))
+
+        self.handler = handler
+        actual = self.run_coro(self.rmt.get_cutout(self.chan, 0, [0, 16], [0, 16], [0, 4]))
+
+        self.assertTrue((actual == 1).all())
+        self.assertEqual(16, len(self.requests))
+        self.assertEqual(3, state['max'])
+
+    def test_chunked_get_cutout_fails_fast(self):
+        self._use_small_blocks()
+        self.rmt.remote.volume_service.max_workers = 1
+        self.handler = lambda req, body: web.Response(status=500)
+
+        with self.assertRaises(HTTPErrorList) as cm:
+            self.run_coro(self.rmt.get_cutout(self.chan, 0, [0, 16], [0, 16], [0, 4]))
+        self.assertEqual(1, len(cm.exception.http_errors))
+        # The next block may start before the failure is seen, but the rest are cancelled.
+        self.assertLessEqual(len(self.requests), 2)
+
+    def test_get_cutout_reads_through_cache(self):
+        volume = np.random.randint(0, 255, (16, 512, 1024), np.uint8)
+
+        def handler(req, body):
+            x, y, z = [[int(v) for v in r.split(':')] for r in req.path.strip('/').split('/')[-3:]]
+            return web.Response(body=blosc.compress(
+                np.ascontiguousarray(volume[z[0]:z[1], y[0]:y[1], x[0]:x[1]]), typesize=1))
+        self.handler = handler
+        cache = MemoryCuboidCache()
+        self.rmt.remote.volume_service.cache = cache
+
+        for x in range(400, 600, 50):
+            actual = self.run_coro(self.rmt.get_cutout(self.chan, 0, [x, x + 40], [0, 40], [0, 4]))
+            np.testing.assert_array_equal(volume[0:4, 0:40, x:x + 40], actual)
+
+        # One whole cuboid downloaded per cuboid touched.
+        self.assertEqual(
+            ['/v1/cutout/coll/exp/chan/0/0:512/0:512/0:16/',
+             '/v1/cutout/coll/exp/chan/0/512:1024/0:512/0:16/'],
+            sorted(path for _, path, _, _ in self.requests))
+        self.assertEqual(2, cache.misses)
+        self.assertEqual(3, cache.hits)
+
+    def test_create_cutout_invalidates_cache(self):
+        cache = MemoryCuboidCache()
+        self.rmt.remote.volume_service.cache = cache
+        url_prefix = self.rmt.remote.volume_service.url_prefix
+        key = CuboidCache.key(url_prefix, self.chan, 0, 0, (0, 0, 0))
+        cache.put(key, ((0, 512), (0, 512), (0, 16)), np.zeros((16, 512, 512), np.uint8))
+        self.handler = lambda req, body: web.Response(status=201)
+
+        self.run_coro(self.rmt.create_cutout(
+            self.chan, 0, [0, 6], [0, 5], [0, 4], np.ones((4, 5, 6), np.uint8)))
+
+        self.assertIsNone(cache.lookup(key, ((0, 6), (0, 5), (0, 4))))
+
+    def test_concurrent_requests(self):
+        self.handler = lambda req, body: web.json_response({'start_id': 10})
+
+        async def reserve_many():
+            return await asyncio.gather(*[self.rmt.reserve_ids(self.anno, 5) for _ in range(20)])
+
+        self.assertEqual([10] * 20, self.run_coro(reserve_many()))
+        self.assertEqual(20, len(self.requests))
+
+    def test_get_ids_in_region(self):
+        self.handler = lambda req, body: web.json_response({'ids': ['1', '10']})
+
+        ids = self.run_coro(self.rmt.get_ids_in_region(self.anno, 0, [0, 6], [0, 5], [0, 4]))
+
+        self.assertEqual([1, 10], ids)
+
+    def test_get_bounding_boxes(self):
+        def handler(req, body):
+            obj_id = int(req.path.rstrip('/').split('/')[-1])
+            if obj_id == 13:
+                return web.Response(status=404)
+            return web.json_response({
+                'x_range': [0, obj_id], 'y_range': [1, 2], 'z_range': [3, 4],
+                't_range': [0, 1]})
+
+        self.handler = handler
+        boxes, failures = self.run_coro(
+            self.rmt.get_bounding_boxes(self.anno, 0, [5, 13, 7]))
+
+        self.assertEqual([5, 7], boxes['id'].tolist())
+        self.assertEqual([5, 7], boxes['x1'].tolist())
+        self.assertEqual([13], list(failures))
+        self.assertEqual(404, failures[13].response.status_code)
+
+    def test_get_ids_in_region_as_array(self):
+        self.handler = lambda req, body: web.json_response({'ids': ['10', '1']})
+
+        ids = self.run_coro(self.rmt.get_ids_in_region(
+            self.anno, 0, [0, 6], [0, 5], [0, 4], as_array=True))
+
+        self.assertEqual(np.uint64, ids.dtype)
+        self.assertEqual([1, 10], ids.tolist())
+
+    def test_get_ids_in_region_chunked(self):
+        self.rmt.remote.volume_service.request_bytes = 8 * 4 * 4 * 4
+        self.rmt.remote.volume_service.cuboid_size = (4, 4, 4)
+        self.handler = lambda req, body: web.json_response(
+            {'ids': ['7', str(len(self.requests))]})
+
+        ids = self.run_coro(self.rmt.get_ids_in_region(self.anno, 0, [0, 8], [0, 8], [0, 4]))
+
+        self.assertEqual(4, len(self.requests))
+        self.assertEqual([1, 2, 3, 4, 7], ids)
+
+    def test_get_ids_in_region_requires_annotation_channel(self):
+        with self.assertRaises(TypeError):
+            self.run_coro(self.rmt.get_ids_in_region(self.chan, 0, [0, 6], [0, 5], [0, 4]))
+
+    def test_list_collections(self):
+        self.handler = lambda req, body: web.json_response({'collections': ['a', 'b']})
+
+        self.assertEqual(['a', 'b'], self.run_coro(self.rmt.list_collections()))
+
+    def test_get_project(self):
+        self.handler = lambda req, body: web.json_response(
+            {'name': 'coll', 'description': 'desc', 'experiments': [], 'creator': 'me'})
+
+        coll = self.run_coro(self.rmt.get_project(CollectionResource('coll')))
+
+        self.assertEqual('coll', coll.name)
+        self.assertEqual('desc', coll.description)
+
+    def test_get_metadata(self):
+        self.handler = lambda req, body: web.json_response(
+            {'key': req.query['key'], 'value': req.query['key'].upper()})
+
+        values = self.run_coro(self.rmt.get_metadata(self.chan, ['a', 'b']))
+
+        self.assertEqual({'a': 'A', 'b': 'B'}, values)
+
+    def test_create_metadata_partial_failure(self):
+        self.handler = lambda req, body: web.Response(
+            status=201 if req.query['key'] == 'good' else 400)
+
+        with self.assertRaises(HTTPErrorList) as cm:
+            self.run_coro(self.rmt.create_metadata(self.chan, {'good': 1, 'bad': 2}))
+        self.assertEqual(1, len(cm.exception.http_errors))
+        self.assertEqual(2, len(self.requests))
+
+    def test_get_permissions(self):
+        self.handler = lambda req, body: web.json_response(
+            {'permission-sets': [{'permissions': ['read']}]})
+
+        self.assertEqual(['read'], self.run_coro(self.rmt.get_permissions('grp', self.chan)))
+
+
+if __name__ == '__main__':
+    unittest.main()
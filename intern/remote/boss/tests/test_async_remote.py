@@ -0,0 +1,25 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import unittest
+
+if sys.version_info >= (3, 5):
+    # The test cases use async/await syntax, so they live in a module that
+    # test discovery doesn't import on older versions of Python.
+    from intern.remote.boss.tests.async_remote_cases import *
+
+
+if __name__ == '__main__':
+    unittest.main()
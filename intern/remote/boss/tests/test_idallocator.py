@@ -0,0 +1,131 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.remote.boss.idallocator import IdAllocator
+from intern.resource.boss.resource import ChannelResource
+from requests import HTTPError, Response
+import threading
+import unittest
+
+
+class FakeRemote(object):
+    """Reserves sequential ids, like the Boss."""
+
+    def __init__(self):
+        self.next_id = 1
+        self.calls = []
+        self.fail = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.lock = threading.Lock()
+
+    def reserve_ids(self, resource, num_ids):
+        self.release.wait()
+        with self.lock:
+            self.calls.append(num_ids)
+            if self.fail:
+                self.fail -= 1
+                resp = Response()
+                resp.status_code = 503
+                raise HTTPError('fail', response=resp)
+            start = self.next_id
+            self.next_id += num_ids
+            return start
+
+
+class TestIdAllocator(unittest.TestCase):
+    def setUp(self):
+        self.chan = ChannelResource(
+            'anno', 'foo', 'bar', 'annotation', datatype='uint64', sources=['chan'])
+        self.remote = FakeRemote()
+
+    def test_allocate(self):
+        with IdAllocator(self.remote, self.chan, block_size=10, low_water=0) as ids:
+            self.assertEqual(1, ids.allocate())
+            self.assertEqual(2, ids.allocate(3))
+            self.assertEqual(5, ids.allocate(6))
+            self.assertEqual(0, ids.available)
+
+        self.assertEqual([10], self.remote.calls)
+        self.assertEqual(10, ids.num_allocated)
+
+    def test_range_is_contiguous(self):
+        with IdAllocator(self.remote, self.chan, block_size=10, low_water=0) as ids:
+            ids.allocate(8)
+            # Doesn't fit in the 2 ids left, so comes from the next block.
+            self.assertEqual(11, ids.allocate(5))
+            # The leftover ids are still handed out.
+            self.assertEqual(9, ids.allocate(2))
+
+    def test_large_request_reserved_directly(self):
+        with IdAllocator(self.remote, self.chan, block_size=10) as ids:
+            self.assertEqual(1, ids.allocate(50))
+
+        self.assertEqual([50], self.remote.calls)
+
+    def test_refills_in_background(self):
+        ids = IdAllocator(self.remote, self.chan, block_size=10, low_water=5)
+        ids.allocate(6)
+        ids.close()
+
+        self.assertEqual([10, 10], self.remote.calls)
+        self.assertEqual(14, ids.available)
+
+        # Allocating doesn't wait for the next block while ids are left.
+        self.remote.release.clear()
+        self.assertEqual(7, ids.allocate(4))
+        self.assertEqual(11, ids.allocate(10))
+        self.remote.release.set()
+        ids.close()
+
+    def test_threads_get_unique_ids(self):
+        ids = IdAllocator(self.remote, self.chan, block_size=100)
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(200):
+                start = ids.allocate(3)
+                with lock:
+                    results.extend(range(start, start + 3))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        ids.close()
+
+        self.assertEqual(8 * 200 * 3, len(set(results)))
+        self.assertEqual(8 * 200 * 3, ids.num_allocated)
+
+    def test_failure(self):
+        self.remote.fail = 1
+        ids = IdAllocator(self.remote, self.chan, block_size=10)
+
+        with self.assertRaises(HTTPError):
+            ids.allocate()
+        # The next call tries again.
+        self.assertEqual(1, ids.allocate())
+        ids.close()
+
+    def test_bad_sizes(self):
+        with self.assertRaises(ValueError):
+            IdAllocator(self.remote, self.chan, block_size=0)
+        with self.assertRaises(ValueError):
+            IdAllocator(self.remote, self.chan).allocate(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,7 +19,11 @@ import os
 
 from intern.remote.boss.remote import (
     CONFIG_PROJECT_SECTION, CONFIG_PROTOCOL, CONFIG_HOST, CONFIG_TOKEN,
-    CONFIG_METADATA_SECTION, CONFIG_VOLUME_SECTION)
+    CONFIG_METADATA_SECTION, CONFIG_VOLUME_SECTION, CONFIG_REQUEST_BYTES,
+    CONFIG_CUBOID_SIZE, CONFIG_ALIGNED_UPLOADS, CONFIG_CODEC, CONFIG_CLEVEL, CONFIG_SHUFFLE,
+    CONFIG_NTHREADS, CONFIG_DOWNLOAD_CODEC, CONFIG_MAX_WORKERS, CONFIG_POOL_MAXSIZE,
+    CONFIG_MAX_RETRIES, CONFIG_RETRY_BACKOFF, CONFIG_KEEP_ALIVE)
+from mock import patch
 import unittest
 
 
@@ -130,6 +134,61 @@ class RemoteConfigTest(unittest.TestCase):
         rmt.token_volume = actual_vol[CONFIG_TOKEN]
         rmt.token_project = actual_prj[CONFIG_TOKEN]
 
+    def test_volume_chunking_config(self):
+        rmt = BossRemote({
+            'protocol': 'https', 'host': 'api.theboss.io', 'token': 'secret',
+            CONFIG_REQUEST_BYTES: '1048576', CONFIG_CUBOID_SIZE: '256, 256, 32'})
+        self.assertEqual(1048576, rmt.volume_service.request_bytes)
+        self.assertEqual((256, 256, 32), rmt.volume_service.cuboid_size)
+        self.assertFalse(rmt.volume_service.aligned_uploads)
+
+    def test_volume_aligned_uploads_config(self):
+        rmt = BossRemote({
+            'protocol': 'https', 'host': 'api.theboss.io', 'token': 'secret',
+            CONFIG_ALIGNED_UPLOADS: 'True'})
+        self.assertTrue(rmt.volume_service.aligned_uploads)
+
+    @patch('blosc.set_nthreads')
+    def test_volume_compression_config(self, mock_set_nthreads):
+        rmt = BossRemote({
+            'protocol': 'https', 'host': 'api.theboss.io', 'token': 'secret',
+            CONFIG_CODEC: 'lz4', CONFIG_CLEVEL: '3', CONFIG_SHUFFLE: 'bitshuffle',
+            CONFIG_NTHREADS: '4'})
+        self.assertEqual('lz4', rmt.volume_service.codec)
+        self.assertEqual(3, rmt.volume_service.clevel)
+        self.assertEqual('bitshuffle', rmt.volume_service.shuffle)
+        self.assertEqual(4, rmt.volume_service.nthreads)
+        mock_set_nthreads.assert_called_once_with(4)
+
+    def test_volume_download_codec_config(self):
+        rmt = BossRemote({
+            'protocol': 'https', 'host': 'api.theboss.io', 'token': 'secret',
+            CONFIG_DOWNLOAD_CODEC: 'npygz'})
+        self.assertEqual('npygz', rmt.volume_service.download_codec)
+
+    def test_services_share_session(self):
+        rmt = BossRemote({
+            'protocol': 'https', 'host': 'shared.theboss.io', 'token': 'secret',
+            CONFIG_MAX_WORKERS: '16'})
+        session = rmt.volume_service.session
+        self.assertIs(session, rmt.project_service.session)
+        self.assertIs(session, rmt.metadata_service.session)
+        adapter = session.get_adapter('https://shared.theboss.io/v1/')
+        # Enough connections for iter_cutout() prefetching with 16 workers.
+        self.assertEqual(32, adapter._pool_maxsize)
+
+    def test_session_config(self):
+        rmt = BossRemote({
+            'protocol': 'https', 'host': 'pooled.theboss.io', 'token': 'secret',
+            CONFIG_POOL_MAXSIZE: '64', CONFIG_MAX_RETRIES: '5', CONFIG_RETRY_BACKOFF: '0.25',
+            CONFIG_KEEP_ALIVE: 'false'})
+        session = rmt.volume_service.session
+        adapter = session.get_adapter('https://pooled.theboss.io/v1/')
+        self.assertEqual(64, adapter._pool_maxsize)
+        self.assertEqual(5, adapter.max_retries.total)
+        self.assertEqual(0.25, adapter.max_retries.backoff_factor)
+        self.assertEqual('close', session.headers['Connection'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,169 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.remote.boss.writebuffer import WriteBuffer
+from intern.resource.boss.resource import ChannelResource
+from intern.service.boss.httperrorlist import HTTPErrorList
+from requests import HTTPError, Response
+import numpy
+import threading
+import time
+import unittest
+
+
+class FakeRemote(object):
+    """Keeps a channel's data in a numpy array."""
+
+    def __init__(self, shape, dtype):
+        self.volume = numpy.zeros(shape, dtype)
+        self.gets = 0
+        self.creates = 0
+        self.fail_creates = 0
+        self.lock = threading.Lock()
+
+    def get_cutout(self, resource, resolution, x_range, y_range, z_range, time_range=None):
+        with self.lock:
+            self.gets += 1
+        return self.volume[
+            z_range[0]:z_range[1], y_range[0]:y_range[1], x_range[0]:x_range[1]].copy()
+
+    def create_cutout(self, resource, resolution, x_range, y_range, z_range, data, time_range=None):
+        with self.lock:
+            if self.fail_creates:
+                self.fail_creates -= 1
+                resp = Response()
+                resp.status_code = 503
+                raise HTTPError('fail', response=resp)
+            self.creates += 1
+        self.volume[
+            z_range[0]:z_range[1], y_range[0]:y_range[1], x_range[0]:x_range[1]] = data
+
+
+class TestWriteBuffer(unittest.TestCase):
+    def setUp(self):
+        self.chan = ChannelResource('chan', 'foo', 'bar', 'annotation', datatype='uint8')
+        self.remote = FakeRemote((16, 512, 1024), numpy.uint8)
+        self.remote.volume[:] = 7
+
+    def test_combines_patches(self):
+        expected = self.remote.volume.copy()
+        with WriteBuffer(self.remote, self.chan, 0, max_age=None) as buf:
+            for i in range(100):
+                x = (i * 37) % 1000
+                y = (i * 13) % 500
+                patch = numpy.full((2, 4, 4), i, numpy.uint8)
+                buf.write([x, x + 4], [y, y + 4], [3, 5], patch)
+                expected[3:5, y:y + 4, x:x + 4] = patch
+            self.assertEqual(0, self.remote.creates)
+
+        numpy.testing.assert_array_equal(expected, self.remote.volume)
+        self.assertEqual(100, buf.num_writes)
+        # The patches fall in two cuboids.
+        self.assertEqual(2, self.remote.gets)
+        self.assertEqual(2, buf.num_uploads)
+        self.assertEqual(0, buf.size)
+
+    def test_adjacent_patches_uploaded_together(self):
+        with WriteBuffer(
+                self.remote, self.chan, 0, max_age=None, read_modify_write=False) as buf:
+            for x in range(0, 64, 8):
+                buf.write([x, x + 8], [0, 8], [0, 2], numpy.ones((2, 8, 8), numpy.uint8))
+
+        self.assertEqual(1, buf.num_uploads)
+        self.assertEqual(0, self.remote.gets)
+        self.assertTrue((self.remote.volume[0:2, 0:8, 0:64] == 1).all())
+        self.assertTrue((self.remote.volume[0:2, 0:8, 64:72] == 7).all())
+
+    def test_preserves_concurrent_writes(self):
+        buf = WriteBuffer(self.remote, self.chan, 0, max_age=None, read_modify_write=False)
+        buf.write([0, 4], [0, 4], [0, 1], numpy.ones((1, 4, 4), numpy.uint8))
+        buf.write([10, 14], [0, 4], [0, 1], numpy.ones((1, 4, 4), numpy.uint8))
+        # Another writer changes the same cuboid before the flush.
+        self.remote.volume[0, 0:4, 4:10] = 9
+        buf.close()
+
+        self.assertEqual(2, buf.num_uploads)
+        self.assertTrue((self.remote.volume[0, 0:4, 4:10] == 9).all())
+        self.assertTrue((self.remote.volume[0, 0:4, 10:14] == 1).all())
+
+    def test_read_modify_write(self):
+        with WriteBuffer(self.remote, self.chan, 0, max_age=None) as buf:
+            buf.write([0, 4], [0, 4], [0, 1], numpy.ones((1, 4, 4), numpy.uint8))
+            buf.write([10, 14], [0, 4], [0, 1], numpy.ones((1, 4, 4), numpy.uint8))
+
+        self.assertEqual(1, self.remote.gets)
+        self.assertEqual(1, buf.num_uploads)
+        self.assertTrue((self.remote.volume[0, 0:4, 4:10] == 7).all())
+        self.assertTrue((self.remote.volume[0, 0:4, 10:14] == 1).all())
+
+    def test_full_cuboid_not_read(self):
+        data = numpy.ones((16, 512, 512), numpy.uint8)
+        with WriteBuffer(self.remote, self.chan, 0, max_age=None) as buf:
+            buf.write([512, 1024], [0, 512], [0, 16], data)
+
+        self.assertEqual(0, self.remote.gets)
+        self.assertEqual(1, self.remote.creates)
+        numpy.testing.assert_array_equal(data, self.remote.volume[:, :, 512:])
+
+    def test_custom_cuboid_size(self):
+        data = numpy.ones((16, 64, 64), numpy.uint8)
+        with WriteBuffer(
+                self.remote, self.chan, 0, max_age=None, cuboid_size=(64, 64, 16)) as buf:
+            buf.write([0, 64], [64, 128], [0, 16], data)
+            self.assertEqual(64*64*16*2, buf.size)
+
+        self.assertEqual(0, self.remote.gets)
+        self.assertEqual(1, buf.num_uploads)
+        numpy.testing.assert_array_equal(data, self.remote.volume[:, 64:128, 0:64])
+
+    def test_flush_on_size(self):
+        buf = WriteBuffer(self.remote, self.chan, 0, max_bytes=1, max_age=None)
+        buf.write([0, 4], [0, 4], [0, 1], numpy.ones((1, 4, 4), numpy.uint8))
+        self.assertEqual(1, self.remote.creates)
+        self.assertEqual(0, buf.size)
+        buf.close()
+
+    def test_flush_on_age(self):
+        buf = WriteBuffer(self.remote, self.chan, 0, max_age=0.05)
+        buf.write([0, 4], [0, 4], [0, 1], numpy.ones((1, 4, 4), numpy.uint8))
+        deadline = time.time() + 5
+        while self.remote.creates == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(1, self.remote.creates)
+        buf.close()
+
+    def test_failed_upload_stays_staged(self):
+        buf = WriteBuffer(self.remote, self.chan, 0, max_age=None)
+        buf.write([0, 4], [0, 4], [0, 1], numpy.ones((1, 4, 4), numpy.uint8))
+        self.remote.fail_creates = 1
+        with self.assertRaises(HTTPErrorList):
+            buf.flush()
+        self.assertGreater(buf.size, 0)
+
+        buf.write([4, 8], [0, 4], [0, 1], numpy.full((1, 4, 4), 2, numpy.uint8))
+        buf.close()
+        self.assertEqual(1, self.remote.creates)
+        numpy.testing.assert_array_equal(
+            numpy.ones((4, 4)), self.remote.volume[0, 0:4, 0:4])
+        numpy.testing.assert_array_equal(
+            numpy.full((4, 4), 2), self.remote.volume[0, 0:4, 4:8])
+
+    def test_wrong_shape(self):
+        with WriteBuffer(self.remote, self.chan, 0, max_age=None) as buf:
+            with self.assertRaises(ValueError):
+                buf.write([0, 4], [0, 4], [0, 2], numpy.ones((1, 4, 4), numpy.uint8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,363 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.service.boss.cache import CUBOID_SIZE, cuboid_blocks, cuboid_size_at
+from intern.service.boss.httperrorlist import HTTPErrorList
+from intern.utils.parallel import DEFAULT_MAX_WORKERS, run_parallel
+from requests import HTTPError
+import numpy as np
+import threading
+import time
+
+
+# Default amount of staged data that triggers a flush.
+DEFAULT_WRITE_BUFFER_BYTES = 512*1024*1024
+# Default number of seconds a cuboid may stay staged before the background
+# thread flushes it.
+DEFAULT_WRITE_BUFFER_MAX_AGE = 10.0
+
+
+class _StagedCuboid(object):
+    """Data written to one cuboid at one time sample that hasn't been uploaded.
+
+    Attributes:
+        data (numpy.array): ZYX data of the whole cuboid.
+        mask (numpy.array): True where data was written.
+        created (float): time.time() of the first write.
+    """
+
+    def __init__(self, dtype, cuboid_size):
+        self.data = np.zeros((cuboid_size[2], cuboid_size[1], cuboid_size[0]), dtype=dtype)
+        self.mask = np.zeros(self.data.shape, dtype=bool)
+        self.created = time.time()
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.mask.nbytes
+
+    def merge_older(self, older):
+        """Fill in voxels not written here with those of an older staged cuboid."""
+        keep = older.mask & ~self.mask
+        self.data[keep] = older.data[keep]
+        self.mask |= older.mask
+        self.created = min(self.created, older.created)
+
+
+def _mask_boxes(mask):
+    """Cover the True voxels of a mask with boxes that contain no False voxels.
+
+    Boxes are grown greedily along x, then y, then z from the first voxel not
+    yet covered, so a mask made of a few rectangular writes yields about as
+    many boxes.
+
+    Args:
+        mask (numpy.array): 3D boolean ZYX array.
+
+    Returns:
+        (list[tuple]): ZYX tuples of slices, one per box.
+    """
+    remaining = mask.copy()
+    boxes = []
+    while remaining.any():
+        z, y, x = np.unravel_index(np.argmax(remaining), remaining.shape)
+        row = remaining[z, y, x:]
+        x1 = x + (np.argmin(row) if not row.all() else row.size)
+        y1 = y + 1
+        while y1 < mask.shape[1] and mask[z, y1, x:x1].all():
+            y1 += 1
+        z1 = z + 1
+        while z1 < mask.shape[0] and mask[z1, y:y1, x:x1].all():
+            z1 += 1
+        box = (slice(z, z1), slice(y, y1), slice(x, x1))
+        remaining[box] = False
+        boxes.append(box)
+    return boxes
+
+
+class WriteBuffer(object):
+    """Combines many small writes to a channel into cuboid aligned uploads.
+
+    Writes are copied into in-memory cuboids.  Staged cuboids are uploaded
+    when the buffer grows past max_bytes, when they are older than max_age
+    seconds (checked by a background thread), on flush(), and on close().
+
+    A cuboid that was only partly written is read from the Boss, merged with
+    the staged voxels and uploaded as one request, so any number of scattered
+    writes to a cuboid cost one GET and one POST.  This is only safe if the
+    buffer is the only writer of those cuboids: a write by another client
+    between the read and the upload is overwritten with the stale data that
+    was read.  Pass read_modify_write=False when the channel has concurrent
+    writers.  Partly written cuboids are then uploaded as the smallest set of
+    boxes that contain only written voxels, which the Boss merges into the
+    stored cuboid; adjacent writes still share a box, but each separate patch
+    is its own upload.  Fully written cuboids are never read.
+
+    Use as a context manager to make sure all writes are flushed:
+
+        with WriteBuffer(rmt, chan, 0) as buf:
+            for patch in patches:
+                buf.write(patch.x_range, patch.y_range, patch.z_range, patch.data)
+
+    Attributes:
+        num_writes (int): Number of calls to write().
+        num_uploads (int): Number of create_cutout() requests made.
+        size (int): Bytes currently staged.
+    """
+
+    def __init__(
+            self, remote, resource, resolution,
+            max_bytes=DEFAULT_WRITE_BUFFER_BYTES, max_age=DEFAULT_WRITE_BUFFER_MAX_AGE,
+            max_workers=DEFAULT_MAX_WORKERS, cuboid_size=None, read_modify_write=True):
+        """Constructor.
+
+        Args:
+            remote (intern.remote.Remote): Remote to upload through.
+            resource (intern.resource.boss.resource.ChannelResource): Channel to write to.
+            resolution (int): 0 indicates native resolution.
+            max_bytes (optional[int]): Staged bytes that trigger a flush.
+            max_age (optional[float]): Seconds a cuboid may stay staged.  None disables the background thread.
+            max_workers (optional[int]): Maximum number of cuboids uploaded at once.
+            cuboid_size (optional[tuple|dict]): (x, y, z) size of the server's
+                cuboids, or a dictionary of sizes keyed by resolution.  Defaults
+                to the remote's volume service setting.
+            read_modify_write (optional[bool]): Upload partly written cuboids
+                whole after reading their current data.  Set to False if
+                other clients may write to the same cuboids.
+        """
+        self.remote = remote
+        self.resource = resource
+        self.resolution = resolution
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_workers = max_workers
+        if cuboid_size is None:
+            volume = getattr(remote, 'volume_service', None)
+            cuboid_size = getattr(volume, 'cuboid_size', CUBOID_SIZE)
+        self.cuboid_size = cuboid_size_at(cuboid_size, resolution)
+        self.read_modify_write = read_modify_write
+
+        self.num_writes = 0
+        self.num_uploads = 0
+        self.size = 0
+
+        self._staged = {}
+        self._lock = threading.Lock()
+        # Serializes flushes so uploads of the same cuboid can't overtake each other.
+        self._flush_lock = threading.Lock()
+        self._errors = []
+        self._closed = threading.Event()
+        self._thread = None
+        if max_age is not None:
+            self._thread = threading.Thread(target=self._flush_periodically)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, x_range, y_range, z_range, data, time_range=None):
+        """Stage data to be written to the channel.
+
+        Args:
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            data (numpy.array): A 3D or 4D (time) numpy matrix in (time)ZYX order.
+            time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+
+        Raises:
+            ValueError: if data's shape doesn't match the ranges or the buffer is closed.
+            HTTPErrorList: if a previous background flush failed.
+        """
+        if self._closed.is_set():
+            raise ValueError('Write buffer is closed.')
+
+        shape = (
+            z_range[1] - z_range[0],
+            y_range[1] - y_range[0],
+            x_range[1] - x_range[0])
+        if time_range:
+            shape = (time_range[1] - time_range[0],) + shape
+            t_values = range(time_range[0], time_range[1])
+        else:
+            t_values = [None]
+        if data.shape != shape:
+            raise ValueError('data has shape {}, expected {}'.format(data.shape, shape))
+
+        with self._lock:
+            for index, bounds in cuboid_blocks(x_range, y_range, z_range, self.cuboid_size):
+                origin = [i * s for i, s in zip(index, self.cuboid_size)]
+                staged_index = tuple(
+                    slice(b[0] - o, b[1] - o) for b, o in reversed(list(zip(bounds, origin))))
+                data_index = tuple(
+                    slice(b[0] - r[0], b[1] - r[0])
+                    for b, r in reversed(list(zip(bounds, (x_range, y_range, z_range)))))
+
+                for i, t in enumerate(t_values):
+                    key = (t, index)
+                    staged = self._staged.get(key)
+                    if staged is None:
+                        staged = self._staged[key] = _StagedCuboid(self.resource.datatype, self.cuboid_size)
+                        self.size += staged.nbytes
+                    block = data[i] if time_range else data
+                    staged.data[staged_index] = block[data_index]
+                    staged.mask[staged_index] = True
+            self.num_writes += 1
+            over_budget = self.size > self.max_bytes
+
+        if over_budget:
+            self._flush(lambda keys: self._oldest(keys, self.max_bytes // 2))
+        self._raise_errors()
+
+    def flush(self):
+        """Upload all staged cuboids.
+
+        Raises:
+            HTTPErrorList: if any upload failed.  Failed cuboids stay staged.
+        """
+        self._flush(lambda keys: keys)
+        self._raise_errors()
+
+    def close(self):
+        """Flush all staged cuboids and stop the background thread.
+
+        Raises:
+            HTTPErrorList: if any upload failed.
+        """
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _oldest(self, keys, keep_bytes):
+        """Pick the oldest staged cuboids to flush so that at most keep_bytes stay staged.
+
+        Must be called with the lock held.
+        """
+        keys = sorted(keys, key=lambda k: self._staged[k].created)
+        remaining = self.size
+        selected = []
+        for key in keys:
+            if remaining <= keep_bytes:
+                break
+            selected.append(key)
+            remaining -= self._staged[key].nbytes
+        return selected
+
+    def _flush_periodically(self):
+        interval = min(1.0, self.max_age / 2.0)
+        while not self._closed.wait(interval):
+            now = time.time()
+            self._flush(lambda keys: [
+                k for k in keys if now - self._staged[k].created >= self.max_age])
+
+    def _flush(self, select):
+        """Upload the staged cuboids chosen by select.
+
+        Args:
+            select (callable): Given the staged keys, returns the keys to
+                upload.  Called with the lock held.
+        """
+        with self._flush_lock:
+            with self._lock:
+                keys = select(list(self._staged.keys()))
+                items = [(key, self._staged.pop(key)) for key in keys]
+                for _, staged in items:
+                    self.size -= staged.nbytes
+            if not items:
+                return
+
+            _, errors = run_parallel(self._upload, items, self.max_workers, fail_fast=False)
+
+            with self._lock:
+                for i, e in errors:
+                    key, staged = items[i]
+                    # Put the cuboid back, under any data written since.
+                    newer = self._staged.get(key)
+                    if newer is None:
+                        self._staged[key] = staged
+                        self.size += staged.nbytes
+                    else:
+                        newer.merge_older(staged)
+                    self._errors.append(e)
+
+    def _upload(self, key, staged):
+        """Upload one staged cuboid."""
+        t, index = key
+        time_range = [t, t + 1] if t is not None else None
+        start = [i * s for i, s in zip(index, self.cuboid_size)]
+
+        if staged.mask.all() or not self.read_modify_write:
+            boxes = _mask_boxes(staged.mask)
+        else:
+            boxes = [self._read_and_merge(staged, start, time_range)]
+
+        for local in boxes:
+            data = staged.data[local]
+            if time_range:
+                data = data[np.newaxis]
+            x, y, z = [
+                (o + sl.start, o + sl.stop) for o, sl in zip(start, reversed(local))]
+            self.remote.create_cutout(
+                self.resource, self.resolution, x, y, z, data, time_range)
+            with self._lock:
+                self.num_uploads += 1
+
+    def _read_and_merge(self, staged, start, time_range):
+        """Fill the voxels of a staged cuboid that weren't written with the
+        Boss' current data.
+
+        Returns:
+            (tuple): ZYX slices of the staged cuboid that are ready to upload.
+        """
+        bounds = tuple((o, o + s) for o, s in zip(start, self.cuboid_size))
+        try:
+            existing = self._get(bounds, time_range)
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            # The cuboid extends past the coordinate frame, so only read
+            # the bounding box of the staged data.
+            zs = np.flatnonzero(staged.mask.any(axis=(1, 2)))
+            ys = np.flatnonzero(staged.mask.any(axis=(0, 2)))
+            xs = np.flatnonzero(staged.mask.any(axis=(0, 1)))
+            bounds = (
+                (start[0] + xs[0], start[0] + xs[-1] + 1),
+                (start[1] + ys[0], start[1] + ys[-1] + 1),
+                (start[2] + zs[0], start[2] + zs[-1] + 1))
+            existing = self._get(bounds, time_range)
+
+        local = tuple(
+            slice(b[0] - o, b[1] - o) for b, o in reversed(list(zip(bounds, start))))
+        keep = ~staged.mask[local]
+        staged.data[local][keep] = existing[keep]
+        return local
+
+    def _get(self, bounds, time_range):
+        data = self.remote.get_cutout(
+            self.resource, self.resolution, bounds[0], bounds[1], bounds[2], time_range)
+        return data[0] if time_range else data
+
+    def _raise_errors(self):
+        with self._lock:
+            errors = self._errors
+            self._errors = []
+        if errors:
+            exc = HTTPErrorList('Write buffer failed to upload {} cuboids.'.format(len(errors)))
+            exc.http_errors.extend(errors)
+            raise exc
@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from intern.utils.trace import traced
 import six
 from abc import ABCMeta
 from six.moves import configparser
@@ -125,7 +126,10 @@ class Remote(object):
         """
         return self._project.list(**kwargs)
 
-    def get_cutout(self, resource, resolution, x_range, y_range, z_range, time_range=None, id_list=[]):
+    @traced('Remote.get_cutout')
+    def get_cutout(
+        self, resource, resolution, x_range, y_range, z_range, time_range=None, id_list=[],
+        out=None, **kwargs):
         """Get a cutout from the volume service.
 
         Args:
@@ -136,6 +140,8 @@ class Remote(object):
             z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
             time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
             id_list (optional [list]): list of object ids to filter the cutout by.
+            out (optional [object]): Preallocated buffer to write the cutout into.  Type depends on implementation.
+            kwargs: Options supported by the volume service's implementation, such as codec.
 
         Returns:
             (): Return type depends on volume service's implementation.
@@ -148,8 +154,40 @@ class Remote(object):
         if not resource.valid_volume():
             raise RuntimeError('Resource incompatible with the volume service.')
         return self._volume.get_cutout(
-            resource, resolution, x_range, y_range, z_range, time_range, id_list)
+            resource, resolution, x_range, y_range, z_range, time_range, id_list,
+            out=out, **kwargs)
 
+    def iter_cutout(
+        self, resource, resolution, x_range, y_range, z_range, time_range=None, id_list=[],
+        **kwargs):
+        """Iterate over a region of the volume service one block at a time.
+
+        Use this to process regions that are too large to hold in memory.
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with cutout operations.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+            id_list (optional [list]): list of object ids to filter the cutout by.
+            (**kwargs): Args are implementation dependent, such as block_size, prefetch and order.
+
+        Returns:
+            (generator): Yields (region, data) for each block.  Types depend on the volume service's implementation.
+
+        Raises:
+            RuntimeError when given invalid resource.
+            Other exceptions may be raised depending on the volume service's implementation.
+        """
+        if not resource.valid_volume():
+            raise RuntimeError('Resource incompatible with the volume service.')
+        return self._volume.iter_cutout(
+            resource, resolution, x_range, y_range, z_range, time_range, id_list,
+            **kwargs)
+
+    @traced('Remote.create_cutout')
     def create_cutout(self, resource, resolution, x_range, y_range, z_range, data, time_range=None):
         """Upload a cutout to the volume service.
 
@@ -174,6 +212,7 @@ class Remote(object):
         return self._volume.create_cutout(
             resource, resolution, x_range, y_range, z_range, data, time_range)
 
+    @traced('Remote.reserve_ids')
     def reserve_ids(self, resource, num_ids):
         """Reserve a block of unique, sequential ids for annotations.
 
@@ -189,6 +228,7 @@ class Remote(object):
             raise RuntimeError('Resource incompatible with the volume service.')
         return self._volume.reserve_ids(resource, num_ids)
 
+    @traced('Remote.get_bounding_box')
     def get_bounding_box(self, resource, resolution, id, bb_type='loose'):
         """Get bounding box containing object specified by id.
 
@@ -212,9 +252,34 @@ class Remote(object):
 
         return self._volume.get_bounding_box(resource, resolution, id, bb_type)
 
+    @traced('Remote.get_bounding_boxes')
+    def get_bounding_boxes(self, resource, resolution, ids, bb_type='loose'):
+        """Get the bounding boxes of many objects concurrently.
+
+        Objects whose bounding box can't be retrieved are reported in the
+        failures, rather than stopping the batch.
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with annotation operations.
+            resolution (int): 0 indicates native resolution.
+            ids (list[int]): Ids of the objects of interest.
+            bb_type (optional[string]): Defaults to 'loose'.
+
+        Returns:
+            (tuple): (boxes, failures) where boxes is a numpy structured array with fields id, x0, x1, y0, y1, z0, z1, t0 and t1 for each id that succeeded, and failures is a dictionary of the exception raised for each id that failed.
+        """
+        if not resource.valid_volume():
+            raise RuntimeError('Resource incompatible with the volume service.')
+
+        if bb_type != 'loose' and bb_type != 'tight':
+            raise RuntimeError("bb_type must be either 'loose' or 'tight'.")
+
+        return self._volume.get_bounding_boxes(resource, resolution, ids, bb_type)
+
+    @traced('Remote.get_ids_in_region')
     def get_ids_in_region(
             self, resource, resolution,
-            x_range, y_range, z_range, time_range=[0, 1]):
+            x_range, y_range, z_range, time_range=[0, 1], as_array=False):
         """Get all ids in the region defined by x_range, y_range, z_range.
 
         Args:
@@ -224,13 +289,15 @@ class Remote(object):
             y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
             z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
             time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.  Defaults to [0, 1].
+            as_array (optional [bool]): Return a numpy.uint64 array instead of a list, which is much faster for hundreds of thousands of ids.
 
         Returns:
-            (list[int]): Example: [1, 2, 25].
+            (list[int]|numpy.array): Sorted ids, such as [1, 2, 25].
 
         Raises:
             requests.HTTPError
             TypeError: if resource is not an annotation channel.
         """
         return self._volume.get_ids_in_region(
-            resource, resolution, x_range, y_range, z_range, time_range)
+            resource, resolution, x_range, y_range, z_range, time_range,
+            as_array=as_array)
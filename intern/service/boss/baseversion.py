@@ -250,7 +250,8 @@ class BaseVersion(object):
 
     def get_cutout_request(
         self, resource, method, content, url_prefix, token,
-        resolution, x_range, y_range, z_range, time_range, numpyVolume=None, id_list=[]):
+        resolution, x_range, y_range, z_range, time_range, numpyVolume=None, id_list=[],
+        accept=None):
 
         """Create a request for working with cutouts (part of the Boss' volume service).
 
@@ -267,6 +268,7 @@ class BaseVersion(object):
             time_range (list[int]): time range such as [30, 40] which means t>=30 and t<40.
             numpyVolume (optional numpy array): The data volume encoded in a numpy array.
             id_list (optional [list[int]]): list of object ids to filter the cutout by.
+            accept (optional [string]): HTTP Accept header, the format to download the cutout in, such as 'application/blosc'.
 
         Returns:
             (requests.Request): A newly constructed Request object.
@@ -277,6 +279,8 @@ class BaseVersion(object):
         url = self.build_cutout_url(
             resource, url_prefix, resolution, x_range, y_range, z_range, time_range, id_list)
         headers = self.get_headers(content, token)
+        if accept is not None:
+            headers['Accept'] = accept
         return Request(method, url, headers = headers, data = numpyVolume)
 
     def get_group_request(self, method, content, url_prefix, token, name=None):
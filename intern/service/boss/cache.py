@@ -0,0 +1,427 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client side caches of cutout data, stored one Boss cuboid per entry."""
+
+from intern.service.boss.codecs import BloscCodec
+from intern.utils.parallel import block_bounds, snap_to_cube
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+import blosc
+import json
+import numpy as np
+import os
+import re
+import shutil
+import six
+import struct
+import tempfile
+import threading
+
+
+# Size (x, y, z) of the Boss' cuboids.
+CUBOID_SIZE = (512, 512, 16)
+# Default size limit of a DiskCuboidCache.
+DEFAULT_DISK_CACHE_BYTES = 10*1024*1024*1024
+# Default size limit of a MemoryCuboidCache.
+DEFAULT_MEMORY_CACHE_BYTES = 1024*1024*1024
+
+
+def cuboid_size_at(cuboid_size, resolution):
+    """Get the cuboid size used at a resolution.
+
+    Args:
+        cuboid_size (tuple|dict): (x, y, z) size of the server's cuboids, or a dictionary of sizes keyed by resolution.
+        resolution (int): 0 indicates native resolution.
+
+    Returns:
+        (tuple): (x, y, z) cuboid size.  CUBOID_SIZE for resolutions missing from a dictionary.
+    """
+    if isinstance(cuboid_size, dict):
+        return tuple(cuboid_size.get(resolution, CUBOID_SIZE))
+    return tuple(cuboid_size)
+
+
+def cuboid_blocks(x_range, y_range, z_range, cuboid_size=CUBOID_SIZE):
+    """Split a region at cuboid boundaries.
+
+    Args:
+        x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+        y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+        z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+        cuboid_size (optional[tuple]): (x, y, z) size of the cuboids.
+
+    Returns:
+        (list[tuple]): [((ix, iy, iz), ((x_start, x_stop), (y_start, y_stop), (z_start, z_stop))), ...]
+            The cuboid index of each piece and the part of the region inside that cuboid.
+    """
+    blocks = block_bounds([x_range, y_range, z_range], cuboid_size).tolist()
+    return [
+        (tuple(b[i][0] // cuboid_size[i] for i in range(3)), tuple(tuple(r) for r in b))
+        for b in blocks]
+
+
+def snap_to_cuboids(x_range, y_range, z_range, cuboid_size=CUBOID_SIZE):
+    """Expand a region to cuboid boundaries.
+
+    Args:
+        x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+        y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+        z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+        cuboid_size (optional[tuple]): (x, y, z) size of the cuboids.
+
+    Returns:
+        (tuple): ((x_start, x_stop), (y_start, y_stop), (z_start, z_stop))
+    """
+    snapped = []
+    for rng, size in zip((x_range, y_range, z_range), cuboid_size):
+        lo, hi = snap_to_cube(rng[0], rng[1], chunk_depth=size, q_index=0)
+        # snap_to_cube() returns an inclusive stop.
+        snapped.append((lo, hi - 1))
+    return tuple(snapped)
+
+
+@six.add_metaclass(ABCMeta)
+class CuboidCache(object):
+    """Base class for caches of cutout data.
+
+    Each entry holds the data of one cuboid at one time sample as a ZYX numpy
+    array, along with the bounds of the data.  The bounds usually cover the
+    whole cuboid, but may be smaller near the edge of a coordinate frame.
+    Lookups check the stored bounds, so a cache shared by remotes configured
+    with different cuboid sizes misses rather than returning wrong data.
+
+    Attributes:
+        max_bytes (int): Size limit of the cache.  Least recently used entries are evicted to stay under it.
+        hits (int): Number of lookups answered by the cache.
+        misses (int): Number of lookups not answered by the cache.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url_prefix, resource, resolution, t, index):
+        """Build the key of a cache entry.
+
+        Args:
+            url_prefix (string): Protocol + host such as https://api.theboss.io
+            resource (intern.resource.boss.resource.ChannelResource): Channel of the data.
+            resolution (int): 0 indicates native resolution.
+            t (int): Time sample.
+            index (tuple): (ix, iy, iz) cuboid index.
+
+        Returns:
+            (tuple)
+        """
+        return (
+            url_prefix, resource.coll_name, resource.exp_name, resource.name,
+            int(resolution), int(t), tuple(int(i) for i in index))
+
+    def lookup(self, key, bounds):
+        """Get cached data covering the given bounds.
+
+        Args:
+            key (tuple): Key built with key().
+            bounds (tuple): ((x_start, x_stop), (y_start, y_stop), (z_start, z_stop)) inside the key's cuboid.
+
+        Returns:
+            (numpy.array|None): ZYX data for bounds, or None if not cached.
+        """
+        entry = self._get(key)
+        data = None
+        if entry is not None:
+            stored, arr = entry
+            if all(s[0] <= b[0] and b[1] <= s[1] for s, b in zip(stored, bounds)):
+                data = arr[tuple(
+                    slice(b[0] - s[0], b[1] - s[0])
+                    for s, b in reversed(list(zip(stored, bounds))))]
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    @abstractmethod
+    def put(self, key, bounds, data):
+        """Store data in the cache.
+
+        Args:
+            key (tuple): Key built with key().
+            bounds (tuple): ((x_start, x_stop), (y_start, y_stop), (z_start, z_stop)) covered by data.
+            data (numpy.array): ZYX data.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove an entry, if present.
+
+        Args:
+            key (tuple): Key built with key().
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        """Remove all entries."""
+        raise NotImplementedError
+
+    def invalidate(
+            self, url_prefix, resource, resolution, x_range, y_range, z_range, time_range=None,
+            cuboid_size=CUBOID_SIZE):
+        """Remove all entries overlapping a region.
+
+        Args:
+            url_prefix (string): Protocol + host such as https://api.theboss.io
+            resource (intern.resource.boss.resource.ChannelResource): Channel of the data.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+            cuboid_size (optional[tuple|dict]): Cuboid size the entries were stored with.  See cuboid_size_at().
+        """
+        if not time_range:
+            time_range = [0, 1]
+        cuboid_size = cuboid_size_at(cuboid_size, resolution)
+        for index, _ in cuboid_blocks(x_range, y_range, z_range, cuboid_size):
+            for t in range(time_range[0], time_range[1]):
+                self.delete(self.key(url_prefix, resource, resolution, t, index))
+
+    @abstractmethod
+    def _get(self, key):
+        """Get an entry.
+
+        Args:
+            key (tuple): Key built with key().
+
+        Returns:
+            (tuple|None): (bounds, data) or None if not cached.
+        """
+        raise NotImplementedError
+
+
+class DiskCuboidCache(CuboidCache):
+    """Cache that stores blosc compressed cuboids as files in a directory.
+
+    The cache persists between sessions.  A file's modification time records
+    when it was last used, so that the least recently used files are evicted
+    first when the cache grows past max_bytes.  The files are listed once,
+    when the cache is created, and tracked in memory afterwards.  Files
+    written by other processes sharing the directory aren't counted until
+    the next session.
+
+    Attributes:
+        directory (string): Root directory of the cache.
+        size (int): Current size of the cache's files in bytes.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_DISK_CACHE_BYTES):
+        """Constructor.
+
+        Args:
+            directory (string): Root directory of the cache.  Created if it doesn't exist.
+            max_bytes (optional[int]): Size limit of the cache.
+        """
+        CuboidCache.__init__(self, max_bytes)
+        self.directory = os.path.expanduser(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # Size of each file, least recently used first.
+        self._index = OrderedDict()
+        self.size = 0
+        for _, size, path in sorted(self._list_files()):
+            self._index[path] = size
+            self.size += size
+
+    def _path(self, key):
+        host = re.sub(r'[^A-Za-z0-9.\-]', '_', key[0])
+        file_name = '{}_{}_{}.cub'.format(*key[6])
+        return os.path.join(
+            self.directory, host, key[1], key[2], key[3], str(key[4]), str(key[5]), file_name)
+
+    def _list_files(self):
+        """Get (modified time, size, path) of every file in the cache."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.cub'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                header = json.loads(fh.readline().decode('utf-8'))
+                compressed = fh.read()
+            # Mark as recently used.
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        with self._lock:
+            size = self._index.pop(path, None)
+            if size is not None:
+                self._index[path] = size
+
+        try:
+            data = np.empty(header['shape'], dtype=header['dtype'])
+            # Checks the blosc header's size against data before decompressing.
+            BloscCodec().decode_into(compressed, data)
+            bounds = tuple(tuple(b) for b in header['bounds'])
+        except (KeyError, TypeError, ValueError, struct.error):
+            # Corrupt or hand edited file.
+            self.delete(key)
+            return None
+        return bounds, data
+
+    def put(self, key, bounds, data):
+        data = np.ascontiguousarray(data)
+        header = json.dumps({
+            'bounds': [list(b) for b in bounds],
+            'dtype': str(data.dtype),
+            'shape': list(data.shape)
+        })
+        compressed = blosc.compress(data, typesize=data.dtype.itemsize)
+
+        path = self._path(key)
+        dir_name = os.path.dirname(path)
+        if not os.path.isdir(dir_name):
+            try:
+                os.makedirs(dir_name)
+            except OSError:
+                # Created by another thread.
+                pass
+
+        # Write to a temporary file first so readers never see partial data.
+        fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(header.encode('utf-8') + b'\n')
+            fh.write(compressed)
+        new_size = os.path.getsize(tmp_path)
+
+        with self._lock:
+            old_size = self._index.pop(path, 0)
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                # Windows won't rename over an existing file.
+                os.remove(path)
+                os.rename(tmp_path, path)
+            self._index[path] = new_size
+            self.size += new_size - old_size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        path = self._path(key)
+        with self._lock:
+            self.size -= self._index.pop(path, 0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+            self._index.clear()
+            self.size = 0
+
+    def _evict(self):
+        """Remove least recently used files until the cache fits in max_bytes.
+
+        Must be called with the lock held.
+        """
+        while self.size > self.max_bytes and self._index:
+            path, size = self._index.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class MemoryCuboidCache(CuboidCache):
+    """Cache that keeps cuboids in memory for the life of the process.
+
+    Suited to interactive tools that make many small, overlapping requests.
+    Least recently used cuboids are evicted once the cached arrays take more
+    than max_bytes.
+
+    Attributes:
+        size (int): Current size of the cached arrays in bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_CACHE_BYTES):
+        """Constructor.
+
+        Args:
+            max_bytes (optional[int]): Size limit of the cache.
+        """
+        CuboidCache.__init__(self, max_bytes)
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                # Move to the most recently used end.
+                self._entries[key] = entry
+        return entry
+
+    def put(self, key, bounds, data):
+        # Copy so that a view doesn't keep a larger array alive.
+        data = data.copy()
+        if data.nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1].nbytes
+            self._entries[key] = (tuple(tuple(b) for b in bounds), data)
+            self.size += data.nbytes
+
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
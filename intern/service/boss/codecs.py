@@ -0,0 +1,178 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Wire formats that cutouts may be downloaded in."""
+
+from abc import ABCMeta, abstractmethod
+from io import BytesIO
+import blosc
+import numpy as np
+import six
+import struct
+import zlib
+
+
+# Name of the codec used when none is given.
+DEFAULT_CODEC = 'blosc'
+# Bytes decompressed at a time by NpyGzipCodec.
+NPYGZ_CHUNK_BYTES = 4*1024*1024
+
+
+@six.add_metaclass(ABCMeta)
+class CutoutCodec(object):
+    """Decodes cutouts downloaded in one wire format.
+
+    Attributes:
+        name (string): Name used to select the codec, such as 'blosc'.
+        mime_type (string): Value of the Accept header that requests the format.
+    """
+    name = None
+    mime_type = None
+
+    @abstractmethod
+    def decode_into(self, content, out):
+        """Decode a response body into the memory of an array.
+
+        Args:
+            content (bytes): Response body.
+            out (numpy.array): Destination array, with the cutout's shape and datatype.
+
+        Raises:
+            ValueError: if the body doesn't hold data of out's size and datatype.
+        """
+        raise NotImplementedError
+
+    def _check_size(self, nbytes, out):
+        if nbytes != out.nbytes:
+            raise ValueError(
+                "Cutout data is {} bytes, but {} bytes were expected".format(
+                    nbytes, out.nbytes))
+
+
+class BloscCodec(CutoutCodec):
+    """Raw array data compressed with blosc.
+
+    The data is decompressed straight into out when it is contiguous.
+    """
+    name = 'blosc'
+    mime_type = 'application/blosc'
+
+    def decode_into(self, content, out):
+        # Bytes 4-8 of the blosc header hold the uncompressed size.
+        self._check_size(struct.unpack('<I', content[4:8])[0], out)
+
+        if out.flags['C_CONTIGUOUS']:
+            blosc.decompress_ptr(content, out.__array_interface__['data'][0])
+        else:
+            tmp = np.empty(out.shape, dtype=out.dtype)
+            blosc.decompress_ptr(content, tmp.__array_interface__['data'][0])
+            out[...] = tmp
+
+
+class BloscPythonCodec(CutoutCodec):
+    """A pickled numpy array compressed by blosc.pack_array().
+
+    The array carries its own shape and datatype, but unpickling means the
+    data is copied once into out, and the server must be trusted.
+    """
+    name = 'blosc-python'
+    mime_type = 'application/blosc-python'
+
+    def decode_into(self, content, out):
+        data = blosc.unpack_array(content)
+        if data.dtype != out.dtype:
+            raise ValueError(
+                "Cutout data has dtype {}, but {} was expected".format(data.dtype, out.dtype))
+        self._check_size(data.nbytes, out)
+        out[...] = data.reshape(out.shape)
+
+
+class NpyGzipCodec(CutoutCodec):
+    """A .npy file compressed with gzip.
+
+    The data is decompressed NPYGZ_CHUNK_BYTES at a time straight into out
+    when it is contiguous, so no full size temporary buffer is needed.
+    """
+    name = 'npygz'
+    mime_type = 'application/npygz'
+
+    def decode_into(self, content, out):
+        stream = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        pending = [content]
+
+        def read(nbytes):
+            chunks = []
+            while nbytes > 0 and (pending[0] or not stream.eof):
+                chunk = stream.decompress(pending[0], nbytes)
+                pending[0] = stream.unconsumed_tail
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                nbytes -= len(chunk)
+            return b''.join(chunks)
+
+        header = read(12)
+        if header[:6] != b'\x93NUMPY':
+            raise ValueError("Cutout data is not a .npy file")
+        if six.indexbytes(header, 6) == 1:
+            header_len = struct.unpack('<H', header[8:10])[0] + 10
+        else:
+            header_len = struct.unpack('<I', header[8:12])[0] + 12
+        header += read(header_len - len(header))
+        fp = BytesIO(header)
+        if np.lib.format.read_magic(fp) == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fp)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fp)
+        if dtype != out.dtype or fortran_order:
+            raise ValueError(
+                "Cutout data has dtype {}, but C ordered {} was expected".format(
+                    dtype, out.dtype))
+        self._check_size(int(np.prod(shape)) * dtype.itemsize, out)
+
+        target = out if out.flags['C_CONTIGUOUS'] else np.empty(out.shape, out.dtype)
+        view = memoryview(target.reshape(-1).view(np.uint8))
+        offset = 0
+        while offset < target.nbytes:
+            chunk = read(min(NPYGZ_CHUNK_BYTES, target.nbytes - offset))
+            if not chunk:
+                raise ValueError("Cutout data ended after {} bytes".format(offset))
+            view[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        if target is not out:
+            out[...] = target
+
+
+CODECS = {codec.name: codec for codec in (BloscCodec(), BloscPythonCodec(), NpyGzipCodec())}
+
+
+def get_codec(codec):
+    """Get a download codec.
+
+    Args:
+        codec (string|CutoutCodec): Name of a codec in CODECS, or a codec.
+
+    Returns:
+        (CutoutCodec)
+
+    Raises:
+        ValueError: if there is no codec with the given name.
+    """
+    if isinstance(codec, CutoutCodec):
+        return codec
+    try:
+        return CODECS[codec]
+    except KeyError:
+        raise ValueError("Unknown cutout codec {}, expected one of {}".format(
+            codec, ', '.join(sorted(CODECS))))
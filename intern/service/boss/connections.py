@@ -0,0 +1,110 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""HTTP sessions shared by every service that talks to the same host."""
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+import threading
+
+try:
+    from urllib3.util.retry import Retry
+except ImportError:
+    from requests.packages.urllib3.util.retry import Retry
+
+
+# Default number of connections kept open to each host.  Requests beyond it
+# still go out, but their connections are closed afterwards.
+DEFAULT_POOL_MAXSIZE = 10
+# Default number of times a request that failed to connect, or that got one
+# of RETRY_STATUSES, is retried.  Only idempotent methods are retried, so
+# uploads keep their own retries (see VolumeService.upload_retries).
+DEFAULT_MAX_RETRIES = 0
+# Default backoff between retries: backoff_factor * 2 ** (retry - 1) seconds.
+DEFAULT_RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (502, 503, 504)
+
+
+class SessionManager(object):
+    """Hands out one requests.Session per protocol and host.
+
+    Each session's adapter keeps up to pool_maxsize connections to its host
+    alive, so concurrent requests reuse connections instead of making a new
+    TCP and TLS handshake each time.  Asking for a larger pool grows the
+    existing one.  Retry and keep-alive settings are shared by every user of
+    a session, so a call asking for different ones replaces them for all.
+    The adapter, and with it the pool of open connections, is only replaced
+    when the pool size or retry settings change.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        # (pool_maxsize, max_retries, retry_backoff) of each session's adapter.
+        self._settings = {}
+        self._lock = threading.Lock()
+
+    def get_session(
+            self, protocol, host, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+            max_retries=DEFAULT_MAX_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF,
+            keep_alive=True):
+        """Get the shared session of a host.
+
+        Args:
+            protocol (string): Protocol such as 'https'.
+            host (string): Host such as 'api.theboss.io'.
+            pool_maxsize (optional[int]): Number of connections to keep open to the host.
+            max_retries (optional[int]): Number of times to retry idempotent requests.
+            retry_backoff (optional[float]): Backoff factor between retries.
+            keep_alive (optional[bool]): False to close each connection after its request.
+
+        Returns:
+            (requests.Session)
+        """
+        key = (protocol, host)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = Session()
+            old_settings = self._settings.get(key)
+            if old_settings is not None:
+                pool_maxsize = max(pool_maxsize, old_settings[0])
+            settings = (pool_maxsize, max_retries, retry_backoff)
+
+            if settings != old_settings:
+                # Like requests' default, read errors aren't retried, so a
+                # timeout is still raised as a ReadTimeout.
+                retries = Retry(
+                    total=max_retries, read=False, backoff_factor=retry_backoff,
+                    status_forcelist=RETRY_STATUSES, raise_on_status=False)
+                prefix = '{}://{}'.format(protocol, host)
+                old = session.adapters.get(prefix)
+                session.mount(
+                    prefix, HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retries))
+                if old is not None:
+                    old.close()
+                self._settings[key] = settings
+            session.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+            return session
+
+    def close(self):
+        """Close every session's connections."""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+            self._settings = {}
+
+
+# Sessions shared by all BossRemotes in the process.
+session_manager = SessionManager()
@@ -0,0 +1,300 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per request metrics of the HTTP traffic to the Boss."""
+
+from six.moves.urllib.parse import urlparse
+import bisect
+import json
+import re
+import struct
+import threading
+import time
+
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Path segment holding the API version, such as 'v1'.
+VERSION_SEGMENT = re.compile(r'^(v\d+(\.\d+)*|latest)$')
+
+# (service, operation) of the first path segment after the API version of
+# each Boss route.  Routes not listed belong to the project service.
+ROUTES = {
+    'cutout': ('volume', 'cutout'),
+    'ids': ('volume', 'ids'),
+    'boundingbox': ('volume', 'bbox'),
+    'reserve': ('volume', 'reserve'),
+    'meta': ('metadata', 'metadata'),
+}
+
+
+def classify(method, url):
+    """Get the service and operation a request belongs to.
+
+    The route is the path segment after the API version, so names such as
+    'meta' further along the path, which may be resource names, are ignored.
+    Cutout operations are split by method, such as 'cutout_get' and
+    'cutout_post'.
+
+    Args:
+        method (string): HTTP verb such as 'GET'.
+        url (string): Request URL.
+
+    Returns:
+        (tuple): (service, operation) such as ('volume', 'cutout_get').
+    """
+    segments = [s for s in urlparse(url).path.split('/') if s]
+    route = segments[0] if segments else None
+    for i, segment in enumerate(segments[:-1]):
+        if VERSION_SEGMENT.match(segment):
+            route = segments[i + 1]
+            break
+
+    if route not in ROUTES:
+        return 'project', 'project'
+    service, operation = ROUTES[route]
+    if operation == 'cutout':
+        operation = 'cutout_' + method.lower()
+    return service, operation
+
+
+def _blosc_nbytes(data):
+    """Get the uncompressed size of a blosc buffer, or None if data isn't one."""
+    # The blosc header holds the version, flags, uncompressed size and compressed size.
+    if not isinstance(data, bytes) or len(data) < 16 or data[:1] not in (b'\x01', b'\x02'):
+        return None
+    nbytes, _, cbytes = struct.unpack('<III', data[4:16])
+    return nbytes if cbytes == len(data) else None
+
+
+class _OperationStats(object):
+    """Totals of the requests of one operation."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # Wire and uncompressed size of the blosc bodies sent or received.
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+        self.statuses = {}
+        self.retries = 0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'latency_sum': self.latency_sum,
+            'latency_buckets': dict(zip(
+                [str(b) for b in LATENCY_BUCKETS] + ['+Inf'],
+                [sum(self.buckets[:i + 1]) for i in range(len(self.buckets))])),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'compressed_bytes': self.compressed_bytes,
+            'uncompressed_bytes': self.uncompressed_bytes,
+            'compression_ratio': (
+                self.uncompressed_bytes / float(self.compressed_bytes)
+                if self.compressed_bytes else None),
+            'statuses': {str(s): n for s, n in self.statuses.items()},
+            'retries': self.retries,
+        }
+
+
+class MetricsRegistry(object):
+    """Collects latency, size, status and retry metrics of HTTP requests.
+
+    Requests are recorded by a response hook installed on each session with
+    instrument(), and grouped by the service and operation of their URL (see
+    classify()).  Latency runs from sending the request until the whole
+    response body was received.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def instrument(self, session):
+        """Record the requests sent through a session.
+
+        Installing the hook more than once has no effect.
+
+        Args:
+            session (requests.Session): Session to instrument.
+        """
+        hooks = session.hooks.setdefault('response', [])
+        if self._on_response not in hooks:
+            hooks.append(self._on_response)
+
+    def uninstrument(self, session):
+        """Stop recording the requests sent through a session.
+
+        Args:
+            session (requests.Session): Session given to instrument().
+        """
+        hooks = session.hooks.get('response', [])
+        while self._on_response in hooks:
+            hooks.remove(self._on_response)
+
+    def _on_response(self, resp, *args, **kwargs):
+        # A failure to record metrics must not fail the request.
+        try:
+            self.record_response(resp)
+        except Exception:
+            pass
+        return resp
+
+    def record_response(self, resp):
+        """Record a response and the request it answers.
+
+        Reads the response body, if it wasn't read yet.
+
+        Args:
+            resp (requests.Response): Response to record.
+        """
+        req = resp.request
+        start = time.time()
+        content = resp.content or b''
+        latency = resp.elapsed.total_seconds() + (time.time() - start)
+
+        body = req.body or b''
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8') if hasattr(body, 'encode') else b''
+        compressed = uncompressed = 0
+        for data in (body, content):
+            nbytes = _blosc_nbytes(data)
+            if nbytes is not None:
+                compressed += len(data)
+                uncompressed += nbytes
+
+        retries = getattr(getattr(resp.raw, 'retries', None), 'history', None) or ()
+        service, operation = classify(req.method, req.url)
+        self.record(
+            service, operation, resp.status_code, latency, len(body), len(content),
+            compressed, uncompressed, len(retries))
+
+    def record(
+            self, service, operation, status, latency, bytes_sent=0, bytes_received=0,
+            compressed_bytes=0, uncompressed_bytes=0, retries=0):
+        """Record one request.
+
+        Args:
+            service (string): Service such as 'volume'.
+            operation (string): Operation such as 'cutout_get'.
+            status (int): HTTP status code.
+            latency (float): Seconds the request took.
+            bytes_sent (optional[int]): Size of the request body.
+            bytes_received (optional[int]): Size of the response body.
+            compressed_bytes (optional[int]): Size of the blosc bodies.
+            uncompressed_bytes (optional[int]): Uncompressed size of the blosc bodies.
+            retries (optional[int]): Number of times the request was retried.
+        """
+        with self._lock:
+            stats = self._stats.get((service, operation))
+            if stats is None:
+                stats = self._stats[(service, operation)] = _OperationStats()
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            stats.count += 1
+            stats.latency_sum += latency
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.compressed_bytes += compressed_bytes
+            stats.uncompressed_bytes += uncompressed_bytes
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.retries += retries
+
+    def reset(self):
+        """Forget all recorded requests."""
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self):
+        """Get the metrics recorded so far.
+
+        Returns:
+            (dict): Metrics keyed by service, then operation, such as
+                {'volume': {'cutout_get': {'count': 3, 'latency_sum': 0.4,
+                'latency_buckets': {'0.005': 0, ..., '+Inf': 3},
+                'bytes_sent': 0, 'bytes_received': 1024, 'compressed_bytes': 1024,
+                'uncompressed_bytes': 4096, 'compression_ratio': 4.0,
+                'statuses': {'200': 3}, 'retries': 0}}}.  Latency buckets are
+                cumulative counts.
+        """
+        with self._lock:
+            result = {}
+            for (service, operation), stats in self._stats.items():
+                result.setdefault(service, {})[operation] = stats.to_dict()
+            return result
+
+    def to_json(self):
+        """Get the metrics recorded so far as a JSON string.  See snapshot()."""
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+    def to_prometheus(self):
+        """Get the metrics recorded so far in the Prometheus text format.
+
+        Returns:
+            (string)
+        """
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        snapshot = self.snapshot()
+        ops = [
+            (service, operation, snapshot[service][operation])
+            for service in sorted(snapshot) for operation in sorted(snapshot[service])]
+
+        def labels(service, operation, **extra):
+            pairs = [('service', service), ('operation', operation)] + sorted(extra.items())
+            return '{' + ','.join('{}="{}"'.format(k, v) for k, v in pairs) + '}'
+
+        family('intern_request_duration_seconds', 'histogram', 'Boss request latency.')
+        for service, operation, stats in ops:
+            for le in [str(b) for b in LATENCY_BUCKETS] + ['+Inf']:
+                lines.append('intern_request_duration_seconds_bucket{} {}'.format(
+                    labels(service, operation, le=le), stats['latency_buckets'][le]))
+            lines.append('intern_request_duration_seconds_sum{} {}'.format(
+                labels(service, operation), repr(stats['latency_sum'])))
+            lines.append('intern_request_duration_seconds_count{} {}'.format(
+                labels(service, operation), stats['count']))
+
+        family('intern_requests_total', 'counter', 'Boss requests by HTTP status.')
+        for service, operation, stats in ops:
+            for status in sorted(stats['statuses']):
+                lines.append('intern_requests_total{} {}'.format(
+                    labels(service, operation, status=status), stats['statuses'][status]))
+
+        counters = [
+            ('intern_request_sent_bytes_total', 'bytes_sent', 'Request body bytes.'),
+            ('intern_request_received_bytes_total', 'bytes_received', 'Response body bytes.'),
+            ('intern_request_compressed_bytes_total', 'compressed_bytes',
+             'Wire bytes of blosc request and response bodies.'),
+            ('intern_request_uncompressed_bytes_total', 'uncompressed_bytes',
+             'Uncompressed bytes of blosc request and response bodies.'),
+            ('intern_request_retries_total', 'retries', 'Retries of Boss requests.'),
+        ]
+        for name, key, help_text in counters:
+            family(name, 'counter', help_text)
+            for service, operation, stats in ops:
+                lines.append('{}{} {}'.format(name, labels(service, operation), stats[key]))
+
+        return '\n'.join(lines) + '\n'
+
+
+# Registry used by Boss services unless they are given another.
+default_registry = MetricsRegistry()
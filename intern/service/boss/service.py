@@ -13,6 +13,7 @@
 # limitations under the License.
 
 from intern.service.service import Service
+from intern.service.boss.metrics import default_registry
 from requests import Session
 
 
@@ -22,6 +23,8 @@ class BossService(Service):
     Attributes:
         _versions (dictionary): Stores supported versions of the Boss API.
         _session (requests.Session): The HTTP session used for each service.
+        _owns_session (bool): Whether _session was created by, and is closed with, this service.
+        _metrics (intern.service.boss.metrics.MetricsRegistry): Records the requests sent through _session.
         _session_send_opts (dictionary): Options to use when sending requests.  See http://docs.python-requests.org/en/master/api/#sessionapi
     """
 
@@ -29,16 +32,47 @@ class BossService(Service):
         Service.__init__(self)
         self._versions = {}
         self._session = Session()
+        self._owns_session = True
         self._session_send_opts = {}
+        self._metrics = default_registry
+        self._metrics.instrument(self._session)
 
     def __del__(self):
-        if self._session is not None:
+        if self._session is not None and self._owns_session:
             self._session.close()
 
     @property
     def session(self):
         return self._session
 
+    @session.setter
+    def session(self, session):
+        # A session set here is shared, such as one from
+        # intern.service.boss.connections.session_manager, so it isn't closed
+        # when this service is deleted.
+        if self._session is not None and self._owns_session:
+            self._session.close()
+        self._session = session
+        self._owns_session = False
+        self._metrics.instrument(session)
+
+    @property
+    def metrics(self):
+        """Registry of the metrics of this service's requests.
+
+        Returns:
+            (intern.service.boss.metrics.MetricsRegistry)
+        """
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, registry):
+        # A shared session stops reporting to the old registry for every
+        # service that uses it.
+        self._metrics.uninstrument(self._session)
+        self._metrics = registry
+        registry.instrument(self._session)
+
     @property
     def session_send_opts(self):
         return self._session_send_opts
@@ -0,0 +1,230 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.service.boss.cache import (
+    DiskCuboidCache, MemoryCuboidCache, cuboid_blocks, cuboid_size_at, snap_to_cuboids)
+from intern.resource.boss.resource import ChannelResource
+import mock
+import numpy
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class TestCuboidBlocks(unittest.TestCase):
+    def test_cuboid_blocks(self):
+        actual = sorted(cuboid_blocks([500, 600], [0, 10], [10, 20]))
+        expected = [
+            ((0, 0, 0), ((500, 512), (0, 10), (10, 16))),
+            ((0, 0, 1), ((500, 512), (0, 10), (16, 20))),
+            ((1, 0, 0), ((512, 600), (0, 10), (10, 16))),
+            ((1, 0, 1), ((512, 600), (0, 10), (16, 20))),
+        ]
+        self.assertEqual(expected, actual)
+
+    def test_cuboid_blocks_custom_size(self):
+        actual = sorted(cuboid_blocks([60, 70], [0, 10], [0, 10], (64, 64, 64)))
+        expected = [
+            ((0, 0, 0), ((60, 64), (0, 10), (0, 10))),
+            ((1, 0, 0), ((64, 70), (0, 10), (0, 10))),
+        ]
+        self.assertEqual(expected, actual)
+        self.assertEqual(
+            ((0, 128), (0, 64), (0, 64)),
+            snap_to_cuboids([60, 70], [0, 10], [0, 10], (64, 64, 64)))
+
+    def test_cuboid_size_at(self):
+        self.assertEqual((64, 64, 64), cuboid_size_at({1: (64, 64, 64)}, 1))
+        self.assertEqual((512, 512, 16), cuboid_size_at({1: (64, 64, 64)}, 0))
+        self.assertEqual((32, 32, 8), cuboid_size_at((32, 32, 8), 3))
+
+    def test_snap_to_cuboids(self):
+        self.assertEqual(
+            ((512, 1024), (0, 512), (32, 48)),
+            snap_to_cuboids([512, 600], [0, 512], [33, 40]))
+
+    def test_snap_to_cuboids_spans_cuboids(self):
+        self.assertEqual(
+            ((0, 1024), (0, 512), (0, 32)),
+            snap_to_cuboids([500, 513], [1, 2], [15, 17]))
+
+
+class TestDiskCuboidCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = DiskCuboidCache(self.dir, max_bytes=64*1024*1024)
+        self.chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint16')
+        self.url_prefix = 'https://api.theboss.io'
+        self.bounds = ((0, 512), (0, 512), (0, 16))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def key(self, t=0, index=(0, 0, 0)):
+        return self.cache.key(self.url_prefix, self.chan, 0, t, index)
+
+    def test_put_lookup(self):
+        data = numpy.random.randint(0, 3000, (16, 512, 512), numpy.uint16)
+        self.cache.put(self.key(), self.bounds, data)
+
+        actual = self.cache.lookup(self.key(), ((10, 20), (30, 50), (2, 5)))
+        numpy.testing.assert_array_equal(data[2:5, 30:50, 10:20], actual)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(0, self.cache.misses)
+
+    def test_lookup_miss(self):
+        self.assertIsNone(self.cache.lookup(self.key(), self.bounds))
+        self.assertEqual(1, self.cache.misses)
+
+    def test_lookup_outside_partial_entry(self):
+        data = numpy.zeros((16, 10, 10), numpy.uint16)
+        self.cache.put(self.key(), ((0, 10), (0, 10), (0, 16)), data)
+
+        self.assertIsNone(self.cache.lookup(self.key(), ((5, 15), (0, 10), (0, 16))))
+        self.assertIsNotNone(self.cache.lookup(self.key(), ((5, 10), (0, 10), (0, 16))))
+
+    def test_lookup_corrupt_header(self):
+        data = numpy.ones((16, 512, 512), numpy.uint16)
+        self.cache.put(self.key(), self.bounds, data)
+        path = self.cache._path(self.key())
+        with open(path, 'rb') as fh:
+            fh.readline()
+            compressed = fh.read()
+        with open(path, 'wb') as fh:
+            fh.write(b'{"bounds": [[0, 1], [0, 1], [0, 1]], "dtype": "uint16", "shape": [1, 1, 1]}\n')
+            fh.write(compressed)
+
+        self.assertIsNone(self.cache.lookup(self.key(), ((0, 1), (0, 1), (0, 1))))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(0, self.cache.size)
+
+    def test_persists(self):
+        data = numpy.ones((16, 512, 512), numpy.uint16)
+        self.cache.put(self.key(), self.bounds, data)
+
+        cache2 = DiskCuboidCache(self.dir, max_bytes=64*1024*1024)
+        self.assertEqual(self.cache.size, cache2.size)
+        numpy.testing.assert_array_equal(data, cache2.lookup(self.key(), self.bounds))
+
+    def test_evicts_least_recently_used(self):
+        for t in range(3):
+            data = numpy.random.randint(0, 3000, (16, 64, 512), numpy.uint16)
+            self.cache.put(self.key(t), ((0, 512), (0, 64), (0, 16)), data)
+            # Make sure modification times differ.
+            os.utime(self.cache._path(self.key(t)), (t, t))
+        size = self.cache.size
+
+        # Use t=0 so that t=1 is the least recently used.
+        self.cache.lookup(self.key(0), ((0, 1), (0, 1), (0, 1)))
+        self.cache.max_bytes = size - 1
+        data = numpy.zeros((16, 1, 1), numpy.uint16)
+        self.cache.put(self.key(3), ((0, 1), (0, 1), (0, 1)), data)
+
+        self.assertIsNone(self.cache.lookup(self.key(1), ((0, 1), (0, 1), (0, 1))))
+        self.assertIsNotNone(self.cache.lookup(self.key(0), ((0, 1), (0, 1), (0, 1))))
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+
+    def test_evict_does_not_list_files(self):
+        data = numpy.zeros((16, 64, 512), numpy.uint16)
+        self.cache.put(self.key(0), ((0, 512), (0, 64), (0, 16)), data)
+        self.cache.max_bytes = self.cache.size
+
+        with mock.patch.object(self.cache, '_list_files', side_effect=AssertionError):
+            for t in range(1, 4):
+                self.cache.put(self.key(t), ((0, 512), (0, 64), (0, 16)), data)
+
+        self.assertIsNone(self.cache.lookup(self.key(2), ((0, 1), (0, 1), (0, 1))))
+        self.assertIsNotNone(self.cache.lookup(self.key(3), ((0, 1), (0, 1), (0, 1))))
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+
+    def test_reopened_evicts_oldest_file(self):
+        data = numpy.zeros((16, 64, 512), numpy.uint16)
+        for t in range(3):
+            self.cache.put(self.key(t), ((0, 512), (0, 64), (0, 16)), data)
+        # t=1 is the least recently used.
+        for t, mtime in ((0, 20), (1, 10), (2, 30)):
+            os.utime(self.cache._path(self.key(t)), (mtime, mtime))
+
+        cache2 = DiskCuboidCache(self.dir, max_bytes=self.cache.size - 1)
+        cache2.put(self.key(3), ((0, 1), (0, 1), (0, 1)), numpy.zeros((1, 1, 1), numpy.uint16))
+
+        self.assertFalse(os.path.exists(self.cache._path(self.key(1))))
+        self.assertTrue(os.path.exists(self.cache._path(self.key(0))))
+
+    def test_invalidate(self):
+        data = numpy.zeros((16, 512, 512), numpy.uint16)
+        self.cache.put(self.key(0, (0, 0, 0)), self.bounds, data)
+        self.cache.put(self.key(0, (2, 0, 0)), self.bounds, data)
+
+        self.cache.invalidate(self.url_prefix, self.chan, 0, [0, 10], [0, 10], [0, 10])
+
+        self.assertIsNone(self.cache.lookup(self.key(0, (0, 0, 0)), self.bounds))
+        self.assertIsNotNone(self.cache.lookup(self.key(0, (2, 0, 0)), self.bounds))
+
+    def test_clear(self):
+        self.cache.put(self.key(), self.bounds, numpy.zeros((16, 512, 512), numpy.uint16))
+        self.cache.clear()
+        self.assertEqual(0, self.cache.size)
+        self.assertIsNone(self.cache.lookup(self.key(), self.bounds))
+
+
+class TestMemoryCuboidCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryCuboidCache(max_bytes=3 * 16 * 16 * 16)
+        self.chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        self.bounds = ((0, 16), (0, 16), (0, 16))
+
+    def key(self, t):
+        return self.cache.key('https://api.theboss.io', self.chan, 0, t, (0, 0, 0))
+
+    def test_put_lookup(self):
+        data = numpy.random.randint(0, 255, (16, 16, 16), numpy.uint8)
+        self.cache.put(self.key(0), self.bounds, data)
+
+        actual = self.cache.lookup(self.key(0), ((1, 3), (4, 8), (0, 2)))
+        numpy.testing.assert_array_equal(data[0:2, 4:8, 1:3], actual)
+        self.assertIsNone(self.cache.lookup(self.key(1), self.bounds))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_evicts_least_recently_used(self):
+        data = numpy.zeros((16, 16, 16), numpy.uint8)
+        for t in range(3):
+            self.cache.put(self.key(t), self.bounds, data)
+        self.cache.lookup(self.key(0), self.bounds)
+        self.cache.put(self.key(3), self.bounds, data)
+
+        self.assertEqual(3 * data.nbytes, self.cache.size)
+        self.assertIsNone(self.cache.lookup(self.key(1), self.bounds))
+        self.assertIsNotNone(self.cache.lookup(self.key(0), self.bounds))
+
+    def test_too_large(self):
+        data = numpy.zeros((64, 16, 16), numpy.uint8)
+        self.cache.put(self.key(0), ((0, 16), (0, 16), (0, 64)), data)
+        self.assertEqual(0, self.cache.size)
+
+    def test_delete_and_clear(self):
+        data = numpy.zeros((16, 16, 16), numpy.uint8)
+        self.cache.put(self.key(0), self.bounds, data)
+        self.cache.put(self.key(1), self.bounds, data)
+        self.cache.delete(self.key(0))
+        self.assertEqual(data.nbytes, self.cache.size)
+        self.cache.clear()
+        self.assertEqual(0, self.cache.size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.service.boss import codecs
+from intern.service.boss.codecs import CODECS, BloscCodec, get_codec
+from io import BytesIO
+import blosc
+import gzip
+import numpy
+import unittest
+
+
+def encode(name, data):
+    """Encode data the way the Boss does for each format."""
+    if name == 'blosc':
+        return blosc.compress(data, typesize=data.dtype.itemsize)
+    if name == 'blosc-python':
+        return blosc.pack_array(data)
+    buf = BytesIO()
+    numpy.save(buf, data)
+    out = BytesIO()
+    with gzip.GzipFile(fileobj=out, mode='wb') as f:
+        f.write(buf.getvalue())
+    return out.getvalue()
+
+
+class TestCodecs(unittest.TestCase):
+    def setUp(self):
+        self.data = numpy.random.randint(0, 5000, (3, 20, 30)).astype(numpy.uint64)
+
+    def test_decode_into(self):
+        for name, codec in CODECS.items():
+            out = numpy.empty_like(self.data)
+            codec.decode_into(encode(name, self.data), out)
+            numpy.testing.assert_array_equal(self.data, out, err_msg=name)
+
+    def test_decode_into_slice(self):
+        for name, codec in CODECS.items():
+            out = numpy.zeros((3, 20, 40), numpy.uint64)
+            codec.decode_into(encode(name, self.data), out[:, :, 5:35])
+            numpy.testing.assert_array_equal(self.data, out[:, :, 5:35], err_msg=name)
+            self.assertFalse(out[:, :, :5].any())
+            self.assertFalse(out[:, :, 35:].any())
+
+    def test_npygz_small_chunks(self):
+        out = numpy.empty_like(self.data)
+        old_chunk = codecs.NPYGZ_CHUNK_BYTES
+        codecs.NPYGZ_CHUNK_BYTES = 100
+        try:
+            get_codec('npygz').decode_into(encode('npygz', self.data), out)
+        finally:
+            codecs.NPYGZ_CHUNK_BYTES = old_chunk
+        numpy.testing.assert_array_equal(self.data, out)
+
+    def test_wrong_size(self):
+        for name, codec in CODECS.items():
+            with self.assertRaises(ValueError):
+                codec.decode_into(encode(name, self.data), numpy.empty((3, 20, 31), numpy.uint64))
+
+    def test_wrong_dtype(self):
+        for name in ('blosc-python', 'npygz'):
+            with self.assertRaises(ValueError):
+                get_codec(name).decode_into(
+                    encode(name, self.data), numpy.empty((3, 20, 60), numpy.uint32))
+
+    def test_npygz_truncated(self):
+        with self.assertRaises(ValueError):
+            get_codec('npygz').decode_into(
+                encode('npygz', self.data)[:-100], numpy.empty_like(self.data))
+
+    def test_get_codec(self):
+        codec = BloscCodec()
+        self.assertIs(codec, get_codec(codec))
+        self.assertEqual('application/npygz', get_codec('npygz').mime_type)
+        with self.assertRaises(ValueError):
+            get_codec('tiff')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.service.boss.connections import SessionManager
+from intern.service.boss.project import ProjectService
+from requests.exceptions import ReadTimeout
+import socket
+import unittest
+from mock import patch
+
+
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = SessionManager()
+
+    def tearDown(self):
+        self.manager.close()
+
+    def adapter(self, session, url='https://api.theboss.io/v1/'):
+        return session.get_adapter(url)
+
+    def test_one_session_per_host(self):
+        first = self.manager.get_session('https', 'api.theboss.io')
+        self.assertIs(first, self.manager.get_session('https', 'api.theboss.io'))
+        self.assertIsNot(first, self.manager.get_session('https', 'other.theboss.io'))
+        self.assertIsNot(first, self.manager.get_session('http', 'api.theboss.io'))
+
+    def test_pool_settings(self):
+        session = self.manager.get_session(
+            'https', 'api.theboss.io', pool_maxsize=32, max_retries=3, retry_backoff=0.1)
+
+        adapter = self.adapter(session)
+        self.assertEqual(32, adapter._pool_maxsize)
+        self.assertEqual(3, adapter.max_retries.total)
+        self.assertEqual(0.1, adapter.max_retries.backoff_factor)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+        self.assertEqual('keep-alive', session.headers['Connection'])
+
+    def test_pool_only_grows(self):
+        self.manager.get_session('https', 'api.theboss.io', pool_maxsize=32)
+        session = self.manager.get_session('https', 'api.theboss.io', pool_maxsize=8)
+
+        self.assertEqual(32, self.adapter(session)._pool_maxsize)
+
+    def test_same_settings_keep_adapter(self):
+        session = self.manager.get_session('https', 'api.theboss.io', pool_maxsize=32)
+        adapter = self.adapter(session)
+
+        self.manager.get_session('https', 'api.theboss.io', pool_maxsize=32)
+        self.manager.get_session('https', 'api.theboss.io', pool_maxsize=8)
+        self.assertIs(adapter, self.adapter(session))
+
+        self.manager.get_session('https', 'api.theboss.io', pool_maxsize=32, max_retries=2)
+        self.assertIsNot(adapter, self.adapter(session))
+
+    def test_read_timeout_not_retried(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        try:
+            host = '127.0.0.1:{}'.format(server.getsockname()[1])
+            session = self.manager.get_session('http', host)
+
+            self.assertFalse(self.adapter(session, 'http://' + host).max_retries.read)
+            # The server accepts the connection but never answers.
+            with self.assertRaises(ReadTimeout):
+                session.get('http://{}/v1/'.format(host), timeout=0.1)
+        finally:
+            server.close()
+
+    def test_no_keep_alive(self):
+        session = self.manager.get_session('https', 'api.theboss.io', keep_alive=False)
+
+        self.assertEqual('close', session.headers['Connection'])
+
+    def test_service_does_not_close_shared_session(self):
+        session = self.manager.get_session('https', 'api.theboss.io')
+        service = ProjectService('api.theboss.io', 'v1')
+        own_session = service.session
+
+        with patch.object(own_session, 'close') as own_close:
+            service.session = session
+        own_close.assert_called_once_with()
+
+        with patch.object(session, 'close') as shared_close:
+            service.__del__()
+        shared_close.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.remote.boss import BossRemote
+from intern.resource.boss.resource import ChannelResource
+from intern.service.boss.metrics import MetricsRegistry, classify
+from requests import Session
+from six.moves import BaseHTTPServer
+import blosc
+import json
+import numpy
+import threading
+import unittest
+
+
+DATA = numpy.arange(4*5*6, dtype=numpy.uint16).reshape(4, 5, 6)
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers cutout GETs with DATA and everything else with a 404."""
+
+    def do_GET(self):
+        if '/cutout/' in self.path:
+            self._respond(200, blosc.compress(DATA, typesize=2))
+        else:
+            self._respond(404, b'{"message": "not found"}')
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self._respond(201, b'')
+
+    def _respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_classify(self):
+        prefix = 'https://api.theboss.io/v1'
+        self.assertEqual(
+            ('volume', 'cutout_get'), classify('GET', prefix + '/cutout/c/e/ch/0/0:1/0:1/0:1/'))
+        self.assertEqual(
+            ('volume', 'cutout_post'), classify('POST', prefix + '/cutout/c/e/ch/0/0:1/0:1/0:1/'))
+        self.assertEqual(('volume', 'ids'), classify('GET', prefix + '/ids/c/e/ch/0/0:1/0:1/0:1/'))
+        self.assertEqual(
+            ('volume', 'bbox'), classify('GET', prefix + '/boundingbox/c/e/ch/0/5/?type=loose'))
+        self.assertEqual(('volume', 'reserve'), classify('GET', prefix + '/reserve/c/e/ch/10'))
+        self.assertEqual(('metadata', 'metadata'), classify('GET', prefix + '/meta/c/?key=k'))
+        self.assertEqual(('project', 'project'), classify('GET', prefix + '/collection/c/'))
+        # Resources named like routes.
+        self.assertEqual(('project', 'project'), classify('GET', prefix + '/collection/meta/'))
+        self.assertEqual(
+            ('project', 'project'), classify('GET', prefix + '/collection/c/experiment/ids/'))
+        self.assertEqual(
+            ('volume', 'cutout_get'), classify('GET', prefix + '/cutout/meta/e/ids/0/0:1/0:1/0:1/'))
+
+    def test_record(self):
+        self.registry.record('volume', 'cutout_get', 200, 0.02, 0, 100, 100, 400)
+        self.registry.record('volume', 'cutout_get', 503, 3.0, retries=2)
+
+        stats = self.registry.snapshot()['volume']['cutout_get']
+        self.assertEqual(2, stats['count'])
+        self.assertAlmostEqual(3.02, stats['latency_sum'])
+        self.assertEqual(0, stats['latency_buckets']['0.01'])
+        self.assertEqual(1, stats['latency_buckets']['0.025'])
+        self.assertEqual(2, stats['latency_buckets']['+Inf'])
+        self.assertEqual(4.0, stats['compression_ratio'])
+        self.assertEqual({'200': 1, '503': 1}, stats['statuses'])
+        self.assertEqual(2, stats['retries'])
+        self.assertEqual(self.registry.snapshot(), json.loads(self.registry.to_json()))
+
+        self.registry.reset()
+        self.assertEqual({}, self.registry.snapshot())
+
+    def test_to_prometheus(self):
+        self.registry.record('volume', 'cutout_get', 200, 0.02, 0, 100, 100, 400)
+
+        text = self.registry.to_prometheus()
+
+        self.assertIn('# TYPE intern_request_duration_seconds histogram', text)
+        self.assertIn(
+            'intern_request_duration_seconds_bucket'
+            '{service="volume",operation="cutout_get",le="+Inf"} 1', text)
+        self.assertIn(
+            'intern_requests_total{service="volume",operation="cutout_get",status="200"} 1', text)
+        self.assertIn(
+            'intern_request_uncompressed_bytes_total'
+            '{service="volume",operation="cutout_get"} 400', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_instrument(self):
+        session = Session()
+        self.registry.instrument(session)
+        self.registry.instrument(session)
+        self.assertEqual(1, len(session.hooks['response']))
+
+        session.get(self.url + '/v1/collection/c/')
+        session.post(self.url + '/v1/cutout/c/e/ch/0/0:6/0:5/0:4/',
+                     data=blosc.compress(DATA, typesize=2))
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual({'404': 1}, snapshot['project']['project']['statuses'])
+        post = snapshot['volume']['cutout_post']
+        self.assertEqual(DATA.nbytes, post['uncompressed_bytes'])
+        self.assertEqual(post['compressed_bytes'], post['bytes_sent'])
+
+        self.registry.uninstrument(session)
+        session.get(self.url + '/v1/collection/c/')
+        self.assertEqual(1, self.registry.snapshot()['project']['project']['count'])
+
+    def test_remote_metrics(self):
+        rmt = BossRemote({
+            'protocol': 'http', 'host': self.url.split('//')[1], 'token': 'secret'})
+        rmt.volume_service.metrics = self.registry
+        chan = ChannelResource('ch', 'c', 'e', 'image', datatype='uint16')
+
+        actual = rmt.get_cutout(chan, 0, [0, 6], [0, 5], [0, 4])
+
+        numpy.testing.assert_array_equal(DATA, actual)
+        self.assertIs(self.registry, rmt.metrics)
+        stats = rmt.metrics.snapshot()['volume']['cutout_get']
+        self.assertEqual(1, stats['count'])
+        self.assertEqual(DATA.nbytes, stats['uncompressed_bytes'])
+        self.assertEqual({'200': 1}, stats['statuses'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,9 +14,17 @@
 
 from intern.service.boss.v1.volume import VolumeService_1
 from intern.resource.boss.resource import ChannelResource
+from intern.service.boss.httperrorlist import HTTPErrorList
+from intern.service.boss.cache import DiskCuboidCache, MemoryCuboidCache
+from intern.utils import trace
 import blosc
+import json
 import numpy
+import six
 from requests import HTTPError, PreparedRequest, Response, Session
+import os
+import shutil
+import tempfile
 import unittest
 from mock import patch
 
@@ -70,6 +78,171 @@ class TestVolume_v1(unittest.TestCase):
                 self.chan, resolution, x_range, y_range, z_range, time_range, data,
                 url_prefix, auth, mock_session, send_opts)
 
+    @patch('requests.Session', autospec=True)
+    def test_create_cutout_chunked_retries_failed_blocks(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        data = numpy.zeros((1025, 16, 64, 64), numpy.uint8)
+        data += (numpy.arange(0, 1025) % 256).astype(numpy.uint8)[:, None, None, None]
+
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        attempts = []
+
+        def send(prep, **kwargs):
+            t_rng = prep.url.rstrip('/').split('/')[-1]
+            attempts.append(t_rng)
+            fake_response = Response()
+            # Fail the first attempt at the second block.
+            if t_rng == '1024:1025' and attempts.count(t_rng) == 1:
+                fake_response.status_code = 503
+            else:
+                t_start, t_stop = [int(t) for t in t_rng.split(':')]
+                uploaded = numpy.frombuffer(
+                    blosc.decompress(prep.body), numpy.uint8).reshape(
+                        (t_stop - t_start, 16, 64, 64))
+                numpy.testing.assert_array_equal(data[t_start:t_stop], uploaded)
+                fake_response.status_code = 201
+            return fake_response
+
+        mock_session.send.side_effect = send
+
+        self.vol.create_cutout(
+            chan, 0, [0, 64], [0, 64], [0, 16], [0, 1025], data,
+            'https://api.theboss.io', 'mytoken', mock_session, {})
+
+        self.assertEqual(['0:1024', '1024:1025', '1024:1025'], sorted(attempts))
+
+    @patch('requests.Session', autospec=True)
+    def test_create_cutout_chunked_failure(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        data = numpy.zeros((1025, 16, 64, 64), numpy.uint8)
+
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        fake_response = Response()
+        fake_response.status_code = 403
+        mock_session.send.return_value = fake_response
+
+        with self.assertRaises(HTTPErrorList) as cm:
+            self.vol.create_cutout(
+                chan, 0, [0, 64], [0, 64], [0, 16], [0, 1025], data,
+                'https://api.theboss.io', 'mytoken', mock_session, {})
+
+        # Permission errors are not retried.
+        self.assertEqual(2, mock_session.send.call_count)
+        self.assertEqual(2, len(cm.exception.http_errors))
+
+    @patch('requests.Session', autospec=True)
+    def test_create_cutout_compression(self, mock_session):
+        data = numpy.random.randint(0, 3000, (4, 8, 8), numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        fake_response = Response()
+        fake_response.status_code = 201
+        mock_session.send.return_value = fake_response
+
+        self.vol.create_cutout(
+            self.chan, 0, [0, 8], [0, 8], [0, 4], None, data,
+            'https://api.theboss.io', 'mytoken', mock_session, {},
+            codec='zstd', clevel=5, shuffle='bitshuffle')
+
+        body = mock_session.send.call_args[0][0].body
+        # Byte 3 of the blosc header is the typesize.
+        self.assertEqual(2, six.indexbytes(body, 3))
+        self.assertEqual('Zstd', blosc.get_clib(body))
+        numpy.testing.assert_array_equal(
+            data.ravel(), numpy.frombuffer(blosc.decompress(body), numpy.uint16))
+
+    def test_compress_typesize(self):
+        anno = self.vol.compress(self.anno_chan, numpy.zeros(16, numpy.uint64))
+        self.assertEqual(8, six.indexbytes(anno, 3))
+        image = self.vol.compress(self.chan, numpy.zeros(16, numpy.uint16))
+        self.assertEqual(2, six.indexbytes(image, 3))
+
+    def test_compress_bad_settings(self):
+        data = numpy.zeros(16, numpy.uint16)
+        with self.assertRaises(ValueError):
+            self.vol.compress(self.chan, data, codec='snappy2')
+        with self.assertRaises(ValueError):
+            self.vol.compress(self.chan, data, shuffle='twist')
+        with self.assertRaises(ValueError):
+            self.vol.compress(self.chan, data, clevel=10)
+
+    def _record_upload_send(self, uploads):
+        """Accept a cutout POST and record its (x, y, z) ranges and data."""
+        def send(prep, **kwargs):
+            rngs = prep.url.rstrip('/').split('/')[-3:]
+            (x0, x1), (y0, y1), (z0, z1) = [[int(v) for v in r.split(':')] for r in rngs]
+            uploads.append((
+                ((x0, x1), (y0, y1), (z0, z1)),
+                numpy.frombuffer(blosc.decompress(prep.body), numpy.uint8).reshape(
+                    (z1 - z0, y1 - y0, x1 - x0))))
+            fake_response = Response()
+            fake_response.status_code = 201
+            return fake_response
+        return send
+
+    @patch('requests.Session', autospec=True)
+    def test_create_cutout_report(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        data = numpy.ones((8, 8, 12), numpy.uint8)
+        uploads = []
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = self._record_upload_send(uploads)
+
+        report = self.vol.create_cutout(
+            chan, 0, [2, 14], [0, 8], [0, 8], None, data,
+            'https://api.theboss.io', 'mytoken', mock_session, {}, cuboid_size=(4, 4, 4))
+
+        self.assertEqual(1, len(uploads))
+        self.assertEqual(1, report.requests)
+        self.assertEqual(8, report.aligned_cuboids)
+        self.assertEqual(8, report.partial_cuboids)
+        self.assertEqual(data.nbytes, report.nbytes)
+
+    @patch('requests.Session', autospec=True)
+    def test_create_cutout_aligned(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        data = numpy.random.randint(0, 255, (8, 8, 12), numpy.uint8)
+        uploads = []
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = self._record_upload_send(uploads)
+
+        report = self.vol.create_cutout(
+            chan, 0, [2, 14], [0, 8], [0, 8], None, data,
+            'https://api.theboss.io', 'mytoken', mock_session, {}, cuboid_size=(4, 4, 4),
+            aligned=True)
+
+        self.assertEqual(
+            [((2, 4), (0, 8), (0, 8)), ((4, 12), (0, 8), (0, 8)), ((12, 14), (0, 8), (0, 8))],
+            sorted(region for region, _ in uploads))
+        for ((x0, x1), (y0, y1), (z0, z1)), uploaded in uploads:
+            numpy.testing.assert_array_equal(data[z0:z1, y0:y1, x0 - 2:x1 - 2], uploaded)
+        self.assertEqual(3, report.requests)
+        self.assertEqual(8, report.aligned_cuboids)
+        self.assertEqual(8, report.partial_cuboids)
+
+    @patch('requests.Session', autospec=True)
+    def test_create_cutout_aligned_interior_whole_cuboids(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        data = numpy.zeros((9, 10, 10), numpy.uint8)
+        uploads = []
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = self._record_upload_send(uploads)
+
+        report = self.vol.create_cutout(
+            chan, 0, [1, 11], [1, 11], [0, 9], None, data,
+            'https://api.theboss.io', 'mytoken', mock_session, {}, cuboid_size=(4, 4, 4),
+            request_bytes=64, aligned=True)
+
+        covered = numpy.zeros(data.shape, int)
+        for ((x0, x1), (y0, y1), (z0, z1)), _ in uploads:
+            covered[z0:z1, y0 - 1:y1 - 1, x0 - 1:x1 - 1] += 1
+            inside = x0 >= 4 and x1 <= 8 and y0 >= 4 and y1 <= 8 and z1 <= 8
+            if inside:
+                self.assertEqual(0, x0 % 4 + y0 % 4 + z0 % 4 + x1 % 4 + y1 % 4 + z1 % 4)
+        self.assertTrue((covered == 1).all())
+        self.assertEqual(len(uploads), report.requests)
+        self.assertEqual(2, report.aligned_cuboids)
+        self.assertEqual(3 * 3 * 3 - 2, report.partial_cuboids)
+
     @patch('requests.Session', autospec=True)
     def test_get_cutout_success(self, mock_session):
         resolution = 0
@@ -99,6 +272,394 @@ class TestVolume_v1(unittest.TestCase):
 
         numpy.testing.assert_array_equal(data, actual)
 
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_codec(self, mock_session):
+        data = numpy.random.randint(0, 3000, (4, 5, 6), numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        fake_response = Response()
+        fake_response.status_code = 200
+        fake_response._content = blosc.pack_array(data)
+        mock_session.send.return_value = fake_response
+
+        actual = self.vol.get_cutout(
+            self.chan, 0, [0, 6], [0, 5], [0, 4], None, [],
+            'https://api.theboss.io', 'mytoken', mock_session, {}, codec='blosc-python')
+
+        numpy.testing.assert_array_equal(data, actual)
+        prep = mock_session.send.call_args[0][0]
+        self.assertEqual('application/blosc-python', prep.headers['Accept'])
+
+    def test_get_cutout_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            self.vol.get_cutout(
+                self.chan, 0, [0, 6], [0, 5], [0, 4], None, [],
+                'https://api.theboss.io', 'mytoken', None, {}, codec='tiff')
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_into_out(self, mock_session):
+        resolution = 0
+        x_range = [20, 40]
+        y_range = [50, 70]
+        z_range = [30, 50]
+        time_range = None
+        id_list = []
+        url_prefix = 'https://api.theboss.io'
+        auth = 'mytoken'
+
+        fake_prepped_req = PreparedRequest()
+        fake_prepped_req.headers = {}
+        mock_session.prepare_request.return_value = fake_prepped_req
+
+        data = numpy.random.randint(0, 3000, (20, 20, 20), numpy.uint16)
+        fake_response = Response()
+        fake_response.status_code = 200
+        fake_response._content = blosc.compress(data, typesize=2)
+        mock_session.send.return_value = fake_response
+        send_opts = {}
+
+        out = numpy.zeros((20, 20, 20), numpy.uint16)
+        actual = self.vol.get_cutout(
+            self.chan, resolution, x_range, y_range, z_range, time_range, id_list,
+            url_prefix, auth, mock_session, send_opts, out=out)
+
+        self.assertIs(out, actual)
+        numpy.testing.assert_array_equal(data, out)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_to_path(self, mock_session):
+        volume = numpy.random.randint(0, 3000, (20, 30, 40), numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'cutout.npy')
+            actual = self.vol.get_cutout(
+                self.chan, 0, [0, 40], [0, 30], [0, 20], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {}, out=path)
+
+            self.assertIsInstance(actual, numpy.memmap)
+            del actual
+            stored = numpy.load(path, mmap_mode='r')
+            numpy.testing.assert_array_equal(volume, stored)
+            del stored
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_disk_cache(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        volume = numpy.random.randint(0, 255, (32, 512, 1024), numpy.uint8)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = DiskCuboidCache(tmp_dir)
+            actual = self.vol.get_cutout(
+                chan, 0, [500, 520], [10, 20], [14, 18], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {}, cache=cache)
+            numpy.testing.assert_array_equal(volume[14:18, 10:20, 500:520], actual)
+            # Four whole cuboids downloaded.
+            self.assertEqual(4, mock_session.send.call_count)
+
+            # A nearby region comes entirely from the cache.
+            actual = self.vol.get_cutout(
+                chan, 0, [0, 1024], [100, 110], [0, 32], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {}, cache=cache)
+            numpy.testing.assert_array_equal(volume[0:32, 100:110, 0:1024], actual)
+            self.assertEqual(4, mock_session.send.call_count)
+
+            # Writing invalidates the cuboids it touches.
+            fake_response = Response()
+            fake_response.status_code = 201
+            mock_session.send.side_effect = None
+            mock_session.send.return_value = fake_response
+            self.vol.create_cutout(
+                chan, 0, [0, 10], [0, 10], [0, 10], None,
+                numpy.zeros((10, 10, 10), numpy.uint8),
+                'https://api.theboss.io', 'mytoken', mock_session, {}, cache=cache)
+            bounds = ((0, 10), (0, 10), (0, 10))
+            self.assertIsNone(cache.lookup(
+                cache.key('https://api.theboss.io', chan, 0, 0, (0, 0, 0)), bounds))
+            self.assertIsNotNone(cache.lookup(
+                cache.key('https://api.theboss.io', chan, 0, 0, (1, 0, 0)),
+                ((512, 522), (0, 10), (0, 10))))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_memory_cache_panning(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        volume = numpy.random.randint(0, 255, (16, 512, 1024), numpy.uint8)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+        cache = MemoryCuboidCache()
+
+        for x in range(400, 600, 50):
+            actual = self.vol.get_cutout(
+                chan, 0, [x, x + 40], [0, 40], [0, 4], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {}, cache=cache)
+            numpy.testing.assert_array_equal(volume[0:4, 0:40, x:x + 40], actual)
+
+        # One round trip per cuboid.
+        self.assertEqual(2, mock_session.send.call_count)
+        self.assertEqual(2, cache.misses)
+        self.assertEqual(3, cache.hits)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_out_wrong_dtype(self, mock_session):
+        out = numpy.zeros((20, 20, 20), numpy.uint8)
+
+        with self.assertRaises(ValueError):
+            self.vol.get_cutout(
+                self.chan, 0, [20, 40], [50, 70], [30, 50], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {}, out=out)
+
+        mock_session.send.assert_not_called()
+
+    def test_decompress_into_non_contiguous(self):
+        data = numpy.random.randint(0, 3000, (4, 5, 6), numpy.uint16)
+        out = numpy.zeros((4, 10, 6), numpy.uint16)
+
+        self.vol.decompress_into(blosc.compress(data, typesize=2), out[:, 2:7, :])
+
+        numpy.testing.assert_array_equal(data, out[:, 2:7, :])
+        self.assertFalse(out[:, :2, :].any())
+
+    def test_decompress_into_size_mismatch(self):
+        data = numpy.zeros((4, 5, 6), numpy.uint16)
+        out = numpy.zeros((4, 5, 6), numpy.uint8)
+
+        with self.assertRaises(ValueError):
+            self.vol.decompress_into(blosc.compress(data, typesize=2), out)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_chunked_time_series(self, mock_session):
+        chan = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        x_range = [0, 64]
+        y_range = [0, 64]
+        z_range = [0, 16]
+        time_range = [0, 1025]
+
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+
+        def send(prep, **kwargs):
+            # URL ends with .../x/y/z/t/
+            t_rng = prep.url.rstrip('/').split('/')[-1]
+            t_start, t_stop = [int(t) for t in t_rng.split(':')]
+            data = numpy.zeros((t_stop - t_start, 16, 64, 64), numpy.uint8)
+            data += (numpy.arange(t_start, t_stop) % 256).astype(
+                numpy.uint8)[:, None, None, None]
+            fake_response = Response()
+            fake_response.status_code = 200
+            fake_response._content = blosc.compress(data, typesize=1)
+            return fake_response
+
+        mock_session.send.side_effect = send
+
+        actual = self.vol.get_cutout(
+            chan, 0, x_range, y_range, z_range, time_range, [],
+            'https://api.theboss.io', 'mytoken', mock_session, {})
+
+        self.assertEqual((1025, 16, 64, 64), actual.shape)
+        self.assertEqual(2, mock_session.send.call_count)
+        expected = (numpy.arange(0, 1025) % 256).astype(numpy.uint8)
+        numpy.testing.assert_array_equal(expected, actual[:, 0, 0, 0])
+        numpy.testing.assert_array_equal(expected, actual[:, -1, -1, -1])
+
+    def test_get_block_shape_depends_on_datatype(self):
+        chan8 = ChannelResource('chan', 'foo', 'bar', 'image', datatype='uint8')
+        self.assertEqual(
+            (1024, 1024, 32), self.vol.get_block_shape(chan8, 0, 32*1024*1024))
+        self.assertEqual(
+            (512, 512, 16), self.vol.get_block_shape(self.anno_chan, 0, 32*1024*1024))
+
+    def test_get_block_shape_cuboid_size_by_resolution(self):
+        cuboid_size = {0: (512, 512, 16), 1: (64, 64, 64)}
+        self.assertEqual(
+            (64, 64, 64),
+            self.vol.get_block_shape(self.chan, 1, 1, cuboid_size=cuboid_size))
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_request_bytes(self, mock_session):
+        volume = numpy.random.randint(0, 1000, (16, 100, 100)).astype(numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = lambda prep, **kwargs: self._fake_region_send(volume, prep)
+
+        actual = self.vol.get_cutout(
+            self.chan, 0, [0, 100], [0, 100], [0, 16], None, [],
+            'https://api.theboss.io', 'mytoken', mock_session, {},
+            request_bytes=10000, cuboid_size=(32, 32, 16))
+
+        numpy.testing.assert_array_equal(volume, actual)
+        # 32x32x16 uint16 blocks are 32KiB, more than request_bytes, so each
+        # request is a single cuboid.
+        self.assertEqual(16, mock_session.send.call_count)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_cuboid_size_by_resolution(self, mock_session):
+        volume = numpy.random.randint(0, 1000, (64, 128, 128)).astype(numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = lambda prep, **kwargs: self._fake_region_send(volume, prep)
+
+        actual = self.vol.get_cutout(
+            self.chan, 1, [0, 128], [0, 128], [0, 64], None, [],
+            'https://api.theboss.io', 'mytoken', mock_session, {},
+            request_bytes=100000, cuboid_size={1: (64, 64, 64)})
+
+        numpy.testing.assert_array_equal(volume, actual)
+        # One request per 64x64x64 cuboid.  Blocks must not be re-split with
+        # the default cuboid size.
+        self.assertEqual(4, mock_session.send.call_count)
+
+    def _fake_region_send(self, volume, prep, **kwargs):
+        """Respond to a cutout GET with the matching part of volume (ZYX)."""
+        rngs = prep.url.rstrip('/').split('/')[-3:]
+        (x0, x1), (y0, y1), (z0, z1) = [[int(v) for v in r.split(':')] for r in rngs]
+        fake_response = Response()
+        fake_response.status_code = 200
+        fake_response._content = blosc.compress(
+            numpy.ascontiguousarray(volume[z0:z1, y0:y1, x0:x1]),
+            typesize=volume.dtype.itemsize)
+        return fake_response
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_local_filter(self, mock_session):
+        volume = numpy.random.randint(0, 5000, (4, 10, 12)).astype(numpy.uint64)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+        # Too long to send as a URL filter.
+        id_list = list(range(0, 5000, 2))
+
+        actual = self.vol.get_cutout(
+            self.anno_chan, 0, [0, 12], [0, 10], [0, 4], None, id_list,
+            'https://api.theboss.io', 'mytoken', mock_session, {})
+
+        expected = numpy.where(volume % 2 == 0, volume, 0)
+        numpy.testing.assert_array_equal(expected, actual)
+        prep = mock_session.send.call_args[0][0]
+        self.assertNotIn('filter', prep.url)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_local_filter_forced(self, mock_session):
+        volume = numpy.random.randint(0, 5, (4, 10, 12)).astype(numpy.uint64)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+
+        actual = self.vol.get_cutout(
+            self.anno_chan, 0, [0, 12], [0, 10], [0, 4], None, [1, 3],
+            'https://api.theboss.io', 'mytoken', mock_session, {}, local_filter=True)
+
+        expected = numpy.where((volume == 1) | (volume == 3), volume, 0)
+        numpy.testing.assert_array_equal(expected, actual)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_cutout_trace(self, mock_session):
+        volume = numpy.random.randint(0, 3000, (32, 64, 64), numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+
+        tracer = trace.start_tracing()
+        try:
+            self.vol.get_cutout(
+                self.chan, 0, [0, 64], [0, 64], [0, 32], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {},
+                request_bytes=64*64*16*2, cuboid_size=(64, 64, 16))
+        finally:
+            trace.stop_tracing()
+
+        by_id = {e['args']['id']: e for e in tracer.events}
+        top = [e for e in tracer.events if 'parent' not in e['args']]
+        self.assertEqual(['VolumeService_1.get_cutout'], [e['name'] for e in top])
+        self.assertEqual(2, top[0]['args']['blocks'])
+
+        def ancestors(event):
+            names = []
+            while 'parent' in event['args']:
+                event = by_id[event['args']['parent']]
+                names.append(event['name'])
+            return names
+
+        fetches = [e for e in tracer.events if e['name'] == 'fetch']
+        decompresses = [e for e in tracer.events if e['name'] == 'decompress']
+        self.assertEqual(2, len(fetches))
+        self.assertEqual(2, len(decompresses))
+        for event in fetches + decompresses:
+            self.assertEqual(
+                ['VolumeService_1.get_cutout', 'run_parallel.call', 'run_parallel',
+                 'VolumeService_1.get_cutout'], ancestors(event))
+
+    @patch('requests.Session', autospec=True)
+    def test_iter_cutout(self, mock_session):
+        volume = numpy.random.randint(0, 3000, (20, 30, 40), numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+
+        regions = []
+        for region, data in self.vol.iter_cutout(
+                self.chan, 0, [0, 40], [0, 30], [0, 20], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {},
+                block_size=(16, 16, 8), prefetch=2, order='zyx'):
+            (x0, x1), (y0, y1), (z0, z1) = region
+            numpy.testing.assert_array_equal(volume[z0:z1, y0:y1, x0:x1], data)
+            regions.append(region)
+
+        self.assertEqual(3 * 2 * 3, len(regions))
+        # z changes slowest, x fastest.
+        starts = [(r[2][0], r[1][0], r[0][0]) for r in regions]
+        self.assertEqual(sorted(starts), starts)
+
+    @patch('requests.Session', autospec=True)
+    def test_iter_cutout_stop_early(self, mock_session):
+        volume = numpy.zeros((20, 30, 40), numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+
+        blocks = self.vol.iter_cutout(
+            self.chan, 0, [0, 40], [0, 30], [0, 20], None, [],
+            'https://api.theboss.io', 'mytoken', mock_session, {},
+            block_size=(16, 16, 8), prefetch=1)
+        next(blocks)
+        blocks.close()
+
+        self.assertLessEqual(mock_session.send.call_count, 3)
+
+    @patch('requests.Session', autospec=True)
+    def test_iter_cutout_morton_order(self, mock_session):
+        volume = numpy.random.randint(0, 3000, (20, 30, 40), numpy.uint16)
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        mock_session.send.side_effect = (
+            lambda prep, **kwargs: self._fake_region_send(volume, prep))
+
+        regions = []
+        for region, data in self.vol.iter_cutout(
+                self.chan, 0, [0, 40], [0, 30], [0, 20], None, [],
+                'https://api.theboss.io', 'mytoken', mock_session, {},
+                block_size=(16, 16, 8), prefetch=2, order='morton'):
+            (x0, x1), (y0, y1), (z0, z1) = region
+            numpy.testing.assert_array_equal(volume[z0:z1, y0:y1, x0:x1], data)
+            regions.append(region)
+
+        self.assertEqual(3 * 2 * 3, len(set(regions)))
+        self.assertEqual(((0, 16), (0, 16), (0, 8)), regions[0])
+        self.assertEqual(((16, 32), (0, 16), (0, 8)), regions[1])
+        self.assertEqual(((0, 16), (16, 30), (0, 8)), regions[2])
+
+    def test_iter_cutout_bad_order(self):
+        with self.assertRaises(ValueError):
+            next(self.vol.iter_cutout(
+                self.chan, 0, [0, 40], [0, 30], [0, 20], None, [],
+                'https://api.theboss.io', 'mytoken', None, {}, order='xxz'))
+
     @patch('requests.Session', autospec=True)
     def test_get_cutout_failure(self, mock_session):
         resolution = 0
@@ -153,9 +714,44 @@ class TestVolume_v1(unittest.TestCase):
 
         self.assertEqual(expected, actual)
 
-    @patch('requests.Response', autospec=True)
     @patch('requests.Session', autospec=True)
-    def test_get_ids_in_region_success(self, mock_session, mock_resp):
+    def test_get_bounding_boxes(self, mock_session):
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+
+        def send(prep, **kwargs):
+            obj_id = int(prep.url.split('?')[0].rstrip('/').split('/')[-1])
+            fake_response = Response()
+            if obj_id == 13:
+                fake_response.status_code = 404
+            else:
+                fake_response.status_code = 200
+                fake_response._content = json.dumps({
+                    'x_range': [0, obj_id], 'y_range': [1, 2], 'z_range': [3, 4],
+                    't_range': [0, 1]}).encode()
+            return fake_response
+
+        mock_session.send.side_effect = send
+
+        boxes, failures = self.vol.get_bounding_boxes(
+            self.anno_chan, 0, [5, 13, 7], 'tight',
+            'https://api.theboss.io', 'mytoken', mock_session, {}, max_workers=2)
+
+        self.assertEqual([5, 7], boxes['id'].tolist())
+        self.assertEqual([5, 7], boxes['x1'].tolist())
+        self.assertEqual(
+            (7, 0, 7, 1, 2, 3, 4, 0, 1), tuple(int(v) for v in boxes[1]))
+        self.assertEqual([13], list(failures))
+        self.assertIsInstance(failures[13], HTTPError)
+        self.assertEqual(3, mock_session.send.call_count)
+        self.assertIn('type=tight', mock_session.send.call_args[0][0].url)
+
+    def test_get_bounding_boxes_requires_annotation_channel(self):
+        with self.assertRaises(TypeError):
+            self.vol.get_bounding_boxes(
+                self.chan, 0, [1], 'loose', 'https://api.theboss.io', 'mytoken', None, {})
+
+    @patch('requests.Session', autospec=True)
+    def test_get_ids_in_region_success(self, mock_session):
         resolution = 0
         x_range = [0, 100]
         y_range = [10, 50]
@@ -169,10 +765,10 @@ class TestVolume_v1(unittest.TestCase):
         fake_prepped_req = PreparedRequest()
         fake_prepped_req.headers = {}
         mock_session.prepare_request.return_value = fake_prepped_req
-        mock_session.send.return_value = mock_resp
-
-        mock_resp.status_code = 200
-        mock_resp.json.return_value = { 'ids': ['1', '10'] }
+        fake_response = Response()
+        fake_response.status_code = 200
+        fake_response._content = b'{"ids": ["1", "10"]}'
+        mock_session.send.return_value = fake_response
 
         actual = self.vol.get_ids_in_region(
             self.anno_chan, resolution, x_range, y_range, z_range, t_range,
@@ -182,6 +778,61 @@ class TestVolume_v1(unittest.TestCase):
 
         self.assertEqual(expected, actual)
 
+    @patch('requests.Session', autospec=True)
+    def test_get_ids_in_region_chunked(self, mock_session):
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        regions = []
+
+        def send(prep, **kwargs):
+            rngs = prep.url.rstrip('/').split('/')[-4:-1]
+            (x0, x1), (y0, y1), (z0, z1) = [[int(v) for v in r.split(':')] for r in rngs]
+            regions.append(((x0, x1), (y0, y1), (z0, z1)))
+            fake_response = Response()
+            fake_response.status_code = 200
+            # Every block holds id 7 and an id unique to the block.
+            fake_response._content = json.dumps(
+                {'ids': ['7', str(1000 + x0 + 100 * y0 + 10000 * z0)]}).encode()
+            return fake_response
+
+        mock_session.send.side_effect = send
+
+        actual = self.vol.get_ids_in_region(
+            self.anno_chan, 0, [0, 8], [0, 8], [0, 4], [0, 1],
+            'https://api.theboss.io', 'mytoken', mock_session, {},
+            max_workers=3, request_bytes=8 * 4 * 4 * 4, cuboid_size=(4, 4, 4))
+
+        self.assertEqual(4, len(regions))
+        self.assertEqual([7, 1000, 1004, 1400, 1404], actual)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_ids_in_region_as_array(self, mock_session):
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        fake_response = Response()
+        fake_response.status_code = 200
+        fake_response._content = b'{"ids": ["18446744073709551615", "10", "1", "10"]}'
+        mock_session.send.return_value = fake_response
+
+        actual = self.vol.get_ids_in_region(
+            self.anno_chan, 0, [0, 8], [0, 8], [0, 4], [0, 1],
+            'https://api.theboss.io', 'mytoken', mock_session, {}, as_array=True)
+
+        self.assertEqual(numpy.uint64, actual.dtype)
+        numpy.testing.assert_array_equal(
+            numpy.array([1, 10, 2**64 - 1], numpy.uint64), actual)
+
+    @patch('requests.Session', autospec=True)
+    def test_get_ids_in_region_chunked_failure(self, mock_session):
+        mock_session.prepare_request.side_effect = lambda req: req.prepare()
+        fake_response = Response()
+        fake_response.status_code = 500
+        mock_session.send.return_value = fake_response
+
+        with self.assertRaises(HTTPErrorList):
+            self.vol.get_ids_in_region(
+                self.anno_chan, 0, [0, 8], [0, 8], [0, 4], [0, 1],
+                'https://api.theboss.io', 'mytoken', mock_session, {},
+                max_workers=1, request_bytes=8 * 4 * 4 * 4, cuboid_size=(4, 4, 4))
+
     @patch('requests.Session', autospec=True)
     def test_get_ids_in_region_failure(self, mock_session):
         resolution = 0
@@ -13,11 +13,88 @@
 # limitations under the License.
 from intern.service.boss import BaseVersion
 from intern.service.boss.v1 import BOSS_API_VERSION
+from intern.service.boss.httperrorlist import HTTPErrorList
+from intern.service.boss.cache import CUBOID_SIZE, cuboid_blocks, cuboid_size_at, snap_to_cuboids
+from intern.service.boss.codecs import BloscCodec, get_codec
+from intern.service.boss.codecs import DEFAULT_CODEC as DEFAULT_DOWNLOAD_CODEC
 from intern.resource.boss.resource import *
 from intern.utils.parallel import *
-from requests import HTTPError
+from intern.utils.annotation import filter_ids
+from intern.utils.trace import annotate, in_worker, span, traced
+from requests import HTTPError, RequestException
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 import blosc
 import numpy as np
+import six
+import struct
+
+try:
+    # Optional, faster decoder for large JSON responses such as id lists.
+    from orjson import loads as json_loads
+except ImportError:
+    import json
+
+    def json_loads(content):
+        # The json module only accepts bytes from Python 3.6.
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        return json.loads(content)
+
+
+# Default maximum number of uncompressed bytes sent or received by a single
+# cutout request.  Larger cutouts are split into cuboid aligned blocks.
+DEFAULT_REQUEST_BYTES = 64*1024*1024
+# Number of blocks iter_cutout() downloads ahead of the caller.
+DEFAULT_PREFETCH = 2
+# Maximum number of uncompressed bytes uploaded at once by a chunked
+# create_cutout.
+DEFAULT_MAX_UPLOAD_BYTES = 512*1024*1024
+# Number of times a failed block of a chunked create_cutout is retried.
+DEFAULT_UPLOAD_RETRIES = 2
+# Longest comma separated id_list sent to the server as a filter.  Longer
+# lists are applied locally to an unfiltered cutout instead.
+MAX_FILTER_CHARS = 2000
+# Blosc settings used to compress uploads.
+DEFAULT_CODEC = 'blosclz'
+DEFAULT_CLEVEL = 9
+DEFAULT_SHUFFLE = 'shuffle'
+# Record of get_bounding_boxes(): an id and its [start, stop) bounds.
+BOUNDING_BOX_DTYPE = np.dtype([
+    ('id', np.uint64),
+    ('x0', np.int64), ('x1', np.int64),
+    ('y0', np.int64), ('y1', np.int64),
+    ('z0', np.int64), ('z1', np.int64),
+    ('t0', np.int64), ('t1', np.int64),
+])
+SHUFFLE_MODES = {
+    'noshuffle': blosc.NOSHUFFLE,
+    'shuffle': blosc.SHUFFLE,
+    'bitshuffle': blosc.BITSHUFFLE,
+}
+
+
+class UploadReport(object):
+    """Summary of a create_cutout() call.
+
+    Cuboids are counted once per time sample.
+
+    Attributes:
+        requests (int): Number of POST requests used, not counting retries.
+        aligned_cuboids (int): Cuboids wholly overwritten by the upload.
+        partial_cuboids (int): Cuboids only partly covered by the upload, which the server must merge with their stored data.
+        nbytes (int): Uncompressed bytes uploaded.
+    """
+    def __init__(self, requests=0, aligned_cuboids=0, partial_cuboids=0, nbytes=0):
+        self.requests = requests
+        self.aligned_cuboids = aligned_cuboids
+        self.partial_cuboids = partial_cuboids
+        self.nbytes = nbytes
+
+    def __repr__(self):
+        return (
+            'UploadReport(requests={}, aligned_cuboids={}, partial_cuboids={}, nbytes={})'
+        ).format(self.requests, self.aligned_cuboids, self.partial_cuboids, self.nbytes)
 
 
 class VolumeService_1(BaseVersion):
@@ -41,11 +118,261 @@ class VolumeService_1(BaseVersion):
 
         return bit_width
 
+    def compress(
+            self, resource, numpyVolume, codec=DEFAULT_CODEC, clevel=DEFAULT_CLEVEL,
+            shuffle=DEFAULT_SHUFFLE):
+        """Compress a cutout of a channel with blosc.
+
+        The shuffle filter works on whole elements, so the typesize is the
+        size in bytes of the channel's datatype.
+
+        Args:
+            resource (intern.resource.boss.resource.ChannelResource): Channel of the cutout.
+            numpyVolume (numpy.array): Data to compress.
+            codec (optional[string]): Blosc compressor such as 'blosclz', 'lz4' or 'zstd'.
+            clevel (optional[int]): Compression level from 0 (none) to 9 (most).
+            shuffle (optional[string]): 'shuffle', 'bitshuffle' or 'noshuffle'.
+
+        Returns:
+            (bytes): Blosc compressed data.
+
+        Raises:
+            ValueError: if the codec, level or shuffle mode is not supported.
+        """
+        if codec not in blosc.compressor_list():
+            raise ValueError("Unsupported blosc codec: {}".format(codec))
+        if shuffle not in SHUFFLE_MODES:
+            raise ValueError("Unsupported shuffle mode: {}".format(shuffle))
+        if not 0 <= clevel <= 9:
+            raise ValueError("clevel must be between 0 and 9, got {}".format(clevel))
+        return blosc.compress(
+            np.ascontiguousarray(numpyVolume), typesize=np.dtype(resource.datatype).itemsize,
+            clevel=clevel, shuffle=SHUFFLE_MODES[shuffle], cname=codec)
+
+    def decompress_into(self, compressed, out):
+        """Decompress a blosc buffer directly into the memory of an array.
+
+        If out is not contiguous (for example, a slice of a larger array), the
+        buffer is decompressed into a temporary array of out's shape, then
+        copied into out.
+
+        Args:
+            compressed (bytes): Blosc compressed data.
+            out (numpy.array): Destination array.  Its size in bytes must match
+                the uncompressed size of the buffer.
+
+        Raises:
+            ValueError: if the uncompressed size does not match out.
+        """
+        BloscCodec().decode_into(compressed, out)
+
+    def get_block_shape(
+            self, resource, resolution, request_bytes=DEFAULT_REQUEST_BYTES,
+            cuboid_size=CUBOID_SIZE, extent=None):
+        """Get the shape of the blocks a large cutout of a channel is split into.
+
+        Blocks are cuboid aligned and hold at most request_bytes of the
+        channel's datatype, so uint64 channels get smaller blocks than uint8
+        channels for the same byte budget.
+
+        Args:
+            resource (intern.resource.boss.resource.ChannelResource): Channel of the cutout.
+            resolution (int): 0 indicates native resolution.
+            request_bytes (optional[int]): Maximum uncompressed bytes per block.
+            cuboid_size (optional[tuple|dict]): (x, y, z) size of the server's
+                cuboids, or a dictionary of sizes keyed by resolution.
+            extent (optional[tuple]): (x, y, z) size of the region being split.
+
+        Returns:
+            (tuple): (x, y, z) block size.
+        """
+        itemsize = np.dtype(resource.datatype).itemsize
+        return plan_block_shape(
+            itemsize, request_bytes, cuboid_size_at(cuboid_size, resolution), extent)
+
+    @traced('VolumeService_1._plan_blocks')
+    def _plan_blocks(
+            self, resource, resolution, x_range, y_range, z_range, time_range,
+            request_bytes=DEFAULT_REQUEST_BYTES, cuboid_size=CUBOID_SIZE):
+        """Split a region into cuboid aligned blocks small enough to send in
+        a single request.
+
+        Time series are split along t as well, fitting as many time samples
+        in each block as request_bytes allows.
+
+        Args:
+            resource (intern.resource.boss.resource.ChannelResource): Channel of the cutout.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range ([list[int]]|None): time range such as [30, 40] which means t>=30 and t<40.
+            request_bytes (optional[int]): Maximum uncompressed bytes per block.
+            cuboid_size (optional[tuple|dict]): See get_block_shape().
+
+        Returns:
+            (list[tuple]): [(x_range, y_range, z_range, time_range), ...] time_range is None if not given.
+        """
+        extent = (
+            x_range[1] - x_range[0], y_range[1] - y_range[0], z_range[1] - z_range[0])
+        block_size = self.get_block_shape(
+            resource, resolution, request_bytes, cuboid_size, extent)
+        ranges = [x_range, y_range, z_range]
+
+        if not time_range:
+            return [
+                tuple(tuple(r) for r in b) + (None,)
+                for b in block_bounds(ranges, block_size).tolist()]
+
+        # Fit as many time samples as possible in the largest spatial block.
+        block_bytes = np.dtype(resource.datatype).itemsize
+        for size, ext in zip(block_size, extent):
+            block_bytes *= min(size, ext)
+        t_block = max(1, request_bytes // block_bytes)
+        blocks = block_bounds(
+            ranges + [time_range], tuple(block_size) + (t_block,),
+            origin=(0, 0, 0, time_range[0]))
+        return [tuple(tuple(r) for r in b) for b in blocks.tolist()]
+
+    def _chunk_blocks(
+            self, resource, resolution, x_range, y_range, z_range, time_range, nbytes,
+            request_bytes, cuboid_size):
+        """Get the blocks to split a cutout into, if it is too large for one request.
+
+        Args:
+            resource (intern.resource.boss.resource.ChannelResource): Channel of the cutout.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range ([list[int]]|None): time range such as [30, 40] which means t>=30 and t<40.
+            nbytes (int): Uncompressed size of the cutout.
+            request_bytes (int): Maximum uncompressed bytes per request.
+            cuboid_size (tuple|dict): See get_block_shape().
+
+        Returns:
+            (list[tuple]|None): Blocks as returned by _plan_blocks(), or None
+                if the cutout should be sent as a single request.
+        """
+        if nbytes <= request_bytes:
+            return None
+        blocks = self._plan_blocks(
+            resource, resolution, x_range, y_range, z_range, time_range,
+            request_bytes, cuboid_size)
+        # A single cuboid can't be split further, even if it is larger than
+        # request_bytes.
+        return blocks if len(blocks) > 1 else None
+
+    def _aligned_blocks(
+            self, resource, resolution, interior, shell, time_range, request_bytes,
+            cuboid_size):
+        """Get the blocks of an upload split into whole and partial cuboids.
+
+        Args:
+            resource (intern.resource.boss.resource.ChannelResource): Channel of the cutout.
+            resolution (int): 0 indicates native resolution.
+            interior ([list[tuple]]|None): (x, y, z) ranges of the whole cuboids, as returned by split_aligned().
+            shell (list[list[tuple]]): (x, y, z) ranges of the edges, as returned by split_aligned().
+            time_range ([list[int]]|None): time range such as [30, 40] which means t>=30 and t<40.
+            request_bytes (int): Maximum uncompressed bytes per request.
+            cuboid_size (tuple|dict): See get_block_shape().
+
+        Returns:
+            (list[tuple]|None): Blocks as returned by _plan_blocks(), or None
+                if the cutout should be sent as a single request.
+        """
+        itemsize = np.dtype(resource.datatype).itemsize
+        num_times = time_range[1] - time_range[0] if time_range else 1
+        blocks = []
+        # The interior's blocks are all whole cuboids, since they are cuboid
+        # aligned and so is the interior.
+        for x_range, y_range, z_range in ([interior] if interior else []) + shell:
+            nbytes = itemsize * num_times * (
+                (x_range[1] - x_range[0]) * (y_range[1] - y_range[0]) *
+                (z_range[1] - z_range[0]))
+            blocks.extend(self._chunk_blocks(
+                resource, resolution, x_range, y_range, z_range, time_range, nbytes,
+                request_bytes, cuboid_size) or
+                [(x_range, y_range, z_range, tuple(time_range) if time_range else None)])
+        return blocks if len(blocks) > 1 else None
+
+    def _block_slice(self, block, x_range, y_range, z_range, time_range):
+        """Get the index of a block within the array that holds the whole region.
+
+        Args:
+            block (tuple): (x_range, y_range, z_range, time_range) as returned by _plan_blocks().
+            x_range (list[int]): x range of the whole region.
+            y_range (list[int]): y range of the whole region.
+            z_range (list[int]): z range of the whole region.
+            time_range ([list[int]]|None): time range of the whole region.
+
+        Returns:
+            (tuple): Tuple of slices in (time)ZYX order.
+        """
+        index = (
+            slice(block[2][0] - z_range[0], block[2][1] - z_range[0]),
+            slice(block[1][0] - y_range[0], block[1][1] - y_range[0]),
+            slice(block[0][0] - x_range[0], block[0][1] - x_range[0]))
+        if block[3] is not None:
+            index = (
+                slice(block[3][0] - time_range[0], block[3][1] - time_range[0]),
+            ) + index
+        return index
+
+    def _raise_block_errors(self, operation, errors, num_blocks):
+        """Raise the errors of a chunked request as one HTTPErrorList.
+
+        Args:
+            operation (string): Name of the operation such as 'Get cutout'.
+            errors (list[Exception]): Errors raised by the failed blocks.
+            num_blocks (int): Total number of blocks.
+
+        Raises:
+            HTTPErrorList: if errors is not empty.
+        """
+        if not errors:
+            return
+        exc = HTTPErrorList('{} failed on {} of {} blocks.'.format(
+            operation, len(errors), num_blocks))
+        exc.http_errors.extend(errors)
+        raise exc
+
+    def _is_retryable(self, exc):
+        """Whether a failed request might succeed if sent again.
+
+        Server errors (HTTP 5xx) and connection problems are retryable.
+
+        Args:
+            exc (Exception): Error raised by the request.
+
+        Returns:
+            (bool)
+        """
+        if isinstance(exc, HTTPError) and exc.response is not None:
+            status = exc.response.status_code
+            return status is not None and status >= 500
+        return isinstance(exc, RequestException)
+
+    @traced('VolumeService_1.create_cutout')
     def create_cutout(
         self, resource, resolution, x_range, y_range, z_range, time_range, numpyVolume,
-        url_prefix, auth, session, send_opts):
+        url_prefix, auth, session, send_opts, max_workers=DEFAULT_MAX_WORKERS,
+        max_upload_bytes=DEFAULT_MAX_UPLOAD_BYTES, retries=DEFAULT_UPLOAD_RETRIES,
+        cache=None, request_bytes=DEFAULT_REQUEST_BYTES, cuboid_size=CUBOID_SIZE,
+        aligned=False, codec=DEFAULT_CODEC, clevel=DEFAULT_CLEVEL, shuffle=DEFAULT_SHUFFLE):
         """Upload a cutout to the Boss data store.
 
+        Volumes larger than request_bytes are split into cuboid aligned blocks.  Each block is
+        compressed and uploaded by a pool of up to max_workers threads, with
+        at most max_upload_bytes of uncompressed data in flight.  Blocks that
+        fail with a server or connection error are retried individually.
+
+        If aligned is True, the region is split into its interior of whole
+        cuboids and the shell of partial cuboids around it.  The interior is
+        uploaded as whole cuboid blocks, which the server stores without
+        reading them first, and the shell as a few edge blocks, so only the
+        shell's cuboids are merged by the server.
+
         Args:
             resource (intern.resource.resource.Resource): Resource compatible with cutout operations.
             resolution (int): 0 indicates native resolution.
@@ -58,9 +385,39 @@ class VolumeService_1(BaseVersion):
             auth (string): Token to send in the request header.
             session (requests.Session): HTTP session to use for request.
             send_opts (dictionary): Additional arguments to pass to session.send().
-        """
-        compressed = blosc.compress(numpyVolume, typesize=self.get_bit_width(resource))
+            max_workers (optional[int]): Maximum number of blocks to upload at once.
+            max_upload_bytes (optional[int]): Maximum number of uncompressed bytes to upload at once.
+            retries (optional[int]): Number of times to retry a failed block.
+            cache (optional[intern.service.boss.cache.CuboidCache]): Cache whose
+                cuboids overlapping the region are invalidated by the upload.
+            request_bytes (optional[int]): Maximum uncompressed bytes per request.
+            cuboid_size (optional[tuple|dict]): (x, y, z) size of the server's
+                cuboids, or a dictionary of sizes keyed by resolution.
+            aligned (optional[bool]): Upload the whole cuboids of the region separately from its unaligned edges.
+            codec (optional[string]): Blosc compressor.  See compress().
+            clevel (optional[int]): Blosc compression level from 0 to 9.
+            shuffle (optional[string]): 'shuffle', 'bitshuffle' or 'noshuffle'.
+
+        Returns:
+            (UploadReport): Number of requests sent and cuboids written.
 
+        Raises:
+            requests.HTTPError
+            HTTPErrorList: if any block of a chunked cutout failed after all retries.
+        """
+        if cache is not None:
+            try:
+                return self.create_cutout(
+                    resource, resolution, x_range, y_range, z_range, time_range,
+                    numpyVolume, url_prefix, auth, session, send_opts,
+                    max_workers=max_workers, max_upload_bytes=max_upload_bytes,
+                    retries=retries, request_bytes=request_bytes, cuboid_size=cuboid_size,
+                    aligned=aligned, codec=codec, clevel=clevel, shuffle=shuffle)
+            finally:
+                # Even a failed upload may have changed some cuboids.
+                cache.invalidate(
+                    url_prefix, resource, resolution, x_range, y_range, z_range,
+                    time_range, cuboid_size=cuboid_size)
         if numpyVolume.ndim == 3:
             # Can't have time
             if time_range is not None:
@@ -77,26 +434,96 @@ class VolumeService_1(BaseVersion):
                 "Number of dimensions: {}".format(numpyVolume.ndim)
             )
 
-        req = self.get_cutout_request(
-            resource, 'POST', 'application/blosc',
-            url_prefix, auth,
-            resolution, x_range, y_range, z_range, time_range, numpyVolume=compressed)
-        prep = session.prepare_request(req)
-        resp = session.send(prep, **send_opts)
+        annotate(resource=resource.name, shape=numpyVolume.shape, nbytes=numpyVolume.nbytes)
+        cuboid = cuboid_size_at(cuboid_size, resolution)
+        interior, shell = split_aligned([x_range, y_range, z_range], cuboid)
+        num_times = time_range[1] - time_range[0] if time_range else 1
+        report = UploadReport(nbytes=numpyVolume.nbytes)
+        if interior is not None:
+            report.aligned_cuboids = num_blocks(interior, cuboid) * num_times
+        report.partial_cuboids = (
+            num_blocks([x_range, y_range, z_range], cuboid) * num_times - report.aligned_cuboids)
+
+        if aligned:
+            blocks = self._aligned_blocks(
+                resource, resolution, interior, shell, time_range, request_bytes, cuboid_size)
+        else:
+            blocks = self._chunk_blocks(
+                resource, resolution, x_range, y_range, z_range, time_range,
+                numpyVolume.nbytes, request_bytes, cuboid_size)
+        if blocks:
+            annotate(blocks=len(blocks))
+            report.requests = len(blocks)
+            block_data = [
+                numpyVolume[self._block_slice(b, x_range, y_range, z_range, time_range)]
+                for b in blocks]
+
+            def put_block(i):
+                b = blocks[i]
+                self.create_cutout(
+                    resource, resolution, b[0], b[1], b[2], b[3], block_data[i],
+                    url_prefix, auth, session, send_opts, request_bytes=request_bytes,
+                    cuboid_size=cuboid_size, codec=codec, clevel=clevel, shuffle=shuffle)
+
+            todo = list(range(len(blocks)))
+            failures = {}
+            for attempt in range(retries + 1):
+                _, errors = run_parallel(
+                    put_block, [(i,) for i in todo], max_workers, fail_fast=False,
+                    sizes=[block_data[i].nbytes for i in todo],
+                    max_pending_size=max_upload_bytes)
+                for i in todo:
+                    failures.pop(i, None)
+                for j, e in errors:
+                    failures[todo[j]] = e
+
+                # Only resend blocks that might succeed on another try.
+                todo = [i for i in sorted(failures) if self._is_retryable(failures[i])]
+                if not todo:
+                    break
+
+            self._raise_block_errors(
+                'Create cutout', [failures[i] for i in sorted(failures)], len(blocks))
+            return report
+
+        with span('compress', nbytes=numpyVolume.nbytes) as sp:
+            compressed = self.compress(resource, numpyVolume, codec, clevel, shuffle)
+            sp.set(compressed_bytes=len(compressed))
+
+        with span('upload') as sp:
+            req = self.get_cutout_request(
+                resource, 'POST', 'application/blosc',
+                url_prefix, auth,
+                resolution, x_range, y_range, z_range, time_range, numpyVolume=compressed)
+            prep = session.prepare_request(req)
+            resp = session.send(prep, **send_opts)
+            sp.set(status=resp.status_code)
 
         if resp.status_code == 201:
-            return
+            report.requests = 1
+            return report
 
         msg = ('Create cutout failed on {}, got HTTP response: ({}) - {}'.format(
             resource.name, resp.status_code, resp.text))
         raise HTTPError(msg, request=req, response=resp)
 
+    @traced('VolumeService_1.get_cutout')
     def get_cutout(
             self, resource, resolution, x_range, y_range, z_range, time_range, id_list,
-            url_prefix, auth, session, send_opts
+            url_prefix, auth, session, send_opts, max_workers=DEFAULT_MAX_WORKERS,
+            out=None, cache=None, request_bytes=DEFAULT_REQUEST_BYTES, cuboid_size=CUBOID_SIZE,
+            codec=DEFAULT_DOWNLOAD_CODEC, local_filter=None
         ):
         """
-        Upload a cutout to the Boss data store.
+        Get a cutout from the Boss data store.
+
+        Cutouts larger than request_bytes are split into blocks which are downloaded concurrently
+        using up to max_workers requests at a time.  Each block is decompressed
+        directly into its slice of the output array.
+
+        To download cutouts larger than memory, pass a file path or a
+        numpy.memmap as out.  A path is created as a memory mapped .npy file
+        which can be reopened later with numpy.load(path, mmap_mode='r').
 
         Args:
             resource (intern.resource.resource.Resource): Resource compatible
@@ -111,83 +538,296 @@ class VolumeService_1(BaseVersion):
             auth (string): Token to send in the request header.
             session (requests.Session): HTTP session to use for request.
             send_opts (dictionary): Additional arguments to pass to session.send().
+            max_workers (optional[int]): Maximum number of blocks to download at once.
+            out (optional[numpy.array|string]): Preallocated array, such as a
+                numpy.memmap, to write the cutout into.  Must have the
+                channel's datatype and the shape of the requested region.  If
+                a path is given, a .npy file is created there and memory
+                mapped.
+            cache (optional[intern.service.boss.cache.CuboidCache]): If given,
+                cuboids are read from the cache and only missing cuboids are
+                downloaded.  Not used when filtering by id_list.
+            request_bytes (optional[int]): Maximum uncompressed bytes per request.
+            cuboid_size (optional[tuple|dict]): (x, y, z) size of the server's
+                cuboids, or a dictionary of sizes keyed by resolution.
+            codec (optional[string|intern.service.boss.codecs.CutoutCodec]):
+                Format to download the cutout in, such as 'blosc',
+                'blosc-python' or 'npygz'.
+            local_filter (optional[bool]): If True, the unfiltered cutout is
+                downloaded (or read from the cache) and id_list is applied
+                locally.  If False, the server filters the cutout.  By
+                default, id_lists longer than MAX_FILTER_CHARS are applied
+                locally since they don't fit in a URL.
 
         Returns:
-            (numpy.array): A 3D or 4D numpy matrix in ZXY(time) order.
+            (numpy.array): A 3D or 4D numpy matrix in (time)ZYX order.
 
         Raises:
             requests.HTTPError
+            HTTPErrorList: if any block of a chunked cutout failed.
+            ValueError: if out has the wrong shape or datatype, or codec is unknown.
         """
+        codec = get_codec(codec)
+        shape = (
+            z_range[1] - z_range[0],
+            y_range[1] - y_range[0],
+            x_range[1] - x_range[0])
+        if time_range:
+            shape = (time_range[1] - time_range[0],) + shape
 
-        # Check to see if this volume is larger than 1GB. If so, chunk it into
-        # several smaller bites:
-        if (
-                (x_range[1] - x_range[0]) *
-                (y_range[1] - y_range[0]) *
-                (z_range[1] - z_range[0])
-        ) > 1024*1024*32*2:
-            blocks = block_compute(
-                x_range[0], x_range[1],
-                y_range[0], y_range[1],
-                z_range[0], z_range[1],
-                block_size=(1024, 1024, 32)
-            )
+        created_memmap = False
+        if out is None:
+            out = np.empty(shape, dtype=resource.datatype)
+        elif isinstance(out, six.string_types):
+            out = np.lib.format.open_memmap(
+                out, mode='w+', dtype=resource.datatype, shape=shape)
+            created_memmap = True
+        elif out.shape != shape or out.dtype != np.dtype(resource.datatype):
+            raise ValueError(
+                "out must have shape {} and dtype {}, got shape {} and dtype {}".format(
+                    shape, resource.datatype, out.shape, out.dtype))
 
-            result = np.ndarray((
-                z_range[1] - z_range[0],
-                y_range[1] - y_range[0],
-                x_range[1] - x_range[0]
-            ))
+        annotate(resource=resource.name, shape=shape, nbytes=out.nbytes)
+        if id_list and local_filter is None:
+            local_filter = len(','.join(str(i) for i in id_list)) > MAX_FILTER_CHARS
+        if id_list and local_filter:
+            self.get_cutout(
+                resource, resolution, x_range, y_range, z_range, time_range, [],
+                url_prefix, auth, session, send_opts, max_workers=max_workers, out=out,
+                cache=cache, request_bytes=request_bytes, cuboid_size=cuboid_size, codec=codec)
+            with span('filter_ids', ids=len(id_list)):
+                filter_ids(out, id_list, out=out)
+            if created_memmap:
+                out.flush()
+            return out
 
-            for b in blocks:
-                _data = self.get_cutout(
+        if cache is not None and not id_list:
+            self._get_cutout_cached(
+                cache, resource, resolution, x_range, y_range, z_range, time_range,
+                url_prefix, auth, session, send_opts, max_workers, out,
+                cuboid_size_at(cuboid_size, resolution), codec)
+            if created_memmap:
+                out.flush()
+            return out
+
+        blocks = self._chunk_blocks(
+            resource, resolution, x_range, y_range, z_range, time_range,
+            out.nbytes, request_bytes, cuboid_size)
+        if blocks:
+            annotate(blocks=len(blocks))
+
+            def get_block(b):
+                self.get_cutout(
                     resource, resolution, b[0], b[1], b[2],
-                    time_range, id_list, url_prefix, auth, session, send_opts
+                    b[3], id_list, url_prefix, auth, session, send_opts,
+                    request_bytes=request_bytes, cuboid_size=cuboid_size, codec=codec,
+                    local_filter=False, out=out[self._block_slice(b, x_range, y_range, z_range, time_range)]
                 )
 
-                result[
-                    b[2][0] - z_range[0] : b[2][1] - z_range[0],
-                    b[1][0] - y_range[0] : b[1][1] - y_range[0],
-                    b[0][0] - x_range[0] : b[0][1] - x_range[0]
-                ] = _data
+            _, errors = run_parallel(
+                get_block, [(b,) for b in blocks], max_workers)
+            self._raise_block_errors('Get cutout', [e for _, e in errors], len(blocks))
 
-            return result
+            if created_memmap:
+                out.flush()
+            return out
 
-        req = self.get_cutout_request(
-            resource, 'GET', 'application/blosc',
-            url_prefix, auth,
-            resolution, x_range, y_range, z_range, time_range,
-            id_list=id_list
-        )
-        prep = session.prepare_request(req)
-        # Hack in Accept header for now.
-        prep.headers['Accept'] = 'application/blosc'
-        resp = session.send(prep, **send_opts)
+        with span('fetch') as sp:
+            req = self.get_cutout_request(
+                resource, 'GET', codec.mime_type,
+                url_prefix, auth,
+                resolution, x_range, y_range, z_range, time_range,
+                id_list=id_list, accept=codec.mime_type
+            )
+            prep = session.prepare_request(req)
+            resp = session.send(prep, **send_opts)
+            sp.set(status=resp.status_code)
 
         if resp.status_code == 200:
-            raw_data = blosc.decompress(resp.content)
-            data_mat = np.fromstring(raw_data, dtype=resource.datatype)
-
-            if time_range:
-                # Reshape including time
-                return np.reshape(data_mat,
-                                  (time_range[1] - time_range[0],
-                                   z_range[1] - z_range[0],
-                                   y_range[1] - y_range[0],
-                                   x_range[1] - x_range[0]),
-                                  order='C')
-            else:
-                # Reshape without including time
-                return np.reshape(data_mat,
-                                  (z_range[1] - z_range[0],
-                                   y_range[1] - y_range[0],
-                                   x_range[1] - x_range[0]),
-                                  order='C')
+            # Blocks are decoded straight into their slice of out, so this
+            # also assembles the cutout.
+            with span('decompress', codec=codec.name, nbytes=out.nbytes):
+                codec.decode_into(resp.content, out)
+            if created_memmap:
+                out.flush()
+            return out
 
         msg = ('Get cutout failed on {}, got HTTP response: ({}) - {}'.format(
             resource.name, resp.status_code, resp.text))
         raise HTTPError(msg, request=req, response=resp)
 
+    @traced('VolumeService_1._get_cutout_cached')
+    def _get_cutout_cached(
+            self, cache, resource, resolution, x_range, y_range, z_range, time_range,
+            url_prefix, auth, session, send_opts, max_workers, out,
+            cuboid_size=CUBOID_SIZE, codec=DEFAULT_DOWNLOAD_CODEC):
+        """Assemble a cutout from cached cuboids, downloading only the missing ones.
+
+        Missing cuboids are downloaded whole, so later requests for nearby
+        regions hit the cache.  If the whole cuboid can't be downloaded
+        (because it extends past the coordinate frame), only the requested
+        part is downloaded and cached.
+
+        Args:
+            cache (intern.service.boss.cache.CuboidCache): Cache to use.
+            out (numpy.array): Array to write the cutout into.
+            cuboid_size (optional[tuple]): (x, y, z) size of the cached cuboids.
+            codec (optional[string|intern.service.boss.codecs.CutoutCodec]): Format to download cuboids in.
+            See get_cutout() for the remaining arguments.
+
+        Raises:
+            HTTPErrorList: if downloading any missing cuboid failed.
+        """
+        t_range = time_range if time_range else [0, 1]
+
+        def out_index(bounds, t):
+            index = self._block_slice(bounds + (None,), x_range, y_range, z_range, None)
+            if time_range:
+                index = (t - time_range[0],) + index
+            return index
+
+        missing = []
+        with span('assemble') as sp:
+            for index, bounds in cuboid_blocks(x_range, y_range, z_range, cuboid_size):
+                for t in range(t_range[0], t_range[1]):
+                    data = cache.lookup(
+                        cache.key(url_prefix, resource, resolution, t, index), bounds)
+                    if data is None:
+                        missing.append((index, bounds))
+                        break
+                    out[out_index(bounds, t)] = data
+            sp.set(missing=len(missing))
+
+        def get_cuboid(index, bounds):
+            fetched = snap_to_cuboids(*bounds, cuboid_size=cuboid_size)
+            try:
+                data = self.get_cutout(
+                    resource, resolution, fetched[0], fetched[1], fetched[2],
+                    time_range, [], url_prefix, auth, session, send_opts, codec=codec)
+            except HTTPError as e:
+                if e.response is None or e.response.status_code != 400:
+                    raise
+                fetched = bounds
+                data = self.get_cutout(
+                    resource, resolution, fetched[0], fetched[1], fetched[2],
+                    time_range, [], url_prefix, auth, session, send_opts, codec=codec)
+
+            local = tuple(
+                slice(b[0] - f[0], b[1] - f[0])
+                for f, b in reversed(list(zip(fetched, bounds))))
+            for t in range(t_range[0], t_range[1]):
+                t_data = data[t - t_range[0]] if time_range else data
+                cache.put(
+                    cache.key(url_prefix, resource, resolution, t, index), fetched, t_data)
+                out[out_index(bounds, t)] = t_data[local]
+
+        _, errors = run_parallel(get_cuboid, missing, max_workers)
+        self._raise_block_errors('Get cutout', [e for _, e in errors], len(missing))
+
+    def iter_cutout(
+            self, resource, resolution, x_range, y_range, z_range, time_range, id_list,
+            url_prefix, auth, session, send_opts, block_size=None,
+            prefetch=DEFAULT_PREFETCH, order='zyx', request_bytes=DEFAULT_REQUEST_BYTES,
+            cuboid_size=CUBOID_SIZE, codec=DEFAULT_DOWNLOAD_CODEC
+        ):
+        """
+        Iterate over a region of the Boss data store one block at a time.
+
+        While the caller processes a block, the next prefetch blocks are
+        downloaded in the background, so memory use depends on block_size
+        and prefetch rather than the size of the region.
+
+        Args:
+            resource (intern.resource.resource.Resource): Resource compatible
+                with cutout operations
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range ([list[int]]|None): time range such as [30, 40] which means t>=30 and t<40.
+            id_list (list[int]): list of object ids to filter the cutout by.
+            url_prefix (string): Protocol + host such as https://api.theboss.io
+            auth (string): Token to send in the request header.
+            session (requests.Session): HTTP session to use for request.
+            send_opts (dictionary): Additional arguments to pass to session.send().
+            block_size (optional[tuple]): (x, y, z) size of each block.  By
+                default, the largest cuboid aligned block that fits in
+                request_bytes.
+            prefetch (optional[int]): Number of blocks to download ahead of the caller.
+            order (optional[string]): Order to visit blocks in, from the slowest
+                to the fastest changing axis, such as 'zyx' (the default).
+                'morton' visits blocks in Z-order, which keeps consecutive
+                blocks close together along every axis.
+            request_bytes (optional[int]): Maximum uncompressed bytes per request.
+            cuboid_size (optional[tuple|dict]): (x, y, z) size of the server's
+                cuboids, or a dictionary of sizes keyed by resolution.
+            codec (optional[string|intern.service.boss.codecs.CutoutCodec]):
+                Format to download blocks in.
+
+        Yields:
+            (tuple): ((x_range, y_range, z_range), numpy.array) for each block.
+
+        Raises:
+            requests.HTTPError
+            ValueError: if order is not a permutation of 'xyz' or 'morton'.
+        """
+        if order == 'morton':
+            axes = [2, 1, 0]
+            planner_order = 'morton'
+        elif sorted(order) == ['x', 'y', 'z']:
+            axes = ['xyz'.index(axis) for axis in order]
+            planner_order = 'c'
+        else:
+            raise ValueError(
+                "order must be a permutation of 'xyz' or 'morton', got {}".format(order))
+
+        if block_size is None:
+            block_size = self.get_block_shape(
+                resource, resolution, request_bytes, cuboid_size,
+                (x_range[1] - x_range[0], y_range[1] - y_range[0], z_range[1] - z_range[0]))
+        ranges = (x_range, y_range, z_range)
+
+        def plan():
+            # Blocks are planned lazily so that huge regions start streaming at once.
+            for batch in iter_block_bounds(
+                    [ranges[a] for a in axes], [block_size[a] for a in axes],
+                    order=planner_order):
+                for bounds in batch.tolist():
+                    block = [None, None, None]
+                    for axis, rng in zip(axes, bounds):
+                        block[axis] = tuple(rng)
+                    yield tuple(block)
+        blocks = plan()
+
+        def get_block(b):
+            return self.get_cutout(
+                resource, resolution, b[0], b[1], b[2], time_range, id_list,
+                url_prefix, auth, session, send_opts, request_bytes=request_bytes,
+                cuboid_size=cuboid_size, codec=codec)
+
+        executor = ThreadPoolExecutor(max_workers=max(1, prefetch))
+        futures = deque()
+        try:
+            for b in blocks:
+                futures.append((b, executor.submit(in_worker(get_block, 'iter_cutout.block'), b)))
+                if len(futures) > prefetch:
+                    region, future = futures.popleft()
+                    yield region, self._wait_block(future)
+
+            while futures:
+                region, future = futures.popleft()
+                yield region, self._wait_block(future)
+        finally:
+            # Stop downloading if the caller stops iterating early.
+            for _, future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _wait_block(self, future):
+        """Wait for a block prefetched by iter_cutout()."""
+        with span('iter_cutout.wait'):
+            return future.result()
+
     def reserve_ids(
             self, resource, num_ids,
             url_prefix, auth, session, send_opts):
@@ -271,11 +911,83 @@ class VolumeService_1(BaseVersion):
             resource.name, resp.status_code, resp.text))
         raise HTTPError(msg, request=req, response=resp)
 
+    @traced('VolumeService_1.get_bounding_boxes')
+    def get_bounding_boxes(
+            self, resource, resolution, ids, bb_type,
+            url_prefix, auth, session, send_opts, max_workers=DEFAULT_MAX_WORKERS):
+        """Get the bounding boxes of many objects concurrently.
+
+        Up to max_workers bounding boxes are requested at a time.  A failed
+        request doesn't stop the others.
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with annotation operations.
+            resolution (int): 0 indicates native resolution.
+            ids (list[int]): Ids of the objects of interest.
+            bb_type (string): 'loose' or 'tight'.
+            url_prefix (string): Protocol + host such as https://api.theboss.io
+            auth (string): Token to send in the request header.
+            session (requests.Session): HTTP session to use for request.
+            send_opts (dictionary): Additional arguments to pass to session.send().
+            max_workers (optional[int]): Maximum number of requests at once.
+
+        Returns:
+            (tuple): (boxes, failures) where boxes is a numpy array of
+                BOUNDING_BOX_DTYPE records, in the order of ids, for each
+                id that succeeded, and failures is a dictionary of the
+                exception raised for each id that failed.
+
+        Raises:
+            TypeError: if resource is not an annotation channel.
+        """
+        if not isinstance(resource, ChannelResource):
+            raise TypeError('resource must be ChannelResource')
+        if resource.type != 'annotation':
+            raise TypeError('Channel is not an annotation channel')
+
+        ids = [int(i) for i in ids]
+        results, errors = run_parallel(
+            self.get_bounding_box,
+            [(resource, resolution, i, bb_type, url_prefix, auth, session, send_opts)
+             for i in ids],
+            max_workers, fail_fast=False)
+
+        failed = set(j for j, _ in errors)
+        boxes = self._bounding_box_array(
+            [(i, box) for j, (i, box) in enumerate(zip(ids, results)) if j not in failed])
+        return boxes, {ids[j]: e for j, e in errors}
+
+    def _bounding_box_array(self, boxes):
+        """Convert bounding boxes to a structured array.
+
+        Args:
+            boxes (list[tuple]): (id, box) where box is a dictionary returned by get_bounding_box().
+
+        Returns:
+            (numpy.array): One BOUNDING_BOX_DTYPE record per box.
+        """
+        records = np.zeros(len(boxes), dtype=BOUNDING_BOX_DTYPE)
+        for row, (obj_id, box) in enumerate(boxes):
+            t_range = box.get('t_range', [0, 1])
+            records[row] = (
+                obj_id,
+                box['x_range'][0], box['x_range'][1],
+                box['y_range'][0], box['y_range'][1],
+                box['z_range'][0], box['z_range'][1],
+                t_range[0], t_range[1])
+        return records
+
+    @traced('VolumeService_1.get_ids_in_region')
     def get_ids_in_region(
             self, resource, resolution, x_range, y_range, z_range, time_range,
-            url_prefix, auth, session, send_opts):
+            url_prefix, auth, session, send_opts, max_workers=DEFAULT_MAX_WORKERS,
+            request_bytes=DEFAULT_REQUEST_BYTES, cuboid_size=CUBOID_SIZE, as_array=False):
         """Get all ids in the region defined by x_range, y_range, z_range.
 
+        Regions holding more than request_bytes of annotation data are split
+        into cuboid aligned blocks which are queried concurrently using up to
+        max_workers requests at a time.
+
         Args:
             resource (intern.resource.Resource): An annotation channel.
             resolution (int): 0 indicates native resolution.
@@ -287,12 +999,19 @@ class VolumeService_1(BaseVersion):
             auth (string): Token to send in the request header.
             session (requests.Session): HTTP session to use for request.
             send_opts (dictionary): Additional arguments to pass to session.send().
+            max_workers (optional[int]): Maximum number of blocks to query at once.
+            request_bytes (optional[int]): Maximum bytes of annotation data per request.
+            cuboid_size (optional[tuple|dict]): (x, y, z) size of the server's
+                cuboids, or a dictionary of sizes keyed by resolution.
+            as_array (optional[bool]): Return a numpy.uint64 array instead of
+                a list, which is much faster for hundreds of thousands of ids.
 
         Returns:
-            (list[int]): Example: [1, 2, 25].
+            (list[int]|numpy.array): Sorted ids, such as [1, 2, 25].
 
         Raises:
             requests.HTTPError
+            HTTPErrorList: if querying any block of a large region failed.
             TypeError: if resource is not an annotation channel.
         """
         if not isinstance(resource, ChannelResource):
@@ -300,6 +1019,39 @@ class VolumeService_1(BaseVersion):
         if resource.type != 'annotation':
             raise TypeError('Channel is not an annotation channel')
 
+        ids = self._get_ids_in_region(
+            resource, resolution, x_range, y_range, z_range, time_range,
+            url_prefix, auth, session, send_opts, max_workers, request_bytes,
+            cuboid_size)
+        return ids if as_array else ids.tolist()
+
+    def _get_ids_in_region(
+            self, resource, resolution, x_range, y_range, z_range, time_range,
+            url_prefix, auth, session, send_opts, max_workers, request_bytes,
+            cuboid_size):
+        """Get the ids in a region as a sorted numpy.uint64 array.
+
+        See get_ids_in_region() for the arguments.
+        """
+        num_times = time_range[1] - time_range[0] if time_range else 1
+        nbytes = np.dtype(resource.datatype).itemsize * num_times * (
+            (x_range[1] - x_range[0]) * (y_range[1] - y_range[0]) *
+            (z_range[1] - z_range[0]))
+        blocks = self._chunk_blocks(
+            resource, resolution, x_range, y_range, z_range, time_range, nbytes,
+            request_bytes, cuboid_size)
+        if blocks:
+            def get_block(b):
+                return self._get_ids_in_region(
+                    resource, resolution, b[0], b[1], b[2], b[3],
+                    url_prefix, auth, session, send_opts, max_workers, request_bytes,
+                    cuboid_size)
+
+            results, errors = run_parallel(get_block, [(b,) for b in blocks], max_workers)
+            self._raise_block_errors(
+                'Get ids in region', [e for _, e in errors], len(blocks))
+            return np.unique(np.concatenate(results))
+
         req = self.get_ids_request(
             resource, 'GET', 'application/json', url_prefix, auth,
             resolution, x_range, y_range, z_range, time_range)
@@ -308,11 +1060,24 @@ class VolumeService_1(BaseVersion):
         resp = session.send(prep, **send_opts)
 
         if resp.status_code == 200:
-            json_data = resp.json()
-            id_str_list = json_data['ids']
-            id_int_list = [int(i) for i in id_str_list]
-            return id_int_list
+            return self._decode_ids(resp.content)
 
-        msg = ('Get bounding box failed on {}, got HTTP response: ({}) - {}'.format(
+        msg = ('Get ids in region failed on {}, got HTTP response: ({}) - {}'.format(
             resource.name, resp.status_code, resp.text))
         raise HTTPError(msg, request=req, response=resp)
+
+    def _decode_ids(self, content):
+        """Convert the body of a get ids response to a sorted numpy.uint64 array.
+
+        The ids are sent as strings, which are parsed by numpy in a single
+        pass without creating a Python int for each id.
+
+        Args:
+            content (bytes): JSON body such as {"ids": ["1", "25"]}.
+
+        Returns:
+            (numpy.array): Sorted, unique ids.
+        """
+        id_str_list = json_loads(content)['ids']
+        ids = np.fromiter(id_str_list, dtype=np.uint64, count=len(id_str_list))
+        return np.unique(ids)
@@ -13,10 +13,30 @@
 # limitations under the License.
 
 from intern.service.boss import BossService
-from intern.service.boss.v1.volume import VolumeService_1
+from intern.service.boss.v1.volume import (
+    VolumeService_1, DEFAULT_CLEVEL, DEFAULT_CODEC, DEFAULT_MAX_UPLOAD_BYTES,
+    DEFAULT_PREFETCH, DEFAULT_REQUEST_BYTES, DEFAULT_SHUFFLE, DEFAULT_UPLOAD_RETRIES)
+from intern.service.boss.cache import CUBOID_SIZE
+from intern.service.boss.codecs import DEFAULT_CODEC as DEFAULT_DOWNLOAD_CODEC
+from intern.utils.parallel import DEFAULT_MAX_WORKERS
+import blosc
 
 class VolumeService(BossService):
     """VolumeService routes calls to the appropriate API version.
+
+    Attributes:
+        max_workers (int): Maximum number of concurrent requests used when a cutout is split into blocks.
+        max_upload_bytes (int): Maximum number of uncompressed bytes in flight while uploading a chunked cutout.
+        upload_retries (int): Number of times a failed block of a chunked upload is retried.
+        cache (intern.service.boss.cache.CuboidCache): Optional cache of cutout data.  None disables caching.
+        request_bytes (int): Maximum uncompressed bytes per cutout request.  Larger cutouts are split into blocks.
+        cuboid_size (tuple|dict): (x, y, z) size of the server's cuboids, or a dictionary of sizes keyed by resolution.  Blocks are aligned to it.
+        aligned_uploads (bool): Upload the whole cuboids of a cutout separately from its unaligned edges, so the server only merges the edges with stored data.
+        codec (string): Blosc compressor used for uploads, one of blosc.compressor_list() such as 'blosclz', 'lz4' or 'zstd'.
+        clevel (int): Blosc compression level used for uploads, from 0 (none) to 9 (most).
+        shuffle (string): Blosc shuffle filter used for uploads: 'shuffle', 'bitshuffle' or 'noshuffle'.
+        download_codec (string): Format to download cutouts in: 'blosc', 'blosc-python' or 'npygz'.  See intern.service.boss.codecs.
+        nthreads (int): Number of threads blosc uses to compress and decompress each block.  This is a process wide blosc setting.  None leaves it unchanged.
     """
     def __init__(self, base_url, version):
         """Constructor.
@@ -34,6 +54,29 @@ class VolumeService(BossService):
             'v1': VolumeService_1()
         }
         self.service = self.get_api_impl(version)
+        self.max_workers = DEFAULT_MAX_WORKERS
+        self.max_upload_bytes = DEFAULT_MAX_UPLOAD_BYTES
+        self.upload_retries = DEFAULT_UPLOAD_RETRIES
+        self.cache = None
+        self.request_bytes = DEFAULT_REQUEST_BYTES
+        self.cuboid_size = CUBOID_SIZE
+        self.aligned_uploads = False
+        self.codec = DEFAULT_CODEC
+        self.clevel = DEFAULT_CLEVEL
+        self.shuffle = DEFAULT_SHUFFLE
+        self._nthreads = None
+        self.download_codec = DEFAULT_DOWNLOAD_CODEC
+
+    @property
+    def nthreads(self):
+        """Number of threads blosc was set to use, or None if it wasn't set."""
+        return self._nthreads
+
+    @nthreads.setter
+    def nthreads(self, value):
+        if value is not None:
+            blosc.set_nthreads(value)
+        self._nthreads = value
 
     def create_cutout(
         self, resource, resolution, x_range, y_range, z_range, numpyVolume, time_range=None):
@@ -47,13 +90,23 @@ class VolumeService(BossService):
             z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
             numpyVolume (numpy.array): A 3D or 4D (time) numpy matrix in (time)ZYX order.
             time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+
+        Returns:
+            (intern.service.boss.v1.volume.UploadReport): Number of requests sent and cuboids written.
         """
 
         return self.service.create_cutout(
             resource, resolution, x_range, y_range, z_range, time_range, numpyVolume,
-            self.url_prefix, self.auth, self.session, self.session_send_opts)
-
-    def get_cutout(self, resource, resolution, x_range, y_range, z_range, time_range=None, id_list=[]):
+            self.url_prefix, self.auth, self.session, self.session_send_opts,
+            max_workers=self.max_workers, max_upload_bytes=self.max_upload_bytes,
+            retries=self.upload_retries, cache=self.cache,
+            request_bytes=self.request_bytes, cuboid_size=self.cuboid_size,
+            aligned=self.aligned_uploads, codec=self.codec, clevel=self.clevel,
+            shuffle=self.shuffle)
+
+    def get_cutout(
+        self, resource, resolution, x_range, y_range, z_range, time_range=None, id_list=[],
+        out=None, codec=None, local_filter=None):
         """Get a cutout from the volume service.
 
         Args:
@@ -64,6 +117,9 @@ class VolumeService(BossService):
             z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
             time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
             id_list (optional [list[int]]): list of object ids to filter the cutout by.
+            out (optional [numpy.array|string]): Preallocated array, with the channel's datatype, to write the cutout into.  May be a numpy.memmap or the path of a .npy file to create and memory map.
+            codec (optional [string|intern.service.boss.codecs.CutoutCodec]): Format to download the cutout in.  Defaults to download_codec.
+            local_filter (optional [bool]): Apply id_list locally to the unfiltered cutout instead of on the server.  Defaults to doing so for id_lists too long to fit in a URL.
 
         Returns:
             (numpy.array): A 3D or 4D (time) numpy matrix in (time)ZYX order.
@@ -74,7 +130,42 @@ class VolumeService(BossService):
 
         return self.service.get_cutout(
             resource, resolution, x_range, y_range, z_range, time_range, id_list,
-            self.url_prefix, self.auth, self.session, self.session_send_opts)
+            self.url_prefix, self.auth, self.session, self.session_send_opts,
+            max_workers=self.max_workers, out=out, cache=self.cache,
+            request_bytes=self.request_bytes, cuboid_size=self.cuboid_size,
+            codec=codec or self.download_codec, local_filter=local_filter)
+
+    def iter_cutout(
+        self, resource, resolution, x_range, y_range, z_range, time_range=None, id_list=[],
+        block_size=None, prefetch=DEFAULT_PREFETCH, order='zyx', codec=None):
+        """Iterate over a region of the volume service one block at a time.
+
+        Args:
+            resource (intern.resource.boss.resource.ChannelResource): Channel or layer resource.
+            resolution (int): 0 indicates native resolution.
+            x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+            y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+            z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+            time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+            id_list (optional [list[int]]): list of object ids to filter the cutout by.
+            block_size (optional [tuple]): (x, y, z) size of each block.  Defaults to the cuboid aligned block that fits in request_bytes.
+            prefetch (optional [int]): Number of blocks to download ahead of the caller.
+            order (optional [string]): Order to visit blocks in, from the slowest to the fastest changing axis.
+            codec (optional [string|intern.service.boss.codecs.CutoutCodec]): Format to download blocks in.  Defaults to download_codec.
+
+        Returns:
+            (generator): Yields ((x_range, y_range, z_range), numpy.array) for each block.
+
+        Raises:
+            requests.HTTPError on error.
+        """
+
+        return self.service.iter_cutout(
+            resource, resolution, x_range, y_range, z_range, time_range, id_list,
+            self.url_prefix, self.auth, self.session, self.session_send_opts,
+            block_size=block_size, prefetch=prefetch, order=order,
+            request_bytes=self.request_bytes, cuboid_size=self.cuboid_size,
+            codec=codec or self.download_codec)
 
     def reserve_ids(self, resource, num_ids):
         """Reserve a block of unique, sequential ids for annotations.
@@ -110,9 +201,26 @@ class VolumeService(BossService):
             resource, resolution, id, bb_type,
             self.url_prefix, self.auth, self.session, self.session_send_opts)
 
+    def get_bounding_boxes(self, resource, resolution, ids, bb_type='loose'):
+        """Get the bounding boxes of many objects concurrently.
+
+        Args:
+            resource (intern.resource.Resource): Resource compatible with annotation operations.
+            resolution (int): 0 indicates native resolution.
+            ids (list[int]): Ids of the objects of interest.
+            bb_type (optional[string]): Defaults to 'loose'.
+
+        Returns:
+            (tuple): (boxes, failures) where boxes is a numpy structured array with fields id, x0, x1, y0, y1, z0, z1, t0 and t1 for each id that succeeded, and failures is a dictionary of the exception raised for each id that failed.
+        """
+        return self.service.get_bounding_boxes(
+            resource, resolution, ids, bb_type,
+            self.url_prefix, self.auth, self.session, self.session_send_opts,
+            max_workers=self.max_workers)
+
     def get_ids_in_region(
             self, resource, resolution,
-            x_range, y_range, z_range, time_range=[0, 1]):
+            x_range, y_range, z_range, time_range=[0, 1], as_array=False):
         """Get all ids in the region defined by x_range, y_range, z_range.
 
         Args:
@@ -122,15 +230,19 @@ class VolumeService(BossService):
             y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
             z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
             time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.  Defaults to [0, 1].
+            as_array (optional [bool]): Return a numpy.uint64 array instead of a list, which is much faster for hundreds of thousands of ids.
 
         Returns:
-            (list[int]): Example: [1, 2, 25].
+            (list[int]|numpy.array): Sorted ids, such as [1, 2, 25].
 
         Raises:
             requests.HTTPError
+            HTTPErrorList: if querying any block of a large region failed.
             TypeError: if resource is not an annotation channel.
         """
         return self.service.get_ids_in_region(
             resource, resolution, x_range, y_range, z_range, time_range,
-            self.url_prefix, self.auth, self.session, self.session_send_opts)
+            self.url_prefix, self.auth, self.session, self.session_send_opts,
+            max_workers=self.max_workers, request_bytes=self.request_bytes,
+            cuboid_size=self.cuboid_size, as_array=as_array)
 
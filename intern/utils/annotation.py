@@ -0,0 +1,409 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client side processing of annotation cutouts: object statistics, id
+filtering and relabeling."""
+
+from __future__ import absolute_import
+import numpy
+
+
+class ObjectStats(object):
+    """Voxel count, bounding box and centroid of each object in a region.
+
+    Statistics are held in arrays with one row per object, sorted by id.
+    Coordinates are in (x, y, z) order.
+
+    Attributes:
+        ids (numpy.array): Object ids, as sorted numpy.uint64.
+        voxels (numpy.array): Number of voxels of each object.
+        bbox_min (numpy.array): (n, 3) first voxel of each object's bounding box.
+        bbox_max (numpy.array): (n, 3) voxel past the end of each object's bounding box.
+        coord_sums (numpy.array): (n, 3) sum of each object's voxel coordinates.
+    """
+    def __init__(self, ids=None, voxels=None, bbox_min=None, bbox_max=None, coord_sums=None):
+        """Constructor.
+
+        Args:
+            ids (optional[numpy.array]): Sorted, unique ids.  Defaults to no objects.
+            voxels (optional[numpy.array]): Voxel count of each object.
+            bbox_min (optional[numpy.array]): (n, 3) bounding box starts.
+            bbox_max (optional[numpy.array]): (n, 3) bounding box stops.
+            coord_sums (optional[numpy.array]): (n, 3) sums of voxel coordinates.
+        """
+        if ids is None:
+            ids = numpy.zeros(0, dtype=numpy.uint64)
+            voxels = numpy.zeros(0, dtype=numpy.int64)
+            bbox_min = numpy.zeros((0, 3), dtype=numpy.int64)
+            bbox_max = numpy.zeros((0, 3), dtype=numpy.int64)
+            coord_sums = numpy.zeros((0, 3), dtype=numpy.int64)
+        self.ids = ids
+        self.voxels = voxels
+        self.bbox_min = bbox_min
+        self.bbox_max = bbox_max
+        self.coord_sums = coord_sums
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, obj_id):
+        pos = numpy.searchsorted(self.ids, numpy.uint64(obj_id))
+        return pos < len(self.ids) and self.ids[pos] == obj_id
+
+    @property
+    def centroids(self):
+        """(n, 3) mean voxel coordinate of each object."""
+        return self.coord_sums / self.voxels[:, None].astype(numpy.float64)
+
+    def index(self, ids):
+        """Get the rows of objects.
+
+        Args:
+            ids (list[int]|numpy.array): Object ids.
+
+        Returns:
+            (numpy.array): Row of each id.
+
+        Raises:
+            KeyError: if any id isn't in the table.
+        """
+        ids = numpy.asarray(ids, dtype=numpy.uint64)
+        pos = numpy.searchsorted(self.ids, ids)
+        found = pos < len(self.ids)
+        found[found] = self.ids[pos[found]] == ids[found]
+        if not found.all():
+            raise KeyError(ids[~found].tolist())
+        return pos
+
+    def get(self, obj_id):
+        """Get the statistics of one object.
+
+        Args:
+            obj_id (int): Object id.
+
+        Returns:
+            (dict): {'voxels': 10, 'x_range': [0, 10], 'y_range': [0, 10], 'z_range': [0, 10], 'centroid': (x, y, z)}
+
+        Raises:
+            KeyError: if the object isn't in the table.
+        """
+        row = self.index([obj_id])[0]
+        return {
+            'voxels': int(self.voxels[row]),
+            'x_range': [int(self.bbox_min[row, 0]), int(self.bbox_max[row, 0])],
+            'y_range': [int(self.bbox_min[row, 1]), int(self.bbox_max[row, 1])],
+            'z_range': [int(self.bbox_min[row, 2]), int(self.bbox_max[row, 2])],
+            'centroid': tuple(float(c) for c in self.centroids[row]),
+        }
+
+    def merge(self, other):
+        """Combine the statistics of two regions that don't overlap.
+
+        Args:
+            other (ObjectStats): Statistics of the other region.
+
+        Returns:
+            (ObjectStats): Statistics of both regions.
+        """
+        ids = numpy.concatenate((self.ids, other.ids))
+        order = numpy.argsort(ids, kind='mergesort')
+        ids = ids[order]
+        starts = _group_starts(ids)
+        return ObjectStats(
+            ids[starts],
+            numpy.add.reduceat(numpy.concatenate((self.voxels, other.voxels))[order], starts),
+            numpy.minimum.reduceat(
+                numpy.concatenate((self.bbox_min, other.bbox_min))[order], starts),
+            numpy.maximum.reduceat(
+                numpy.concatenate((self.bbox_max, other.bbox_max))[order], starts),
+            numpy.add.reduceat(
+                numpy.concatenate((self.coord_sums, other.coord_sums))[order], starts))
+
+
+def _group_starts(sorted_ids):
+    """Get the index of the first of each run of equal, sorted ids."""
+    if not len(sorted_ids):
+        return numpy.zeros(0, dtype=numpy.intp)
+    return numpy.flatnonzero(numpy.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1])))
+
+
+def block_stats(data, offset=(0, 0, 0), background=0):
+    """Compute the statistics of the objects in one annotation block.
+
+    Voxels are grouped by id with a single sort, then each group's
+    coordinates are reduced with numpy's reduceat, so there is no Python
+    loop over voxels or objects.
+
+    Args:
+        data (numpy.array): 3D annotation cutout in ZYX order.
+        offset (optional[tuple]): (x, y, z) coordinate of data's first voxel.
+        background (optional[int]): Id of voxels that don't belong to any
+            object.  None to include every id.
+
+    Returns:
+        (ObjectStats): Statistics of the objects in data.
+
+    Raises:
+        ValueError: if data isn't 3D.
+    """
+    if data.ndim != 3:
+        raise ValueError("data must be 3D in ZYX order, got {} dimensions".format(data.ndim))
+    nz, ny, nx = data.shape
+    flat = data.ravel()
+    order = numpy.argsort(flat, kind='mergesort')
+    sorted_ids = flat[order]
+    if background is not None:
+        # Background is usually the largest group, so drop it before reducing.
+        lo = numpy.searchsorted(sorted_ids, background, side='left')
+        hi = numpy.searchsorted(sorted_ids, background, side='right')
+        if hi > lo:
+            order = numpy.concatenate((order[:lo], order[hi:]))
+            sorted_ids = numpy.concatenate((sorted_ids[:lo], sorted_ids[hi:]))
+    if not len(sorted_ids):
+        return ObjectStats()
+
+    starts = _group_starts(sorted_ids)
+    voxels = numpy.diff(numpy.append(starts, len(sorted_ids))).astype(numpy.int64)
+    bbox_min = numpy.empty((len(starts), 3), dtype=numpy.int64)
+    bbox_max = numpy.empty((len(starts), 3), dtype=numpy.int64)
+    coord_sums = numpy.empty((len(starts), 3), dtype=numpy.int64)
+    coords = (order % nx, (order // nx) % ny, order // (nx * ny))
+    for axis, coord in enumerate(coords):
+        coord = coord.astype(numpy.int64) + offset[axis]
+        bbox_min[:, axis] = numpy.minimum.reduceat(coord, starts)
+        bbox_max[:, axis] = numpy.maximum.reduceat(coord, starts) + 1
+        coord_sums[:, axis] = numpy.add.reduceat(coord, starts)
+
+    return ObjectStats(
+        sorted_ids[starts].astype(numpy.uint64), voxels, bbox_min, bbox_max, coord_sums)
+
+
+def get_object_stats(
+        remote, resource, resolution, x_range, y_range, z_range, background=0, **kwargs):
+    """Compute per object statistics of a region of an annotation channel.
+
+    The region is streamed block by block with remote.iter_cutout(), so
+    memory use depends on the block size and the number of objects rather
+    than the size of the region.
+
+    Args:
+        remote (intern.remote.Remote): Remote to download from, such as a BossRemote.
+        resource (intern.resource.Resource): Annotation channel.
+        resolution (int): 0 indicates native resolution.
+        x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+        y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+        z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+        background (optional[int]): Id of voxels that don't belong to any
+            object.  None to include every id.
+        kwargs: Passed to remote.iter_cutout(), such as block_size.
+
+    Returns:
+        (ObjectStats): Statistics of the objects in the region.
+    """
+    stats = ObjectStats()
+    for (bx, by, bz), data in remote.iter_cutout(
+            resource, resolution, x_range, y_range, z_range, **kwargs):
+        stats = stats.merge(block_stats(data, (bx[0], by[0], bz[0]), background))
+    return stats
+
+
+def filter_ids(data, ids, out=None):
+    """Keep only the voxels of the given objects, zeroing the rest.
+
+    Equivalent to downloading a cutout with an id_list filter, but done
+    locally, so any number of ids may be given and one download can be
+    filtered many ways.
+
+    Args:
+        data (numpy.array): Annotation cutout.
+        ids (list[int]|numpy.array): Ids to keep.
+        out (optional[numpy.array]): Array to write the result to, which may
+            be data itself.  Defaults to a new array.
+
+    Returns:
+        (numpy.array): The filtered cutout.
+    """
+    ids = numpy.unique(numpy.asarray(ids, dtype=data.dtype))
+    if out is None:
+        out = data.copy()
+    elif out is not data:
+        out[...] = data
+    out[~numpy.isin(data, ids, assume_unique=True)] = 0
+    return out
+
+
+def id_masks(data, ids):
+    """Split an annotation cutout into a boolean mask per object.
+
+    Every voxel is visited once: its row in the sorted ids is found with a
+    binary search, then the voxels that belong to one of the ids are
+    scattered into the masks.
+
+    Args:
+        data (numpy.array): Annotation cutout.
+        ids (list[int]|numpy.array): Ids of the objects.
+
+    Returns:
+        (tuple): (ids, masks) where ids are the sorted, unique ids and masks
+            is a boolean array of shape (len(ids),) + data.shape.
+    """
+    ids = numpy.unique(numpy.asarray(ids, dtype=data.dtype))
+    masks = numpy.zeros((len(ids),) + data.shape, dtype=bool)
+    if not len(ids):
+        return ids, masks
+    flat = data.ravel()
+    rows = numpy.minimum(numpy.searchsorted(ids, flat), len(ids) - 1)
+    found = numpy.flatnonzero(ids[rows] == flat)
+    masks.reshape(len(ids), -1)[rows[found], found] = True
+    return ids, masks
+
+
+def id_coords(data, ids=None, offset=(0, 0, 0), background=0):
+    """Get the coordinates of each object's voxels in an annotation cutout.
+
+    A sparse alternative to id_masks(): voxels are grouped by id with one
+    sort, so the cost doesn't depend on the number of objects.
+
+    Args:
+        data (numpy.array): 3D annotation cutout in ZYX order.
+        ids (optional[list[int]]): Ids of the objects.  Defaults to every id
+            in data except background.
+        offset (optional[tuple]): (x, y, z) coordinate of data's first voxel.
+        background (optional[int]): Id ignored when ids isn't given.
+
+    Returns:
+        (dict): (n, 3) array of (x, y, z) voxel coordinates keyed by id.
+            Ids without any voxels map to empty arrays.
+
+    Raises:
+        ValueError: if data isn't 3D.
+    """
+    if data.ndim != 3:
+        raise ValueError("data must be 3D in ZYX order, got {} dimensions".format(data.ndim))
+    ny, nx = data.shape[1:]
+    flat = data.ravel()
+    if ids is None:
+        keep = numpy.flatnonzero(flat != background)
+    else:
+        ids = numpy.unique(numpy.asarray(ids, dtype=data.dtype))
+        keep = numpy.flatnonzero(numpy.isin(flat, ids, assume_unique=True))
+    order = keep[numpy.argsort(flat[keep], kind='mergesort')]
+    sorted_ids = flat[order]
+    coords = numpy.stack(
+        (order % nx + offset[0], (order // nx) % ny + offset[1], order // (nx * ny) + offset[2]),
+        axis=1).astype(numpy.int64)
+
+    starts = _group_starts(sorted_ids)
+    stops = numpy.append(starts[1:], len(sorted_ids))
+    result = {}
+    if ids is not None:
+        empty = numpy.zeros((0, 3), dtype=numpy.int64)
+        result.update((int(i), empty) for i in ids)
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        result[int(sorted_ids[start])] = coords[start:stop]
+    return result
+
+
+def relabel(data, start_id, background=0):
+    """Map the labels of a block to a contiguous range of ids.
+
+    Each distinct label, other than background, gets the next id from
+    start_id in sorted label order.  The lookup is built with np.unique()
+    and applied to every voxel in one indexing pass.
+
+    Args:
+        data (numpy.array): Block of local labels, such as 1..N.
+        start_id (int): First id of the range, such as one returned by
+            reserve_ids().
+        background (optional[int]): Label left unchanged.  None to relabel
+            every label.
+
+    Returns:
+        (tuple): (relabeled, table) where relabeled is a numpy.uint64 array
+            with data's shape, and table is an (n, 2) numpy.uint64 array of
+            (label, id) rows.
+
+    Raises:
+        ValueError: if the range of ids doesn't fit in a numpy.uint64.
+    """
+    return _apply_labels(data, _find_labels(data, background), start_id)
+
+
+def _find_labels(data, background):
+    """Get data's distinct labels, the index of each voxel's label, and
+    which labels are objects."""
+    labels, inverse = numpy.unique(data, return_inverse=True)
+    if background is None:
+        is_object = numpy.ones(len(labels), dtype=bool)
+    else:
+        is_object = labels != background
+    return labels, inverse, is_object
+
+
+def _apply_labels(data, found, start_id):
+    """Relabel data given the result of _find_labels()."""
+    labels, inverse, is_object = found
+    num_ids = int(numpy.count_nonzero(is_object))
+    max_id = numpy.iinfo(numpy.uint64).max
+    if start_id < 0 or start_id + num_ids - 1 > max_id:
+        raise ValueError('Ids {} to {} do not fit in a uint64'.format(
+            start_id, start_id + num_ids - 1))
+    # Ids are built as uint64 so that they can't wrap around in the
+    # datatype of the local labels.
+    ids = labels.astype(numpy.uint64)
+    ids[is_object] = numpy.arange(start_id, start_id + num_ids, dtype=numpy.uint64)
+    relabeled = ids[inverse].reshape(data.shape)
+    table = numpy.stack((labels[is_object].astype(numpy.uint64), ids[is_object]), axis=1)
+    return relabeled, table
+
+
+def create_relabeled_cutout(
+        remote, resource, resolution, x_range, y_range, z_range, data, time_range=None,
+        background=0, ids=None):
+    """Upload a block of local labels as newly reserved annotation ids.
+
+    One contiguous range is reserved for the block's labels, the block is
+    relabeled with relabel() and uploaded with remote.create_cutout().
+
+    Args:
+        remote (intern.remote.Remote): Remote to upload through, such as a BossRemote.
+        resource (intern.resource.Resource): Annotation channel.
+        resolution (int): 0 indicates native resolution.
+        x_range (list[int]): x range such as [10, 20] which means x>=10 and x<20.
+        y_range (list[int]): y range such as [10, 20] which means y>=10 and y<20.
+        z_range (list[int]): z range such as [10, 20] which means z>=10 and z<20.
+        data (numpy.array): A 3D or 4D (time) numpy matrix of local labels in (time)ZYX order.
+        time_range (optional [list[int]]): time range such as [30, 40] which means t>=30 and t<40.
+        background (optional[int]): Label uploaded unchanged.  None to relabel every label.
+        ids (optional[intern.remote.boss.IdAllocator]): Allocator to take the
+            range from.  Defaults to calling remote.reserve_ids().
+
+    Returns:
+        (numpy.array): (n, 2) numpy.uint64 array of (label, id) rows.
+
+    Raises:
+        ValueError: if the reserved ids don't fit in a numpy.uint64.
+    """
+    found = _find_labels(data, background)
+    num_ids = int(numpy.count_nonzero(found[2]))
+    if not num_ids:
+        start_id = 0
+    elif ids is not None:
+        start_id = ids.allocate(num_ids)
+    else:
+        start_id = remote.reserve_ids(resource, num_ids)
+
+    relabeled, table = _apply_labels(data, found, start_id)
+    remote.create_cutout(resource, resolution, x_range, y_range, z_range, relabeled, time_range)
+    return table
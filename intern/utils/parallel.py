@@ -14,10 +14,17 @@
 # limitations under the License.
 
 from __future__ import absolute_import
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from intern.utils.trace import in_worker, span, traced
+import itertools
 import numpy
 from six.moves import range
 
 
+# Number of concurrent requests used when fetching a chunked cutout.
+DEFAULT_MAX_WORKERS = 4
+
+
 def snap_to_cube(q_start, q_stop, chunk_depth=16, q_index=1):
     """
     For any q in {x, y, z, t}
@@ -124,3 +131,337 @@ def block_compute(x_start, x_stop,
             for z in z_slices:
                 chunks.append((x, y, z))
     return chunks
+
+
+def _block_grid(ranges, block_size, origin):
+    """Get the blocks of a grid that overlap a region, one axis at a time."""
+    ranges = numpy.asarray(ranges, dtype=numpy.int64).reshape(-1, 2)
+    block_size = numpy.asarray(block_size, dtype=numpy.int64)
+    if origin is None:
+        origin = numpy.zeros(len(ranges), dtype=numpy.int64)
+    else:
+        origin = numpy.asarray(origin, dtype=numpy.int64)
+    if not (len(ranges) == len(block_size) == len(origin)):
+        raise ValueError("ranges, block_size and origin must have the same number of axes")
+    if (block_size <= 0).any():
+        raise ValueError("block_size must be positive, got {}".format(block_size.tolist()))
+
+    first = (ranges[:, 0] - origin) // block_size
+    last = (ranges[:, 1] - 1 - origin) // block_size
+    counts = numpy.maximum(last - first + 1, 0)
+    counts[ranges[:, 1] <= ranges[:, 0]] = 0
+    return ranges, block_size, origin, first, counts
+
+
+def _morton_bits(counts):
+    """List the (axis, bit) of block index that each bit of a Morton code holds.
+
+    Bits are interleaved from the last (fastest) axis to the first.  Axes
+    with fewer blocks run out of bits early, so the code space is at most
+    2**ndim times the number of blocks, even for long, thin regions.
+    """
+    bits = [int(c - 1).bit_length() if c > 1 else 0 for c in counts]
+    positions = []
+    for level in range(max(bits) if bits else 0):
+        for axis in reversed(range(len(counts))):
+            if level < bits[axis]:
+                positions.append((axis, level))
+    return positions
+
+
+def iter_block_bounds(ranges, block_size, origin=None, order='c', batch_size=65536):
+    """
+    Lazily split a region of any number of dimensions into blocks aligned to
+    a grid.
+
+    Blocks are generated batch_size at a time, so memory use doesn't grow
+    with the size of the region.  Blocks at the edges of the region are
+    clipped to it.
+
+    Arguments:
+        ranges (list[(int, int)]): (start, stop) of the region along each
+            axis, such as [(t_start, t_stop), (z_start, z_stop), ...]
+        block_size (list[int]): Size of the blocks along each axis
+        origin (list[int] : None): Coordinate of a grid corner along each
+            axis.  Defaults to 0 for every axis.
+        order (str : 'c'): 'c' to visit blocks with the last axis changing
+            fastest, or 'morton' to visit them in Z-order, which keeps
+            consecutive blocks close together along every axis.
+        batch_size (int : 65536): Maximum number of blocks, or Morton codes,
+            handled per batch
+
+    Yields:
+        numpy.ndarray: (n, ndim, 2) array of [start, stop) bounds
+
+    Raises:
+        ValueError: if order is unknown, the arguments have different
+            numbers of axes, or block_size isn't positive.
+    """
+    if order not in ('c', 'morton'):
+        raise ValueError("order must be 'c' or 'morton', got {}".format(order))
+    ranges, block_size, origin, first, counts = _block_grid(ranges, block_size, origin)
+    ndim = len(counts)
+    if int(numpy.prod(counts)) == 0:
+        return
+
+    # Clipped (start, stop) of every block along each axis.
+    axis_bounds = []
+    for axis in range(ndim):
+        lo = origin[axis] + (first[axis] + numpy.arange(counts[axis])) * block_size[axis]
+        axis_bounds.append(numpy.stack(
+            (numpy.maximum(lo, ranges[axis, 0]),
+             numpy.minimum(lo + block_size[axis], ranges[axis, 1])), axis=-1))
+
+    if order == 'c':
+        # Split on the slowest axes so each batch is a dense sub-grid.
+        split = 0
+        while split < ndim - 1 and numpy.prod(counts[split + 1:]) > batch_size:
+            split += 1
+        step = max(1, batch_size // int(numpy.prod(counts[split + 1:])))
+        for outer in itertools.product(*[range(c) for c in counts[:split]]):
+            for start in range(0, counts[split], step):
+                yield _bounds_grid(
+                    [axis_bounds[axis][i:i + 1] for axis, i in enumerate(outer)] +
+                    [axis_bounds[split][start:start + step]] +
+                    axis_bounds[split + 1:])
+        return
+
+    positions = _morton_bits(counts)
+    for start in range(0, 2 ** len(positions), batch_size):
+        codes = numpy.arange(
+            start, min(start + batch_size, 2 ** len(positions)), dtype=numpy.int64)
+        indices = numpy.zeros((len(codes), ndim), dtype=numpy.int64)
+        for bit, (axis, level) in enumerate(positions):
+            indices[:, axis] |= ((codes >> bit) & 1) << level
+        indices = indices[(indices < counts).all(axis=1)]
+        if len(indices):
+            yield numpy.stack(
+                [axis_bounds[axis][indices[:, axis]] for axis in range(ndim)], axis=1)
+
+
+def _bounds_grid(axis_bounds):
+    """Combine per axis block bounds into (n, ndim, 2) bounds, last axis fastest."""
+    shape = [len(b) for b in axis_bounds]
+    ndim = len(shape)
+    grid = numpy.empty(shape + [ndim, 2], dtype=numpy.int64)
+    for axis, bounds in enumerate(axis_bounds):
+        view = [1] * ndim + [2]
+        view[axis] = shape[axis]
+        grid[..., axis, :] = bounds.reshape(view)
+    return grid.reshape(-1, ndim, 2)
+
+
+@traced('block_bounds')
+def block_bounds(ranges, block_size, origin=None, order='c'):
+    """
+    Split a region of any number of dimensions into blocks aligned to a grid.
+
+    Unlike block_compute(), blocks are returned in a single NumPy array, in
+    a well defined order, and time or any other axis may be included.
+
+    Arguments:
+        ranges (list[(int, int)]): (start, stop) of the region along each axis
+        block_size (list[int]): Size of the blocks along each axis
+        origin (list[int] : None): Coordinate of a grid corner along each
+            axis.  Defaults to 0 for every axis.
+        order (str : 'c'): 'c' or 'morton'.  See iter_block_bounds().
+
+    Returns:
+        numpy.ndarray: (n, ndim, 2) array of [start, stop) bounds
+
+    Raises:
+        ValueError: see iter_block_bounds().
+    """
+    batches = list(iter_block_bounds(ranges, block_size, origin, order, batch_size=1 << 22))
+    if not batches:
+        return numpy.zeros((0, len(block_size), 2), dtype=numpy.int64)
+    return numpy.concatenate(batches)
+
+
+def num_blocks(ranges, block_size, origin=None):
+    """
+    Count the blocks of a grid that overlap a region.
+
+    Arguments:
+        ranges (list[(int, int)]): (start, stop) of the region along each axis
+        block_size (list[int]): Size of the blocks along each axis
+        origin (list[int] : None): Coordinate of a grid corner along each
+            axis.  Defaults to 0 for every axis.
+
+    Returns:
+        int: Number of blocks, including partially covered ones
+    """
+    return int(numpy.prod(_block_grid(ranges, block_size, origin)[4]))
+
+
+def split_aligned(ranges, block_size, origin=None):
+    """
+    Split a region into its interior, made of whole grid blocks, and the
+    shell of partial blocks around it.
+
+    The shell is covered by at most two boxes per axis.  Boxes for the first
+    axis span the whole region along the other axes, so passing the slowest
+    changing axis first keeps the largest boxes contiguous in memory.
+
+    Arguments:
+        ranges (list[(int, int)]): (start, stop) of the region along each axis
+        block_size (list[int]): Size of the blocks along each axis
+        origin (list[int] : None): Coordinate of a grid corner along each
+            axis.  Defaults to 0 for every axis.
+
+    Returns:
+        (tuple): (interior, shell) where interior is a list of (start, stop)
+            per axis, or None if no block is wholly inside the region, and
+            shell is a list of boxes in the same format.
+    """
+    ranges, block_size, origin, _, counts = _block_grid(ranges, block_size, origin)
+    if (counts == 0).any():
+        return None, []
+
+    lo = origin - (origin - ranges[:, 0]) // block_size * block_size
+    hi = origin + (ranges[:, 1] - origin) // block_size * block_size
+    if (lo >= hi).any():
+        return None, [[tuple(r) for r in ranges.tolist()]]
+
+    shell = []
+    box = ranges.copy()
+    for axis in range(len(box)):
+        if box[axis, 0] < lo[axis]:
+            edge = box.copy()
+            edge[axis] = (box[axis, 0], lo[axis])
+            shell.append(edge)
+        if hi[axis] < box[axis, 1]:
+            edge = box.copy()
+            edge[axis] = (hi[axis], box[axis, 1])
+            shell.append(edge)
+        box[axis] = (lo[axis], hi[axis])
+    return (
+        [tuple(r) for r in box.tolist()],
+        [[tuple(r) for r in edge.tolist()] for edge in shell])
+
+
+def plan_block_shape(itemsize, target_bytes, cuboid_size, extent=None):
+    """
+    Pick the shape of cuboid aligned blocks that hold at most target_bytes.
+
+    Starting from a single cuboid, the block is doubled along x, y and z in
+    turn while it still fits.  Axes along which the block already covers the
+    region's extent are not grown further, so thin regions get blocks that
+    are wide rather than deep.  A block is never smaller than one cuboid.
+
+    Arguments:
+        itemsize (int): Bytes per voxel
+        target_bytes (int): Maximum uncompressed bytes per block
+        cuboid_size (tuple[int]): (x, y, z) size of the server's cuboids
+        extent (tuple[int] : None): (x, y, z) size of the region to split
+
+    Returns:
+        (x, y, z) block size, a multiple of cuboid_size
+    """
+    cuboid_bytes = itemsize
+    for size in cuboid_size:
+        cuboid_bytes *= size
+    max_cuboids = max(1, target_bytes // cuboid_bytes)
+
+    counts = [1, 1, 1]
+    growing = [True, True, True]
+    axis = 0
+    while any(growing):
+        if growing[axis]:
+            total = counts[0] * counts[1] * counts[2]
+            covered = (extent is not None and
+                       counts[axis] * cuboid_size[axis] >= extent[axis])
+            if covered or total * 2 > max_cuboids:
+                growing[axis] = False
+            else:
+                counts[axis] *= 2
+        axis = (axis + 1) % 3
+
+    return tuple(c * s for c, s in zip(counts, cuboid_size))
+
+
+def run_parallel(func, args_list, max_workers=DEFAULT_MAX_WORKERS, fail_fast=True,
+                 sizes=None, max_pending_size=None):
+    """
+    Call func(*args) for every args tuple in args_list using a bounded pool
+    of worker threads.
+
+    If fail_fast is set, calls that have not started yet are cancelled as
+    soon as any call raises.  Calls already in flight are allowed to finish
+    so that their errors are reported as well.
+
+    If sizes and max_pending_size are given, a call is only submitted once
+    the total size of the calls still pending leaves room for it.  This
+    bounds, for example, the number of bytes being uploaded at once.
+
+    Arguments:
+        func (callable): Function to call for each item.
+        args_list (list[tuple]): Positional arguments for each call.
+        max_workers (int : DEFAULT_MAX_WORKERS): Maximum number of calls to
+            run at once.  Values less than 2 run every call in the calling
+            thread.
+        fail_fast (bool : True): Cancel outstanding calls after a failure.
+        sizes (list[int] : None): Size of each call, such as its number of
+            bytes.
+        max_pending_size (int : None): Maximum total size of the submitted
+            calls that have not finished.  A call larger than this limit is
+            run on its own.
+
+    Returns:
+        2-tuple: (results, errors).  results is a list ordered like
+        args_list, holding None for failed or cancelled calls.  errors is a
+        list of (index, exception) for each call that raised.
+    """
+    with span('run_parallel', calls=len(args_list), max_workers=max_workers):
+        return _run_parallel(func, args_list, max_workers, fail_fast, sizes, max_pending_size)
+
+
+def _run_parallel(func, args_list, max_workers, fail_fast, sizes, max_pending_size):
+    results = [None] * len(args_list)
+    errors = []
+
+    if max_workers is None or max_workers < 2:
+        for i, args in enumerate(args_list):
+            try:
+                results[i] = func(*args)
+            except Exception as e:
+                errors.append((i, e))
+                if fail_fast:
+                    break
+        return results, errors
+
+    if sizes is None:
+        sizes = [0] * len(args_list)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        pending_size = 0
+        i = 0
+        while i < len(args_list) or futures:
+            if fail_fast and errors:
+                # Stop submitting new calls after a failure.
+                i = len(args_list)
+            elif i < len(args_list) and (
+                    max_pending_size is None or not futures or
+                    pending_size + sizes[i] <= max_pending_size):
+                futures[executor.submit(in_worker(func, 'run_parallel.call'), *args_list[i])] = i
+                pending_size += sizes[i]
+                i += 1
+                continue
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                j = futures.pop(future)
+                pending_size -= sizes[j]
+                if future.cancelled():
+                    continue
+                try:
+                    results[j] = future.result()
+                except Exception as e:
+                    errors.append((j, e))
+                    if fail_fast:
+                        for f in futures:
+                            f.cancel()
+
+    errors.sort(key=lambda err: err[0])
+    return results, errors
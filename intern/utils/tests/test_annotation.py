@@ -0,0 +1,246 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.utils.annotation import (
+    ObjectStats, block_stats, create_relabeled_cutout, filter_ids, get_object_stats,
+    id_coords, id_masks, relabel)
+from intern.utils.parallel import block_bounds
+import numpy as np
+import unittest
+
+
+def brute_force(data, offset=(0, 0, 0)):
+    """Statistics of each nonzero id, computed one object at a time."""
+    stats = {}
+    for obj_id in np.unique(data):
+        if obj_id == 0:
+            continue
+        z, y, x = np.nonzero(data == obj_id)
+        coords = np.stack((x, y, z), axis=1) + offset
+        stats[int(obj_id)] = {
+            'voxels': len(x),
+            'x_range': [int(coords[:, 0].min()), int(coords[:, 0].max()) + 1],
+            'y_range': [int(coords[:, 1].min()), int(coords[:, 1].max()) + 1],
+            'z_range': [int(coords[:, 2].min()), int(coords[:, 2].max()) + 1],
+            'centroid': tuple(float(c) for c in coords.mean(axis=0)),
+        }
+    return stats
+
+
+class FakeRemote(object):
+    """Streams a volume in blocks, like BossRemote.iter_cutout()."""
+    def __init__(self, volume):
+        self.volume = volume
+
+    def iter_cutout(self, resource, resolution, x_range, y_range, z_range, block_size):
+        for b in block_bounds([x_range, y_range, z_range], block_size).tolist():
+            (x0, x1), (y0, y1), (z0, z1) = b
+            yield tuple(tuple(r) for r in b), self.volume[z0:z1, y0:y1, x0:x1]
+
+
+class TestObjectStats(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.volume = rng.randint(0, 6, (9, 10, 11)).astype(np.uint64)
+        self.volume[self.volume == 5] = 2**64 - 1
+
+    def assertStatsEqual(self, expected, stats):
+        self.assertEqual(sorted(expected), stats.ids.tolist())
+        for obj_id, obj_stats in expected.items():
+            actual = stats.get(obj_id)
+            np.testing.assert_allclose(obj_stats.pop('centroid'), actual.pop('centroid'))
+            self.assertEqual(obj_stats, actual)
+
+    def test_block_stats(self):
+        stats = block_stats(self.volume, offset=(100, 200, 300))
+
+        self.assertEqual(np.uint64, stats.ids.dtype)
+        self.assertStatsEqual(brute_force(self.volume, (100, 200, 300)), stats)
+
+    def test_block_stats_background(self):
+        self.assertNotIn(0, block_stats(self.volume))
+        self.assertIn(0, block_stats(self.volume, background=None))
+        self.assertEqual(0, len(block_stats(np.zeros((2, 2, 2), np.uint64))))
+
+    def test_block_stats_requires_3d(self):
+        with self.assertRaises(ValueError):
+            block_stats(np.zeros((2, 2), np.uint64))
+
+    def test_merge(self):
+        top = block_stats(self.volume[:4], offset=(0, 0, 0))
+        bottom = block_stats(self.volume[4:], offset=(0, 0, 4))
+
+        self.assertStatsEqual(brute_force(self.volume), top.merge(bottom))
+        self.assertStatsEqual(brute_force(self.volume), ObjectStats().merge(top.merge(bottom)))
+
+    def test_index(self):
+        stats = block_stats(self.volume)
+
+        self.assertEqual([0, 2], stats.index([1, 3]).tolist())
+        with self.assertRaises(KeyError):
+            stats.index([1, 42])
+
+    def test_get_object_stats(self):
+        remote = FakeRemote(self.volume)
+
+        stats = get_object_stats(
+            remote, None, 0, [0, 11], [0, 10], [0, 9], block_size=(4, 4, 4))
+
+        self.assertStatsEqual(brute_force(self.volume), stats)
+
+
+class TestIdFiltering(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        self.volume = rng.randint(0, 6, (5, 6, 7)).astype(np.uint64)
+
+    def test_filter_ids(self):
+        actual = filter_ids(self.volume, [4, 1, 4])
+
+        expected = np.where(np.isin(self.volume, [1, 4]), self.volume, 0)
+        np.testing.assert_array_equal(expected, actual)
+        self.assertFalse(np.shares_memory(self.volume, actual))
+
+    def test_filter_ids_in_place(self):
+        expected = np.where(self.volume == 3, self.volume, 0)
+
+        actual = filter_ids(self.volume, [3], out=self.volume)
+
+        self.assertIs(self.volume, actual)
+        np.testing.assert_array_equal(expected, actual)
+
+    def test_id_masks(self):
+        ids, masks = id_masks(self.volume, [5, 2, 42])
+
+        self.assertEqual([2, 5, 42], ids.tolist())
+        self.assertEqual((3,) + self.volume.shape, masks.shape)
+        for obj_id, mask in zip(ids, masks):
+            np.testing.assert_array_equal(self.volume == obj_id, mask)
+
+    def test_id_masks_no_ids(self):
+        ids, masks = id_masks(self.volume, [])
+
+        self.assertEqual(0, len(ids))
+        self.assertEqual((0,) + self.volume.shape, masks.shape)
+
+    def test_id_coords(self):
+        coords = id_coords(self.volume, [3, 42], offset=(10, 20, 30))
+
+        self.assertEqual([3, 42], sorted(coords))
+        z, y, x = np.nonzero(self.volume == 3)
+        np.testing.assert_array_equal(
+            np.stack((x + 10, y + 20, z + 30), axis=1), coords[3])
+        self.assertEqual((0, 3), coords[42].shape)
+
+    def test_id_coords_all_objects(self):
+        coords = id_coords(self.volume)
+
+        self.assertEqual([1, 2, 3, 4, 5], sorted(coords))
+        self.assertEqual(np.count_nonzero(self.volume), sum(len(c) for c in coords.values()))
+
+
+class UploadRemote(object):
+    """Records reserve_ids() and create_cutout() calls."""
+    def __init__(self):
+        self.reserved = []
+        self.uploads = []
+
+    def reserve_ids(self, resource, num_ids):
+        self.reserved.append(num_ids)
+        return 1000
+
+    def create_cutout(self, resource, resolution, x_range, y_range, z_range, data, time_range=None):
+        self.uploads.append((x_range, y_range, z_range, data, time_range))
+
+
+class FakeAllocator(object):
+    def __init__(self):
+        self.allocated = []
+
+    def allocate(self, num_ids=1):
+        self.allocated.append(num_ids)
+        return 50
+
+
+class TestRelabel(unittest.TestCase):
+    def setUp(self):
+        self.block = np.array([[[0, 7, 7], [3, 0, 9]]], dtype=np.uint64)
+
+    def test_relabel(self):
+        relabeled, table = relabel(self.block, 100)
+
+        np.testing.assert_array_equal([[[0, 101, 101], [100, 0, 102]]], relabeled)
+        self.assertEqual(np.uint64, relabeled.dtype)
+        self.assertEqual([[3, 100], [7, 101], [9, 102]], table.tolist())
+
+    def test_relabel_no_background(self):
+        relabeled, table = relabel(self.block, 100, background=None)
+
+        np.testing.assert_array_equal([[[100, 102, 102], [101, 100, 103]]], relabeled)
+        self.assertEqual(4, len(table))
+
+    def test_relabel_small_dtype(self):
+        relabeled, table = relabel(np.array([0, 1, 2], dtype=np.uint16), 70000)
+
+        self.assertEqual(np.uint64, relabeled.dtype)
+        self.assertEqual([0, 70000, 70001], relabeled.tolist())
+        self.assertEqual([[1, 70000], [2, 70001]], table.tolist())
+
+    def test_relabel_signed_dtype(self):
+        relabeled, table = relabel(np.array([0, 1, 2], dtype=np.int32), 2**40)
+
+        self.assertEqual([0, 2**40, 2**40 + 1], relabeled.tolist())
+        self.assertEqual(np.uint64, table.dtype)
+
+    def test_relabel_overflow(self):
+        with self.assertRaises(ValueError):
+            relabel(self.block, 2**64 - 2)
+
+    def test_create_relabeled_cutout(self):
+        remote = UploadRemote()
+
+        table = create_relabeled_cutout(
+            remote, None, 0, [0, 3], [0, 2], [0, 1], self.block)
+
+        self.assertEqual([3], remote.reserved)
+        x_range, y_range, z_range, data, time_range = remote.uploads[0]
+        self.assertEqual(([0, 3], [0, 2], [0, 1], None), (x_range, y_range, z_range, time_range))
+        np.testing.assert_array_equal([[[0, 1001, 1001], [1000, 0, 1002]]], data)
+        self.assertEqual(np.uint64, data.dtype)
+        self.assertEqual([[3, 1000], [7, 1001], [9, 1002]], table.tolist())
+
+    def test_create_relabeled_cutout_allocator(self):
+        remote = UploadRemote()
+        ids = FakeAllocator()
+
+        table = create_relabeled_cutout(
+            remote, None, 0, [0, 3], [0, 2], [0, 1], self.block, ids=ids)
+
+        self.assertEqual([], remote.reserved)
+        self.assertEqual([3], ids.allocated)
+        self.assertEqual([50, 51, 52], table[:, 1].tolist())
+
+    def test_create_relabeled_cutout_background_only(self):
+        remote = UploadRemote()
+
+        table = create_relabeled_cutout(
+            remote, None, 0, [0, 3], [0, 2], [0, 1], np.zeros((1, 2, 3), np.uint64))
+
+        self.assertEqual([], remote.reserved)
+        self.assertEqual((0, 2), table.shape)
+        self.assertEqual(1, len(remote.uploads))
+
+
+if __name__ == '__main__':
+    unittest.main()
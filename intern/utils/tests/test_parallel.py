@@ -0,0 +1,218 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.utils.parallel import (
+    block_bounds, block_compute, iter_block_bounds, num_blocks, plan_block_shape,
+    run_parallel, split_aligned)
+import numpy as np
+import threading
+import unittest
+
+
+class TestRunParallel(unittest.TestCase):
+    def test_results_in_order(self):
+        results, errors = run_parallel(
+            lambda a, b: a * b, [(i, 2) for i in range(20)], max_workers=4)
+        self.assertEqual([i * 2 for i in range(20)], results)
+        self.assertEqual([], errors)
+
+    def test_serial(self):
+        results, errors = run_parallel(
+            lambda a: a + 1, [(i,) for i in range(5)], max_workers=1)
+        self.assertEqual([1, 2, 3, 4, 5], results)
+        self.assertEqual([], errors)
+
+    def test_errors_collected(self):
+        def func(i):
+            if i % 2:
+                raise ValueError(i)
+            return i
+
+        results, errors = run_parallel(
+            func, [(i,) for i in range(6)], max_workers=3, fail_fast=False)
+        self.assertEqual([0, None, 2, None, 4, None], results)
+        self.assertEqual([1, 3, 5], [i for i, _ in errors])
+        self.assertTrue(all(isinstance(e, ValueError) for _, e in errors))
+
+    def test_fail_fast_cancels_pending(self):
+        started = []
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def func(i):
+            with lock:
+                started.append(i)
+            if i == 0:
+                raise ValueError(i)
+            release.wait(0.2)
+            return i
+
+        results, errors = run_parallel(
+            func, [(i,) for i in range(50)], max_workers=2)
+        release.set()
+        self.assertEqual(1, len(errors))
+        self.assertEqual(0, errors[0][0])
+        self.assertLess(len(started), 50)
+
+    def test_max_pending_size(self):
+        lock = threading.Lock()
+        state = {'pending': 0, 'max': 0}
+
+        def func(size):
+            with lock:
+                state['pending'] += size
+                state['max'] = max(state['max'], state['pending'])
+            threading.Event().wait(0.01)
+            with lock:
+                state['pending'] -= size
+            return size
+
+        sizes = [3, 5, 2, 4, 1, 6, 2]
+        results, errors = run_parallel(
+            func, [(s,) for s in sizes], max_workers=4,
+            sizes=sizes, max_pending_size=8)
+        self.assertEqual(sizes, results)
+        self.assertLessEqual(state['max'], 8)
+
+    def test_serial_fail_fast(self):
+        def func(i):
+            if i == 1:
+                raise ValueError(i)
+            return i
+
+        results, errors = run_parallel(
+            func, [(i,) for i in range(4)], max_workers=1)
+        self.assertEqual([0, None, None, None], results)
+        self.assertEqual(1, len(errors))
+
+
+class TestPlanBlockShape(unittest.TestCase):
+    def test_fits_target(self):
+        self.assertEqual(
+            (1024, 1024, 32), plan_block_shape(1, 32*1024*1024, (512, 512, 16)))
+
+    def test_larger_datatype_gets_smaller_blocks(self):
+        self.assertEqual(
+            (1024, 512, 16), plan_block_shape(4, 32*1024*1024, (512, 512, 16)))
+
+    def test_at_least_one_cuboid(self):
+        self.assertEqual((512, 512, 16), plan_block_shape(8, 1, (512, 512, 16)))
+
+    def test_thin_extent_grows_other_axes(self):
+        self.assertEqual(
+            (2048, 2048, 16),
+            plan_block_shape(1, 64*1024*1024, (512, 512, 16), extent=(10000, 10000, 1)))
+
+
+class TestBlockBounds(unittest.TestCase):
+    def test_c_order(self):
+        blocks = block_bounds([(500, 1100), (0, 10), (10, 20)], (512, 512, 16))
+
+        self.assertEqual((6, 3, 2), blocks.shape)
+        self.assertEqual(
+            [[[500, 512], [0, 10], [10, 16]],
+             [[500, 512], [0, 10], [16, 20]],
+             [[512, 1024], [0, 10], [10, 16]]],
+            blocks.tolist()[:3])
+
+    def test_same_blocks_as_block_compute(self):
+        expected = block_compute(500, 1100, 0, 1030, 10, 40, block_size=(512, 512, 16))
+        actual = block_bounds([(500, 1100), (0, 1030), (10, 40)], (512, 512, 16))
+
+        self.assertEqual(
+            sorted(tuple(tuple(r) for r in b) for b in expected),
+            sorted(tuple(tuple(r) for r in b) for b in actual.tolist()))
+
+    def test_4d_with_origin(self):
+        blocks = block_bounds([(0, 3), (0, 16), (5, 9)], (2, 16, 4), origin=(0, 0, 1))
+
+        self.assertEqual(
+            [[[0, 2], [0, 16], [5, 9]], [[2, 3], [0, 16], [5, 9]]], blocks.tolist())
+
+        blocks = block_bounds([(0, 2), (0, 4), (0, 4), (0, 4)], (1, 4, 2, 2))
+        self.assertEqual((2 * 2 * 2, 4, 2), blocks.shape)
+
+    def test_morton_order(self):
+        blocks = block_bounds([(0, 4), (0, 4)], (1, 1), order='morton')
+
+        starts = [tuple(b[:, 0]) for b in blocks]
+        self.assertEqual(
+            [(0, 0), (0, 1), (1, 0), (1, 1), (0, 2), (0, 3), (1, 2), (1, 3)], starts[:8])
+        self.assertEqual(16, len(set(starts)))
+
+    def test_morton_thin_region(self):
+        blocks = block_bounds([(0, 3), (0, 1000)], (1, 1), order='morton')
+
+        self.assertEqual(3000, len(blocks))
+        self.assertEqual(3000, len(set(tuple(b[:, 0]) for b in blocks)))
+
+    def test_empty(self):
+        self.assertEqual((0, 3, 2), block_bounds([(5, 5), (0, 1), (0, 1)], (1, 1, 1)).shape)
+
+    def test_lazy_batches(self):
+        batches = iter_block_bounds([(0, 100), (0, 100)], (10, 10), batch_size=30)
+
+        self.assertEqual(30, len(next(batches)))
+        self.assertEqual([30, 30, 10], [len(b) for b in batches])
+
+        batches = list(iter_block_bounds([(0, 100), (0, 100)], (10, 10), batch_size=4))
+        self.assertEqual(100, sum(len(b) for b in batches))
+        self.assertTrue(all(len(b) <= 4 for b in batches))
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            block_bounds([(0, 10)], (1,), order='hilbert')
+        with self.assertRaises(ValueError):
+            block_bounds([(0, 10)], (1, 1))
+        with self.assertRaises(ValueError):
+            block_bounds([(0, 10)], (0,))
+
+
+class TestSplitAligned(unittest.TestCase):
+    def test_interior_and_shell(self):
+        interior, shell = split_aligned([(2, 14), (0, 8), (1, 10)], (4, 4, 4))
+
+        self.assertEqual([(4, 12), (0, 8), (4, 8)], interior)
+        self.assertEqual(
+            [[(2, 4), (0, 8), (1, 10)],
+             [(12, 14), (0, 8), (1, 10)],
+             [(4, 12), (0, 8), (1, 4)],
+             [(4, 12), (0, 8), (8, 10)]],
+            shell)
+
+    def test_shell_covers_region_once(self):
+        ranges = [(3, 21), (5, 30), (1, 17)]
+        covered = np.zeros((21, 30, 17), int)
+        interior, shell = split_aligned(ranges, (8, 8, 4), origin=(1, 0, 1))
+        for (x0, x1), (y0, y1), (z0, z1) in [interior] + shell:
+            covered[x0:x1, y0:y1, z0:z1] += 1
+
+        self.assertTrue((covered[3:21, 5:30, 1:17] == 1).all())
+        self.assertEqual(18 * 25 * 16, covered.sum())
+
+    def test_aligned(self):
+        self.assertEqual(([(16, 48)], []), split_aligned([(16, 48)], (16,)))
+
+    def test_no_interior(self):
+        self.assertEqual(
+            (None, [[(2, 6), (0, 16)]]), split_aligned([(2, 6), (0, 16)], (16, 16)))
+        self.assertEqual((None, []), split_aligned([(2, 2)], (16,)))
+
+    def test_num_blocks(self):
+        self.assertEqual(3 * 1 * 2, num_blocks([(500, 1100), (0, 10), (10, 20)], (512, 512, 16)))
+        self.assertEqual(0, num_blocks([(5, 5)], (4,)))
+
+
+if __name__ == '__main__':
+    unittest.main()
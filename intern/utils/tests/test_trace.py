@@ -0,0 +1,125 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from intern.utils import trace
+from intern.utils.parallel import run_parallel
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+class TestTrace(unittest.TestCase):
+    def tearDown(self):
+        trace.stop_tracing()
+
+    def spans(self, tracer):
+        return {e['name']: e for e in tracer.events}
+
+    def test_off_by_default(self):
+        self.assertFalse(trace.is_tracing())
+        with trace.span('ignored') as sp:
+            sp.set(x=1)
+        trace.annotate(x=1)
+        func = lambda: 1
+        self.assertIs(func, trace.in_worker(func, 'ignored'))
+
+    def test_nested_spans(self):
+        tracer = trace.start_tracing()
+
+        with trace.span('outer', a=1):
+            trace.annotate(b=2)
+            with trace.span('inner'):
+                pass
+        with self.assertRaises(KeyError):
+            with trace.span('failed'):
+                raise KeyError()
+
+        spans = self.spans(tracer)
+        outer, inner = spans['outer'], spans['inner']
+        self.assertEqual('X', outer['ph'])
+        self.assertEqual(1, outer['args']['a'])
+        self.assertEqual(2, outer['args']['b'])
+        self.assertNotIn('parent', outer['args'])
+        self.assertEqual(outer['args']['id'], inner['args']['parent'])
+        self.assertGreaterEqual(inner['ts'], outer['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'], outer['ts'] + outer['dur'])
+        self.assertEqual('KeyError', spans['failed']['args']['error'])
+
+    def test_traced(self):
+        tracer = trace.start_tracing()
+
+        @trace.traced('work')
+        def work(x):
+            return x + 1
+
+        self.assertEqual(2, work(1))
+        self.assertEqual(['work'], [e['name'] for e in tracer.events])
+
+    def test_run_parallel_spans(self):
+        tracer = trace.start_tracing()
+
+        with trace.span('caller'):
+            results, errors = run_parallel(lambda x: x * 2, [(i,) for i in range(6)], 3)
+
+        self.assertEqual([0, 2, 4, 6, 8, 10], results)
+        by_id = {e['args']['id']: e for e in tracer.events}
+        calls = [e for e in tracer.events if e['name'] == 'run_parallel.call']
+        self.assertEqual(6, len(calls))
+        for call in calls:
+            self.assertEqual('run_parallel', by_id[call['args']['parent']]['name'])
+            self.assertGreaterEqual(call['args']['queue_wait'], 0)
+        run = self.spans(tracer)['run_parallel']
+        self.assertEqual('caller', by_id[run['args']['parent']]['name'])
+        self.assertEqual(6, run['args']['calls'])
+
+    def test_dump(self):
+        tracer = trace.start_tracing()
+        with trace.span('outer'):
+            pass
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'trace.json')
+            self.assertIs(tracer, trace.stop_tracing(path))
+            with open(path) as f:
+                events = json.load(f)['traceEvents']
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        self.assertEqual(['thread_name', 'outer'], [e['name'] for e in events])
+        self.assertFalse(trace.is_tracing())
+
+    def test_profile_env(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'trace.json')
+            root = os.path.dirname(os.path.dirname(os.path.dirname(trace.__file__)))
+            env = dict(os.environ, INTERN_PROFILE=path, PYTHONPATH=root)
+            subprocess.check_call([
+                sys.executable, '-c',
+                'from intern.utils.parallel import block_bounds; '
+                'block_bounds([(0, 100), (0, 100)], (10, 10))'], env=env)
+            with open(path) as f:
+                names = [e['name'] for e in json.load(f)['traceEvents']]
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        self.assertIn('block_bounds', names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,280 @@
+# Copyright 2016 The Johns Hopkins University Applied Physics Laboratory
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Hierarchical trace spans of intern calls, saved in the Chrome trace format.
+
+Tracing is off by default, and a span then costs a single check.  Turn it on
+with start_tracing(), or for a whole process by setting the INTERN_PROFILE
+environment variable to the path of the trace file to write at exit:
+
+    INTERN_PROFILE=trace.json python my_script.py
+
+The file can be opened in chrome://tracing, Perfetto or speedscope.  Each
+span is a complete ('X') event on the thread that ran it.  Spans started in
+a worker thread record the span that queued the work as their parent and
+how long the work waited for a worker.
+"""
+
+from __future__ import absolute_import
+import atexit
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+
+# Environment variable holding the path of the trace file to write at exit.
+# '1' writes intern_trace_<pid>.json in the working directory.
+PROFILE_ENV = 'INTERN_PROFILE'
+
+_clock = getattr(time, 'perf_counter', time.time)
+_tracer = None
+_local = threading.local()
+
+
+class Tracer(object):
+    """Collects the spans of every thread while tracing is on.
+
+    Attributes:
+        events (list[dict]): Chrome trace events of the finished spans.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._start = _clock()
+        self._pid = os.getpid()
+
+    def _timestamp(self, t):
+        """Microseconds from the start of the trace to clock time t."""
+        return (t - self._start) * 1e6
+
+    def _add(self, event):
+        event['pid'] = self._pid
+        event['tid'] = threading.current_thread().ident
+        with self._lock:
+            self.events.append(event)
+
+    def to_chrome(self):
+        """Get the trace in the Chrome trace format.
+
+        Returns:
+            (dict): {'traceEvents': [...], 'displayTimeUnit': 'ms'}
+        """
+        with self._lock:
+            events = list(self.events)
+        threads = {e['tid'] for e in events}
+        names = {t.ident: t.name for t in threading.enumerate()}
+        meta = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+             'args': {'name': names.get(tid, str(tid))}}
+            for tid in threads]
+        return {'traceEvents': meta + events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path):
+        """Write the trace to a JSON file.
+
+        Args:
+            path (string): Path of the file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome(), f)
+
+
+class _Span(object):
+    """A timed, named section of code, recorded when it exits."""
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self.name = name
+        self.args = args
+        self.id = next(tracer._ids)
+
+    def set(self, **args):
+        """Add arguments to the span, such as sizes only known once it ran."""
+        self.args.update(args)
+
+    def __enter__(self):
+        stack = _stack()
+        if stack:
+            self.args['parent'] = stack[-1].id
+        self.args['id'] = self.id
+        stack.append(self)
+        self._begin = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = _clock()
+        _stack().pop()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self._tracer._add({
+            'name': self.name, 'ph': 'X', 'cat': 'intern',
+            'ts': self._tracer._timestamp(self._begin),
+            'dur': (end - self._begin) * 1e6,
+            'args': self.args,
+        })
+
+
+class _NullSpan(object):
+    """Span returned while tracing is off."""
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _stack():
+    """Open spans of the current thread, innermost last."""
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def span(name, **args):
+    """Time a section of code as a child of the current thread's open span.
+
+        with span('decompress', nbytes=out.nbytes):
+            ...
+
+    Args:
+        name (string): Name of the span.
+        args: Values to record with the span.
+
+    Returns:
+        (context manager): Does nothing if tracing is off.
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _Span(_tracer, name, args)
+
+
+def annotate(**args):
+    """Add arguments to the current thread's innermost open span.
+
+    Args:
+        args: Values to record with the span.
+    """
+    if _tracer is not None:
+        stack = _stack()
+        if stack:
+            stack[-1].set(**args)
+
+
+def traced(name):
+    """Decorator that runs every call of a function in a span.
+
+    Args:
+        name (string): Name of the span.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _Span(_tracer, name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_worker(func, name):
+    """Prepare a function to run in a worker thread as a child of the
+    current span.
+
+    Call when the work is queued.  The returned function runs func in a span
+    whose parent is the span open now, and records the seconds it waited
+    for a worker as queue_wait.
+
+    Args:
+        func (callable): Function the worker will call.
+        name (string): Name of the span.
+
+    Returns:
+        (callable): func itself if tracing is off.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return func
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    queued = _clock()
+
+    def run(*args, **kwargs):
+        worker_stack = _stack()
+        saved = list(worker_stack)
+        worker_stack[:] = [parent] if parent is not None else []
+        try:
+            with _Span(tracer, name, {'queue_wait': _clock() - queued}):
+                return func(*args, **kwargs)
+        finally:
+            worker_stack[:] = saved
+    return run
+
+
+def start_tracing():
+    """Start recording spans, discarding any recorded before.
+
+    Returns:
+        (Tracer): The tracer spans are recorded in.
+    """
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing(path=None):
+    """Stop recording spans.
+
+    Args:
+        path (optional[string]): Path of a JSON file to write the trace to.
+
+    Returns:
+        (Tracer|None): The tracer the spans were recorded in, or None if
+            tracing wasn't on.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None and path is not None:
+        tracer.dump(path)
+    return tracer
+
+
+def is_tracing():
+    """Whether spans are being recorded."""
+    return _tracer is not None
+
+
+def _profile_path(value):
+    if value.strip().lower() in ('1', 'true', 'yes', 'on'):
+        return 'intern_trace_{}.json'.format(os.getpid())
+    return value
+
+
+if os.environ.get(PROFILE_ENV):
+    start_tracing()
+    atexit.register(stop_tracing, _profile_path(os.environ[PROFILE_ENV]))